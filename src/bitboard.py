@@ -0,0 +1,220 @@
+""" Bitboard helpers: one bit per square, A1 = bit 0, B1 = bit 1 ... H8 = bit 63 """
+
+# Color indexes
+WHITE = 0
+BLACK = 1
+
+# Piece kinds, a piece index on the board is color * 6 + kind
+PAWN = 0
+KNIGHT = 1
+BISHOP = 2
+ROOK = 3
+QUEEN = 4
+KING = 5
+
+# Mailbox value of a square that holds no piece
+EMPTY = 12
+
+BB_EMPTY = 0
+BB_ALL = 0xFFFFFFFFFFFFFFFF
+
+BB_SQUARES = [1 << index for index in range(64)]
+
+BB_FILES = [0x0101010101010101 << file_index for file_index in range(8)]
+BB_RANKS = [0xFF << (8 * rank_index) for rank_index in range(8)]
+
+
+def square_index(file_index, rank_index):
+    """ Return the bit index of a square given 0-based file and rank """
+    return rank_index * 8 + file_index
+
+
+def square_file(index):
+    return index & 7
+
+
+def square_rank(index):
+    return index >> 3
+
+
+def piece_index(color_index, kind):
+    return color_index * 6 + kind
+
+
+def lsb(bb):
+    """ Index of the least significant set bit """
+    return (bb & -bb).bit_length() - 1
+
+
+try:
+    popcount = int.bit_count  # Python 3.10+
+except AttributeError:
+    def popcount(bb):
+        return bin(bb).count('1')
+
+
+def iter_bits(bb):
+    """ Yield the index of every set bit, lowest first """
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def _leaper_attacks(index, offsets):
+    """ Squares reached from index by (file, rank) jumps that stay on the board """
+    file_index, rank_index = square_file(index), square_rank(index)
+    attacks = 0
+    for file_offset, rank_offset in offsets:
+        to_file, to_rank = file_index + file_offset, rank_index + rank_offset
+        if 0 <= to_file < 8 and 0 <= to_rank < 8:
+            attacks |= BB_SQUARES[square_index(to_file, to_rank)]
+    return attacks
+
+
+KNIGHT_OFFSETS = [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)]
+KING_OFFSETS = [(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)]
+
+# Attack tables, one bitboard per square
+KNIGHT_ATTACKS = [_leaper_attacks(index, KNIGHT_OFFSETS) for index in range(64)]
+KING_ATTACKS = [_leaper_attacks(index, KING_OFFSETS) for index in range(64)]
+
+
+ROOK_DIRECTIONS = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+BISHOP_DIRECTIONS = [(1, 1), (1, -1), (-1, -1), (-1, 1)]
+
+# Magic multipliers: (occupancy & mask) * magic >> shift is a collision free index into the
+# per square attack table. Found offline with a seeded random search, one per square.
+ROOK_MAGICS = [
+    0x128012C0008000E0, 0x0240002000401001, 0x4100200041001008, 0x8280100008018004,
+    0x2080080002040080, 0x1300010004008208, 0x04000208A9101408, 0x020000204A018F04,
+    0x1080800040008020, 0x0000C01000402001, 0x0080808010002000, 0x0408800800801000,
+    0x0010800801040080, 0x4804800400804200, 0x0304800D00800200, 0x010200040081006A,
+    0x8280044020084000, 0x042000C010004021, 0x2010002004080020, 0x0040210010000900,
+    0x0008004004020041, 0x0004008080040200, 0x1C20040070610208, 0x1020A20000508104,
+    0x0100C00380008120, 0x4001200280400080, 0x0200100080200080, 0x0000401200082200,
+    0xC02C080080040080, 0x0840040080020080, 0x2102004040800100, 0x0042079A00004104,
+    0x0000400424800280, 0x4820100020400040, 0x5010002000801880, 0x9061080081801002,
+    0x208A050011000800, 0x000200080E003094, 0xA010018204003008, 0x2000288042001401,
+    0x400181C000228000, 0x0200402010004000, 0x8388928600420021, 0x400021001001000A,
+    0x2100080011010004, 0x1002020004008080, 0x0802000804020001, 0x88004410408A0001,
+    0x010508C030800100, 0x4000400080310100, 0x0030200010048080, 0x2000800800100080,
+    0x0100040008008080, 0x0022000204008080, 0x0108020170284400, 0x1001010084004200,
+    0x0004890141902202, 0x0100881100220042, 0x0100102001000841, 0x4408050020081001,
+    0x0002008884201002, 0x2002000490410802, 0x0020014800900204, 0x0100082081044402,
+]
+
+BISHOP_MAGICS = [
+    0x0010104088840042, 0x0110104081004062, 0x0091142082000100, 0x0108208821008100,
+    0x0101104000080000, 0x010104200404001C, 0x0C01040202C00010, 0x0001004800841080,
+    0xCA8B46100E280102, 0x001010D00085024C, 0x4180089881020120, 0x8010082050411000,
+    0x0800020210100000, 0x0002120905201200, 0xC000040404040510, 0x0110410101100200,
+    0x0042201408020C27, 0xA882000404440C20, 0x0002000102040100, 0x800200202202C200,
+    0x4002005012101401, 0x2441014880600200, 0x0214020104018400, 0x000180004414410A,
+    0x0105410C10020800, 0x0004200084013400, 0x200582045004001B, 0x1000404004010200,
+    0x0001001081004021, 0x2400430202008628, 0x000604C144230800, 0x04004840008A1804,
+    0x4010045000220210, 0x2012100400500120, 0x10001C0205900081, 0x0020880800360A00,
+    0x8500460020060080, 0x0420008209010110, 0x0010020250008C00, 0x8010A40100004104,
+    0x00008208400022C8, 0x0008410450402100, 0x0008920110004104, 0x43A8011044002024,
+    0x0029102021900602, 0x2270101000212040, 0x0020C41112004040, 0x3004840550C42200,
+    0x5002022202404480, 0x0402822309200840, 0x0032010423240048, 0x2000CA0384110008,
+    0x4001140410440000, 0x2092E50810011010, 0x0140040852005041, 0x00200200C1010104,
+    0x40120202020104E0, 0xA000010042300500, 0x400048004A009001, 0x4200800400411081,
+    0x0010040604105400, 0x0107004210024080, 0x0004423004210040, 0xC220023088010040,
+]
+
+
+def _slider_attacks(index, directions, occupied):
+    """ Walk every ray from index, stopping on (and including) the first occupied square """
+    attacks = 0
+    for file_offset, rank_offset in directions:
+        to_file, to_rank = square_file(index) + file_offset, square_rank(index) + rank_offset
+        while 0 <= to_file < 8 and 0 <= to_rank < 8:
+            bit = BB_SQUARES[square_index(to_file, to_rank)]
+            attacks |= bit
+            if occupied & bit:
+                break
+            to_file += file_offset
+            to_rank += rank_offset
+    return attacks
+
+
+def _slider_mask(index, directions):
+    """ Squares whose occupancy can change the attack set: every ray without its last square """
+    mask = 0
+    for file_offset, rank_offset in directions:
+        to_file, to_rank = square_file(index) + file_offset, square_rank(index) + rank_offset
+        while 0 <= to_file + file_offset < 8 and 0 <= to_rank + rank_offset < 8:
+            mask |= BB_SQUARES[square_index(to_file, to_rank)]
+            to_file += file_offset
+            to_rank += rank_offset
+    return mask
+
+
+def _magic_tables(directions, magics):
+    masks, shifts, tables = [], [], []
+    for index in range(64):
+        mask = _slider_mask(index, directions)
+        shift = 64 - popcount(mask)
+        magic = magics[index]
+        table = [0] * (1 << (64 - shift))
+
+        # Enumerate every subset of the mask (carry-rippler)
+        occupied = 0
+        while True:
+            table[((occupied * magic) & BB_ALL) >> shift] = _slider_attacks(index, directions, occupied)
+            occupied = (occupied - mask) & mask
+            if not occupied:
+                break
+
+        masks.append(mask)
+        shifts.append(shift)
+        tables.append(table)
+    return masks, shifts, tables
+
+
+ROOK_MASKS, ROOK_SHIFTS, ROOK_TABLES = _magic_tables(ROOK_DIRECTIONS, ROOK_MAGICS)
+BISHOP_MASKS, BISHOP_SHIFTS, BISHOP_TABLES = _magic_tables(BISHOP_DIRECTIONS, BISHOP_MAGICS)
+
+
+def rook_attacks(index, occupied):
+    """ Squares attacked by a rook on index, blockers included """
+    return ROOK_TABLES[index][((occupied & ROOK_MASKS[index]) * ROOK_MAGICS[index] & BB_ALL) >> ROOK_SHIFTS[index]]
+
+
+def bishop_attacks(index, occupied):
+    """ Squares attacked by a bishop on index, blockers included """
+    return BISHOP_TABLES[index][
+        ((occupied & BISHOP_MASKS[index]) * BISHOP_MAGICS[index] & BB_ALL) >> BISHOP_SHIFTS[index]]
+
+
+def queen_attacks(index, occupied):
+    return rook_attacks(index, occupied) | bishop_attacks(index, occupied)
+
+
+def _pawn_attacks(color_index, index):
+    rank_offset = 1 if color_index == WHITE else -1
+    return _leaper_attacks(index, [(-1, rank_offset), (1, rank_offset)])
+
+
+# Squares attacked by a pawn of each color standing on a square
+PAWN_ATTACKS = [[_pawn_attacks(color_index, index) for index in range(64)] for color_index in (WHITE, BLACK)]
+
+
+def _between_and_line(a, b):
+    """ Squares strictly between a and b, and the full line through both (0 if not aligned) """
+    for attacks in (rook_attacks, bishop_attacks):
+        if attacks(a, 0) & BB_SQUARES[b]:
+            between = attacks(a, BB_SQUARES[b]) & attacks(b, BB_SQUARES[a])
+            line = (attacks(a, 0) & attacks(b, 0)) | BB_SQUARES[a] | BB_SQUARES[b]
+            return between, line
+    return 0, 0
+
+
+BETWEEN = [[0] * 64 for _ in range(64)]
+LINE = [[0] * 64 for _ in range(64)]
+for _a in range(64):
+    for _b in range(64):
+        if _a != _b:
+            BETWEEN[_a][_b], LINE[_a][_b] = _between_and_line(_a, _b)
+del _a, _b
@@ -0,0 +1,207 @@
+""" Opening book in the Polyglot .bin format, read through mmap
+
+A book is a file of 16 byte big-endian entries sorted by position key: key (64 bits), move (16 bits),
+weight (16 bits) and learn (32 bits). Moves are Polyglot moves: to square in bits 0-5, from square in
+bits 6-11 and the promotion kind (1 knight - 4 queen) in bits 12-14, castling written as the king
+taking its own rook. Lookups binary-search the mapped file, so a book of any size costs no memory
+and processes opening the same file share its pages.
+
+Positions are keyed by their Polyglot hash (polyglot.polyglot_key), so books written by build_book
+can be read by other Polyglot tools and the other way round. Another key function can be given to
+both, e.g. board_key for books keyed by the board's own Zobrist key.
+
+To build a book from a PGN file: python book.py games.pgn.gz book.bin [--plies N] [--min-games N]
+"""
+import argparse
+import mmap
+import random
+import struct
+import sys
+from collections import defaultdict
+
+from bitboard import WHITE, KNIGHT, ROOK, QUEEN, KING
+from chess import Board, KING_CASTLE, QUEEN_CASTLE, PROMOTION
+from polyglot import polyglot_key
+
+ENTRY_SIZE = 16
+
+_ENTRY = struct.Struct('>QHHI')
+_KEY = struct.Struct('>Q')
+
+# Points a game result gives to the moves of white and of black: 2 for a win, 1 for a draw
+RESULT_POINTS = {'1-0': (2, 0), '0-1': (0, 2), '1/2-1/2': (1, 1)}
+
+
+def board_key(board: Board):
+    """ Board's own Zobrist key, an alternative to the Polyglot hash for books only read here """
+    return board.zobrist_key
+
+
+def to_polyglot(move):
+    """ Polyglot move of an encoded move """
+    start = move & 63
+    end = (move >> 6) & 63
+    flag = move >> 12
+    if flag == KING_CASTLE:
+        end = start + 3
+    elif flag == QUEEN_CASTLE:
+        end = start - 4
+    promotion = KNIGHT + (flag & 3) if flag & PROMOTION else 0
+    return end | start << 6 | promotion << 12
+
+
+def from_polyglot(board: Board, polyglot_move, legal_moves=None):
+    """ Encoded move of a Polyglot move on board, None when it is not a legal move there
+
+    legal_moves are the legal moves of the position when already generated.
+    """
+    start = (polyglot_move >> 6) & 63
+    end = polyglot_move & 63
+    promotion = (polyglot_move >> 12) & 7
+    mailbox = board._mailbox
+    if mailbox[start] % 6 == KING and mailbox[end] == mailbox[start] - KING + ROOK:
+        # King takes own rook: castling towards that rook
+        end = start + 2 if end > start else start - 2
+    move = board.encode_move(start, end, promotion or QUEEN)
+    if legal_moves is None:
+        legal_moves = board.generate_legal_moves()
+    return move if move in legal_moves else None
+
+
+class OpeningBook:
+    """ Polyglot book file, memory-mapped and binary-searched on the position key """
+
+    def __init__(self, path, key=polyglot_key):
+        self.path = path
+        self.key = key
+        with open(path, 'rb') as book_file:
+            size = book_file.seek(0, 2)
+            if size % ENTRY_SIZE:
+                raise Exception('{} is not a Polyglot book: size {} is not a multiple of {}'.format(
+                    path, size, ENTRY_SIZE))
+            self._map = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._count = size // ENTRY_SIZE
+
+    def __len__(self):
+        return self._count
+
+    def _first(self, key):
+        """ Index of the first entry with a key not below key """
+        unpack_from = _KEY.unpack_from
+        data = self._map
+        low = 0
+        high = self._count
+        while low < high:
+            middle = (low + high) >> 1
+            if unpack_from(data, middle * ENTRY_SIZE)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def entries(self, board: Board):
+        """ (Polyglot move, weight, learn) of every entry of the position, as stored """
+        key = self.key(board)
+        found = []
+        unpack_from = _ENTRY.unpack_from
+        for index in range(self._first(key), self._count):
+            entry_key, move, weight, learn = unpack_from(self._map, index * ENTRY_SIZE)
+            if entry_key != key:
+                break
+            found.append((move, weight, learn))
+        return found
+
+    def moves(self, board: Board):
+        """ (encoded move, weight) of the legal book moves of the position, heaviest first """
+        moves = []
+        entries = self.entries(board)
+        legal_moves = board.generate_legal_moves() if entries else None
+        for polyglot_move, weight, _ in entries:
+            move = from_polyglot(board, polyglot_move, legal_moves)
+            if move is not None:
+                moves.append((move, weight))
+        moves.sort(key=lambda entry: -entry[1])
+        return moves
+
+    def choose(self, board: Board, rng=random):
+        """ Book move picked at random in proportion to its weight, None when the position is not in the book """
+        moves = [(move, weight) for move, weight in self.moves(board) if weight]
+        if not moves:
+            return None
+        return rng.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+    def best_move(self, board: Board):
+        """ Heaviest book move, None when the position is not in the book """
+        moves = self.moves(board)
+        return moves[0][0] if moves else None
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __contains__(self, board):
+        key = self.key(board)
+        index = self._first(key)
+        return index < self._count and _KEY.unpack_from(self._map, index * ENTRY_SIZE)[0] == key
+
+    def __repr__(self):
+        return 'OpeningBook({}, {} entries)'.format(self.path, self._count)
+
+
+def build_book(games, path, plies=20, min_games=1, key=polyglot_key):
+    """ Write a book of the first plies moves of games (PgnGame objects, e.g. pgn.read_games(...))
+
+    Each move scores 2 for a win, 1 for a draw and 0 for a loss of the side that played it, games
+    without a result count as draws and games with an illegal move are skipped. Moves played in fewer
+    than min_games games are left out, weights are scaled down to fit 16 bits. Returns the number of
+    entries written.
+    """
+    points = defaultdict(int)
+    counts = defaultdict(int)
+    for game in games:
+        white, black = RESULT_POINTS.get(game.result, (1, 1))
+        try:
+            moves = game.moves()[:plies]
+        except Exception:
+            continue
+        board = game.start_board()
+        for move in moves:
+            entry = (key(board), to_polyglot(move))
+            points[entry] += white if board._turn == WHITE else black
+            counts[entry] += 1
+            board.push(move)
+
+    entries = sorted(entry for entry, count in counts.items() if count >= min_games)
+    scale = max([points[entry] for entry in entries], default=0) / 0xFFFF
+    with open(path, 'wb') as book_file:
+        for entry_key, move in entries:
+            weight = points[(entry_key, move)]
+            if scale > 1:
+                weight = max(int(weight / scale), 1 if weight else 0)
+            book_file.write(_ENTRY.pack(entry_key, move, weight, 0))
+    return len(entries)
+
+
+def main(argv=None):
+    from pgn import read_games
+
+    parser = argparse.ArgumentParser(description='Build a Polyglot opening book from a PGN file')
+    parser.add_argument('pgn', help='PGN file, optionally compressed (.gz, .bz2, .xz)')
+    parser.add_argument('book', help='book file to write')
+    parser.add_argument('--plies', type=int, default=20, help='moves of each game that go into the book')
+    parser.add_argument('--min-games', type=int, default=1, help='games a move has to be played in')
+    args = parser.parse_args(argv)
+
+    count = build_book(read_games(args.pgn), args.book, args.plies, args.min_games)
+    print('{} entries written to {}'.format(count, args.book))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import io
+import os
+import random
+import tempfile
+import unittest
+import book
+import chess
+import notation
+import perft
+from engine import Engine
+from pgn import read_games
+from pgn_tests import PGN
+
+
+class TestOpeningBook(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'book.bin')
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_polyglot_moves(self):
+        for _, fen, _, _ in perft.REFERENCE_POSITIONS:
+            board = chess.Board.from_fen(fen)
+            for move in board.generate_legal_moves():
+                self.assertEqual(book.from_polyglot(board, book.to_polyglot(move)), move)
+
+        # Castling is the king taking its own rook, e1h1
+        board = chess.Board.from_fen('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1')
+        self.assertEqual(book.to_polyglot(notation.parse_san(board, 'O-O')), 7 | 4 << 6)
+        self.assertIsNone(book.from_polyglot(board, 4 | 12 << 6))
+
+    def test_third_party_book(self):
+        # An entry written by another Polyglot tool: the start position key, e2e4 with weight 5
+        with open(self.path, 'wb') as book_file:
+            book_file.write(book._ENTRY.pack(0x463b96181691fc9c, 28 | 12 << 6, 5, 0))
+        with book.OpeningBook(self.path) as opening_book:
+            board = chess.Board.from_fen(chess.START_FEN)
+            self.assertEqual([(notation.san(board, move), weight) for move, weight in opening_book.moves(board)],
+                             [('e4', 5)])
+
+    def test_build_and_probe(self):
+        count = book.build_book(read_games(io.StringIO(PGN)), self.path, plies=40)
+        self.assertEqual(os.path.getsize(self.path), count * book.ENTRY_SIZE)
+
+        with book.OpeningBook(self.path) as opening_book:
+            self.assertEqual(len(opening_book), count)
+            board = chess.Board.from_fen(chess.START_FEN)
+            self.assertIn(board, opening_book)
+            # e4 won, d4 was drawn
+            self.assertEqual([(notation.san(board, move), weight) for move, weight in opening_book.moves(board)],
+                             [('e4', 2), ('d4', 1)])
+            self.assertEqual(notation.san(board, opening_book.best_move(board)), 'e4')
+            rng = random.Random(1)
+            self.assertEqual({notation.san(board, opening_book.choose(board, rng)) for _ in range(50)}, {'e4', 'd4'})
+
+            # Morphy castled long on move 12
+            game = next(read_games(io.StringIO(PGN)))
+            for move in game.moves()[:22]:
+                board.push(move)
+            self.assertEqual(notation.san(board, opening_book.best_move(board)), 'O-O-O')
+
+            board = chess.Board.from_fen('4k3/8/8/8/8/8/8/4K3 w - - 0 1')
+            self.assertNotIn(board, opening_book)
+            self.assertIsNone(opening_book.choose(board))
+
+            # The engine plays from the book before it searches
+            engine = Engine(chess.Game.new(), hash_mb=1, book=opening_book)
+            self.assertIn(notation.san(engine.board, engine.best_move(depth=1)), ('e4', 'd4'))
+            self.assertEqual(engine.nodes, 0)
+
+    def test_invalid_book(self):
+        with open(self.path, 'wb') as book_file:
+            book_file.write(b'\0' * 17)
+        with self.assertRaises(Exception):
+            book.OpeningBook(self.path)
+
+        open(self.path, 'wb').close()
+        with book.OpeningBook(self.path) as opening_book:
+            self.assertIsNone(opening_book.best_move(chess.Board.from_fen(chess.START_FEN)))
+
+
+if __name__ == '__main__':
+    # To run: python -m unittest book_tests
+    unittest.main()
@@ -1,6 +1,13 @@
+from array import array
+from collections.abc import Sequence
 from enum import Enum
 from tools import color_fg_reset, color_fg, color_bg_reset
 from abc import ABC, abstractmethod
+from bitboard import BB_ALL, BB_SQUARES, BB_FILES, BB_RANKS, EMPTY, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+from bitboard import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, BETWEEN, rook_attacks, bishop_attacks, queen_attacks
+from bitboard import square_index, iter_bits, lsb, popcount
+from zobrist import PIECE_KEYS, TURN_KEY, CASTLING_KEYS, EP_KEYS
+from evaluation import SQUARE_SCORES, PIECE_PHASES
 
 
 class Color(Enum):
@@ -8,10 +15,20 @@ class Color(Enum):
     BLACK = 'b'  # dark
 
 
+# Index used for a color in bitboard arrays
+COLOR_INDEX = {Color.WHITE: WHITE, Color.BLACK: BLACK}
+COLORS = [Color.WHITE, Color.BLACK]
+
+
 class GameStatus(Enum):
     IN_PROGRESS = 'In Progress'
     STALEMATE = 'Stalemate'
     CHECKMATE = 'Checkmate'
+    DRAW_REPETITION = 'Draw by threefold repetition'
+    DRAW_FIFTY_MOVE = 'Draw by the fifty-move rule'
+    DRAW_FIVEFOLD_REPETITION = 'Draw by fivefold repetition'
+    DRAW_SEVENTY_FIVE_MOVE = 'Draw by the seventy-five-move rule'
+    INSUFFICIENT_MATERIAL = 'Draw by insufficient material'
 
 
 # FILES: A - H
@@ -21,21 +38,93 @@ COLUMNS = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']
 # RANKS: 1 - 8
 ROWS = [1, 2, 3, 4, 5, 6, 7, 8]
 
+# Fast lookups of 0-based file and rank indexes
+COLUMN_INDEX = {col: index for index, col in enumerate(COLUMNS)}
+ROW_INDEX = {row: index for index, row in enumerate(ROWS)}
 
 
-class Square:
-    """ One box that represents a single square on the board """
+# Moves are encoded as ints: from square (bits 0-5), to square (bits 6-11) and a flag (bits 12-15)
+QUIET = 0
+DOUBLE_PAWN_PUSH = 1
+KING_CASTLE = 2
+QUEEN_CASTLE = 3
+CAPTURE = 4
+EP_CAPTURE = 5
+PROMOTION = 8  # PROMOTION | (kind - KNIGHT), plus CAPTURE when the promotion takes a piece
+
+# Castling rights bits
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+# Rights kept when a move touches a square: moving the king or a rook (or capturing a rook) drops them
+CASTLING_MASK = [15] * 64
+CASTLING_MASK[square_index(4, 0)] = 15 ^ (WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[square_index(0, 0)] = 15 ^ WHITE_QUEENSIDE
+CASTLING_MASK[square_index(7, 0)] = 15 ^ WHITE_KINGSIDE
+CASTLING_MASK[square_index(4, 7)] = 15 ^ (BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASK[square_index(0, 7)] = 15 ^ BLACK_QUEENSIDE
+CASTLING_MASK[square_index(7, 7)] = 15 ^ BLACK_KINGSIDE
+
+
+# FEN letter of each piece index, white pieces upper case
+PIECE_SYMBOLS = 'PNBRQKpnbrqk'
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# FEN rows are expanded to one character per square, a digit becoming that many '.'
+_FEN_EXPAND = str.maketrans({str(run): '.' * run for run in range(1, 9)})
+_FEN_CODES = {symbol: code for code, symbol in enumerate(PIECE_SYMBOLS)}
+
+# Square index of each square in FEN order: A8 - H8, A7 - H7, ..., A1 - H1
+_FEN_ORDER = [square_index(file_index, rank_index) for rank_index in range(7, -1, -1) for file_index in range(8)]
+
+# FEN letter of each mailbox entry, one '1' per empty square: runs are counted by _FEN_RUNS
+_FEN_SYMBOLS = PIECE_SYMBOLS + '1'
+_FEN_RUNS = [('1' * run, str(run)) for run in range(8, 1, -1)]
+
 
+# Color of each square: dark when the file and rank indexes are both even or both odd, A1 is dark
+SQUARE_COLORS = [Color.BLACK if (index & 7) % 2 == (index >> 3) % 2 else Color.WHITE for index in range(64)]
+BB_LIGHT_SQUARES = sum(BB_SQUARES[index] for index in range(64) if SQUARE_COLORS[index] == Color.WHITE)
 
-    # Assuming: A=1, B=2, C=3, D=4, etc
-    EVEN_COLUMNS = [col for col in COLUMNS if COLUMNS.index(col) % 2 == 1]  # ['B', 'D', 'F', 'H']
-    ODD_COLUMNS = [col for col in COLUMNS if COLUMNS.index(col) % 2 == 0]  # ['A', 'C', 'E', 'G']
 
-    EVEN_ROWS = [row for row in ROWS if row % 2 == 0]  # [2, 4, 6, 8]
-    ODD_ROWS = [row for row in ROWS if row % 2 == 1]  # [1, 3, 5, 7]
-    
+def square_name(index):
+    """ Name of the square with bit index 0 - 63, e.g. E2 """
+    return '{}{}'.format(COLUMNS[index & 7], ROWS[index >> 3])
 
-    def __init__(self, col, row):
+
+def move_name(move):
+    """ Readable form of an encoded move, e.g. E2->E4 or E7->E8=Q """
+    name = '{}->{}'.format(square_name(move & 63), square_name((move >> 6) & 63))
+    if move >> 12 & PROMOTION:
+        name = '{}={}'.format(name, PIECE_SYMBOLS[KNIGHT + (move >> 12 & 3)])
+    return name
+
+
+def _add_moves(append, start, targets, enemy):
+    """ Append encoded moves from start to every target square, flagging captures """
+    captures = targets & enemy
+    quiets = targets ^ captures
+    start |= CAPTURE << 12
+    while captures:
+        low = captures & -captures
+        captures ^= low
+        append(start | (low.bit_length() - 1) << 6)
+    start ^= CAPTURE << 12
+    while quiets:
+        low = quiets & -quiets
+        quiets ^= low
+        append(start | (low.bit_length() - 1) << 6)
+
+
+class Square:
+    """ One box that represents a single square on the board """
+
+    __slots__ = ('col', 'row', 'index', '_board', '_piece')
+
+    def __init__(self, col, row, board_instance=None):
 
         if col not in COLUMNS:
             raise Exception('Col must be in list {}'.format(COLUMNS))
@@ -45,37 +134,31 @@ class Square:
 
         self.col = col
         self.row = row
+        self.index = square_index(COLUMN_INDEX[col], ROW_INDEX[row])  # Bit index: A1 = 0 ... H8 = 63
+        self._board = board_instance  # Board this square is a view of, if any
         self._piece = None  # Chess piece that occupies the square
-        self.color = self._initialize_color(col, row)  # A square can either be dark (BLACK) or light (WHITE)
+
+    @property
+    def color(self):
+        """ A square can either be dark (BLACK) or light (WHITE) """
+        return SQUARE_COLORS[self.index]
+
+    @property
+    def board(self):
+        return self._board
 
     @property
     def piece(self):
+        if self._board is not None:
+            return self._board.piece_at(self.index)
         return self._piece
 
     @piece.setter
     def piece(self, piece):
-        self._piece = piece
-
-    @staticmethod
-    def _initialize_color(col, row):
-        # odd - odd : dark
-        if col in Square.ODD_COLUMNS and row in Square.ODD_ROWS:
-            return Color.BLACK
-
-        # odd - even : light
-        elif col in Square.ODD_COLUMNS and row in Square.EVEN_ROWS:
-            return Color.WHITE
-
-        # even - even : dark
-        elif col in Square.EVEN_COLUMNS and row in Square.EVEN_ROWS:
-            return Color.BLACK
-
-        # even - odd : light
-        elif col in Square.EVEN_COLUMNS and row in Square.ODD_ROWS:
-            return Color.WHITE
-
+        if self._board is not None:
+            self._board.set_piece_at(self.index, piece)
         else:
-            raise Exception('Col {} and Row {} do not belong on the chess board')
+            self._piece = piece
 
     def __str__(self):
         bg = None
@@ -90,7 +173,16 @@ class Square:
 
 
 class Piece(ABC):
+    """ Chess piece of one kind and color
+
+    Pieces on a board are shared flyweights (see FLYWEIGHTS) unless an object was placed there: a flyweight
+    has no player, board or move history of its own and takes them from the square and board it is used on.
+    Setting player, board, alive or moves on a flyweight is ignored, as it would change every board.
+    """
+
+    __slots__ = ('_player', '_board', '_alive', '_moves', 'color', 'captured')
     short = ''
+    kind = None  # PAWN, KNIGHT, BISHOP, ROOK, QUEEN or KING
 
     def __init__(self, color, player=None, board_instance=None):
         self._player = player
@@ -102,7 +194,7 @@ class Piece(ABC):
         elif color.upper() in ['WHITE', 'BLACK']:
             self.color = getattr(Color, color.upper())
 
-        self.moves = 0  # count for completed moves
+        self._moves = 0  # count for completed moves
         self.captured = []  # all pieces that it has captured
 
         super().__init__()
@@ -113,7 +205,8 @@ class Piece(ABC):
 
     @player.setter
     def player(self, player):
-        self._player = player
+        if not self.flyweight:
+            self._player = player
 
     @property
     def board(self):
@@ -121,7 +214,8 @@ class Piece(ABC):
 
     @board.setter
     def board(self, board_instance):
-        self._board = board_instance
+        if not self.flyweight:
+            self._board = board_instance
 
     @property
     def alive(self):
@@ -129,14 +223,44 @@ class Piece(ABC):
 
     @alive.setter
     def alive(self, alive):
-        self._alive = alive
+        if not self.flyweight:
+            self._alive = alive
+
+    @property
+    def moves(self):
+        return self._moves
+
+    @moves.setter
+    def moves(self, moves):
+        if not self.flyweight:
+            self._moves = moves
+
+    @property
+    def index(self):
+        """ Index of the bitboard holding this piece: color * 6 + kind """
+        return COLOR_INDEX[self.color] * 6 + self.kind
+
+    @property
+    def flyweight(self):
+        """ Whether this is the piece shared by every board for its kind and color """
+        return FLYWEIGHTS[self.index] is self
+
+    def _board_of(self, square):
+        """ Board the piece plays on: its own, or the board of square for a flyweight """
+        return self._board if self._board is not None else square.board
 
     @abstractmethod
     def can_move(self, start: Square, end: Square):
-        if not self.player:
+        player = self.player
+        board = self.board
+        if self.flyweight and start.board is not None:
+            board = start.board
+            player = board._players[COLOR_INDEX[self.color]]
+
+        if not player:
             raise Exception('Illegal move: piece does not belong to any player')
 
-        if not self.board:
+        if not board:
             raise Exception('Illegal move: piece is not on the board')
 
     def __str__(self):
@@ -147,7 +271,9 @@ class Piece(ABC):
 
 
 class Pawn(Piece):
+    __slots__ = ()
     short = 'P'
+    kind = PAWN
 
     def can_move(self, start: Square, end: Square) -> bool:
         super().can_move(start, end)
@@ -158,7 +284,12 @@ class Pawn(Piece):
         diagonal_squares = self._get_pawn_diagonal_squares(start)
 
         if not end.piece:
-            if self.moves == 0:
+            board = self._board_of(start)
+            if end in diagonal_squares and board is not None and end.index == board.ep_square:
+                # En passant: take the pawn that just passed end with a double step
+                return True
+            # A flyweight has no move count: it has not moved while it stands on its starting row
+            if (start.row == (2 if self.color == Color.WHITE else 7)) if self.flyweight else self.moves == 0:
                 # If it has not yet moved, the pawn has the option of moving two squares forward
                 # provided both squares in front of the pawn are unoccupied.
                 if end in forward_squares:
@@ -179,16 +310,17 @@ class Pawn(Piece):
         """ Returns a tuple of forward square for a pawn """
         forward_square_1 = None
         forward_square_2 = None
+        board = self._board_of(current_square)
         try:
             if self.color == Color.WHITE:
                 # Same column, row + 1, row + 2
-                forward_square_1 = self.board.get_square(current_square.col, current_square.row + 1)
-                forward_square_2 = self.board.get_square(current_square.col, current_square.row + 2)
+                forward_square_1 = board.get_square(current_square.col, current_square.row + 1)
+                forward_square_2 = board.get_square(current_square.col, current_square.row + 2)
 
             elif self.color == Color.BLACK:
                 # Same column, row - 1, row - 2
-                forward_square_1 = self.board.get_square(current_square.col, current_square.row - 1)
-                forward_square_2 = self.board.get_square(current_square.col, current_square.row - 2)
+                forward_square_1 = board.get_square(current_square.col, current_square.row - 1)
+                forward_square_2 = board.get_square(current_square.col, current_square.row - 2)
 
         except Exception as exc:
             # Square does not exist
@@ -201,17 +333,18 @@ class Pawn(Piece):
         diagonal_square_1 = None
         diagonal_square_2 = None
         col_index = COLUMNS.index(current_square.col)
+        board = self._board_of(current_square)
         try:
 
             if self.color == Color.WHITE:
                 # Row above, square on left and right (i.e. -1, +1 Column)
-                diagonal_square_1 = self.board.get_square(COLUMNS[col_index - 1], current_square.row + 1)
-                diagonal_square_2 = self.board.get_square(COLUMNS[col_index + 1], current_square.row + 1)
+                diagonal_square_1 = board.get_square(COLUMNS[col_index - 1], current_square.row + 1)
+                diagonal_square_2 = board.get_square(COLUMNS[col_index + 1], current_square.row + 1)
 
             elif self.color == Color.BLACK:
                 # Row below, square on left and right (i.e. -1, +1 Column )
-                diagonal_square_1 = self.board.get_square(COLUMNS[col_index - 1], current_square.row - 1)
-                diagonal_square_2 = self.board.get_square(COLUMNS[col_index + 1], current_square.row - 1)
+                diagonal_square_1 = board.get_square(COLUMNS[col_index - 1], current_square.row - 1)
+                diagonal_square_2 = board.get_square(COLUMNS[col_index + 1], current_square.row - 1)
         except Exception as exc:
             pass
 
@@ -219,7 +352,9 @@ class Pawn(Piece):
 
 
 class King(Piece):
+    __slots__ = ()
     short = 'K'
+    kind = KING
 
     def can_move(self, start: Square, end: Square) -> bool:
         super().can_move(start, end)
@@ -228,72 +363,27 @@ class King(Piece):
     def _king_can_move(self, start: Square, end: Square) -> bool:
         # King can move exactly one square horizontally, vertically, or diagonally.
         # At most once in every game, each king is allowed to make a special move, known as castling.
-
-        neighbors = self._get_king_neighbor_squares(start)
-        if (end.piece and end.piece.color != self.color or not end.piece) and end in neighbors:
+        board = self._board_of(start)
+        targets = KING_ATTACKS[start.index] & ~board.occupancy(self.color)
+        if targets & BB_SQUARES[end.index]:
             return True
 
-        # TODO castling move
+        # Castling: the king moves two squares towards a rook, provided the board allows it
+        if abs(end.index - start.index) == 2 and start.row == end.row:
+            for code in board.generate_legal_moves(self.color):
+                if code & 0xFFF == start.index | end.index << 6 and code >> 12 in (KING_CASTLE, QUEEN_CASTLE):
+                    return True
         return False
 
     def _get_king_neighbor_squares(self, current_square):
-        neighbors = []
-        col_index = COLUMNS.index(current_square.col)
-
-        # On the same row at col - 1 and col + 1
-        try:
-            before = self.board.get_square(COLUMNS[col_index - 1], current_square.row)
-            neighbors.append(before)
-        except Exception as exc:
-            pass
-
-        try:
-            after = self.board.get_square(COLUMNS[col_index + 1], current_square.row)
-            neighbors.append(after)
-        except Exception as exc:
-            pass
-
-        # same cold at row - 1 and row + 1
-        try:
-            above = self.board.get_square(current_square.col, current_square.row - 1)
-            neighbors.append(above)
-        except Exception as exc:
-            pass
-
-        try:
-            below = self.board.get_square(current_square.col, current_square.row + 1)
-            neighbors.append(below)
-        except Exception as exc:
-            pass
-
-        # diagonally
-        try:
-            diagonal_1 = self.board.get_square(COLUMNS[col_index - 1], current_square.row - 1)
-            neighbors.append(diagonal_1)
-        except Exception as exc:
-            pass
-        try:
-            diagonal_2 = self.board.get_square(COLUMNS[col_index - 1], current_square.row + 1)
-            neighbors.append(diagonal_2)
-        except Exception as exc:
-            pass
-        try:
-            diagonal_3 = self.board.get_square(COLUMNS[col_index + 1], current_square.row + 1)
-            neighbors.append(diagonal_3)
-        except Exception as exc:
-            pass
-
-        try:
-            diagonal_4 = self.board.get_square(COLUMNS[col_index + 1], current_square.row - 1)
-            neighbors.append(diagonal_4)
-        except Exception as exc:
-            pass
-
-        return neighbors
+        board = self._board_of(current_square)
+        return [board.square_at(index) for index in iter_bits(KING_ATTACKS[current_square.index])]
 
 
 class Queen(Piece):
+    __slots__ = ()
     short = 'Q'
+    kind = QUEEN
 
     def can_move(self, start: Square, end: Square) -> bool:
         super().can_move(start, end)
@@ -301,11 +391,20 @@ class Queen(Piece):
 
     def _queen_can_move(self, start: Square, end: Square) -> bool:
         # Queen can move any number of vacant squares diagonally, horizontally, or vertically.
-        return True
+        if self._get_queen_targets(start) & BB_SQUARES[end.index]:
+            return True
+        return False
+
+    def _get_queen_targets(self, current_square):
+        board = self._board_of(current_square)
+        attacks = queen_attacks(current_square.index, board.occupied)
+        return attacks & ~board.occupancy(self.color)
 
 
 class Bishop(Piece):
+    __slots__ = ()
     short = 'B'
+    kind = BISHOP
 
     def can_move(self, start: Square, end: Square) -> bool:
         super().can_move(start, end)
@@ -313,11 +412,20 @@ class Bishop(Piece):
 
     def _bishop_can_move(self, start: Square, end: Square) -> bool:
         # Bishop can move any number of vacant squares in any diagonal direction.
-        return True
+        if self._get_bishop_targets(start) & BB_SQUARES[end.index]:
+            return True
+        return False
+
+    def _get_bishop_targets(self, current_square):
+        board = self._board_of(current_square)
+        attacks = bishop_attacks(current_square.index, board.occupied)
+        return attacks & ~board.occupancy(self.color)
 
 
 class Knight(Piece):
+    __slots__ = ()
     short = 'N'
+    kind = KNIGHT
 
     def can_move(self, start: Square, end: Square) -> bool:
         super().can_move(start, end)
@@ -325,81 +433,20 @@ class Knight(Piece):
 
     def _knight_can_move(self, start: Square, end: Square) -> bool:
         # Knight can move one square along any rank or file and then at an angle.
-        if end in self._get_knight_legal_moves(start):
+        targets = KNIGHT_ATTACKS[start.index] & ~self._board_of(start).occupancy(self.color)
+        if targets & BB_SQUARES[end.index]:
             return True
         return False
 
     def _get_knight_legal_moves(self, current_square):
-        moves = []
-        col_index = COLUMNS.index(current_square.col)
-
-        # Left above 1
-        try:
-            if col_index - 1 < 0:
-                raise Exception('Col Index Error')
-
-            move_1 = self.board.get_square(COLUMNS[col_index - 1], current_square.row + 2)
-            moves.append(move_1)
-        except Exception as exc:
-            pass
-
-        # Left above 2
-        try:
-            if col_index - 2 < 0:
-                raise Exception('Col Index Error')
-            move_2 = self.board.get_square(COLUMNS[col_index - 2], current_square.row + 1)
-            moves.append(move_2)
-        except Exception as exc:
-            pass
-
-        # Left below 1
-        try:
-            if col_index - 1 < 0:
-                raise Exception('Col Index Error')
-            move_3 = self.board.get_square(COLUMNS[col_index - 1], current_square.row - 2)
-            moves.append(move_3)
-        except Exception as exc:
-            pass
-
-        # Left below 2
-        try:
-            if col_index - 2 < 0:
-                raise Exception('Col Index Error')
-            move_4 = self.board.get_square(COLUMNS[col_index - 2], current_square.row - 1)
-            moves.append(move_4)
-        except Exception as exc:
-            pass
-
-        # Right above 1
-        try:
-            move_5 = self.board.get_square(COLUMNS[col_index + 1], current_square.row + 2)
-            moves.append(move_5)
-        except Exception as exc:
-            pass
-        try:
-            move_6 = self.board.get_square(COLUMNS[col_index + 2], current_square.row + 1)
-            moves.append(move_6)
-        except Exception as exc:
-            pass
-
-        # Right below 1
-        try:
-            move_7 = self.board.get_square(COLUMNS[col_index + 2], current_square.row - 1)
-            moves.append(move_7)
-        except Exception as exc:
-            pass
-
-        try:
-            move_8 = self.board.get_square(COLUMNS[col_index + 1], current_square.row - 2)
-            moves.append(move_8)
-        except Exception as exc:
-            pass
-
-        return moves
+        board = self._board_of(current_square)
+        return [board.square_at(index) for index in iter_bits(KNIGHT_ATTACKS[current_square.index])]
 
 
 class Rook(Piece):
+    __slots__ = ()
     short = 'R'
+    kind = ROOK
 
     def can_move(self, start: Square, end: Square) -> bool:
         super().can_move(start, end)
@@ -408,72 +455,857 @@ class Rook(Piece):
     def _rook_can_move(self, start: Square, end: Square) -> bool:
         # A rook can move any number of squares along a rank or file, but cannot leap over other pieces.
         # Along with the king, a rook is involved during the king's castling move.
-
-        if end in self._get_rook_legal_movements(start):
-            # TODO Rook cannot skip occupied cell
+        if self._get_rook_targets(start) & BB_SQUARES[end.index]:
             return True
         return False
 
+    def _get_rook_targets(self, current_square):
+        board = self._board_of(current_square)
+        attacks = rook_attacks(current_square.index, board.occupied)
+        return attacks & ~board.occupancy(self.color)
+
     def _get_rook_legal_movements(self, current_square):
-        col = current_square.col
-        row = current_square.row
-        # all squares on the same row + squares on same column
-        same_col = self.board.get_squares_at_col(col)
-        same_row = self.board.get_squares_at_row(row)
+        board = self._board_of(current_square)
+        return [board.square_at(index) for index in iter_bits(self._get_rook_targets(current_square))]
+
+
+# Piece class for each kind index
+PIECE_CLASSES = [Pawn, Knight, Bishop, Rook, Queen, King]
+
+# Shared piece of each bitboard index (color * 6 + kind), what boards hand out for squares without a placed object
+FLYWEIGHTS = tuple(PIECE_CLASSES[kind](color) for color in COLORS for kind in range(6))
+for _flyweight in FLYWEIGHTS:
+    _flyweight.captured = ()  # Shared pieces keep no capture history
+del _flyweight
 
-        movements = list(set(same_col + same_row))
-        movements.remove(current_square)
-        return movements
+# Kind of the pieces on the first row, from column A to H
+BACK_RANK = [ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK]
 
 
 class Board:
-    """ Single board: 64 squares, 32 dark color and 32 light color"""
+    """ Single board: 64 squares, 32 dark color and 32 light color
+
+    Pieces are stored as one bitboard per piece kind and color plus an occupancy mask per color.
+    A 64 byte mailbox maps each square index to the bitboard index of the piece standing on it.
+    Square objects are only views on top of that, created the first time they are asked for, and
+    pieces are the shared FLYWEIGHTS unless a Piece object was placed on the square.
+
+    Like the Zobrist key, the material + piece-square score and the game phase of the evaluation are
+    kept up to date by every change, so evaluating a position costs no scan of the board. Checkers,
+    pins and attack maps are computed when first asked for and cached until the position changes.
+    """
+
+    __slots__ = ('_bitboards', '_occupancy', '_mailbox', '_pieces', '_square_views', '_players', '_turn',
+                 '_castling_rights', '_ep_square', 'halfmove_clock', 'fullmove_number', '_stack', '_key',
+                 '_score', '_phase', '_cache')
 
     def __init__(self):
-        self._squares = self.initialize()
+        self._bitboards = [0] * 12  # One 64-bit integer per (color, kind)
+        self._occupancy = [0, 0]  # All white pieces, all black pieces
+        self._mailbox = bytearray([EMPTY] * 64)  # Bitboard index of the piece on each square
+        self._pieces = {}  # Piece objects placed on squares, by square index
+        self._square_views = {}
+        self._players = [None, None]  # Players of each side, owners of the flyweights on this board
+
+        self._turn = WHITE  # Side to move
+        self._castling_rights = 0  # WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+        self._ep_square = None  # Square index a pawn can capture en passant on
+        self.halfmove_clock = 0  # Moves since the last capture or pawn move
+        self.fullmove_number = 1
+        self._stack = []  # Undo entries of the moves pushed on this board
+        self._key = CASTLING_KEYS[0]  # Zobrist key, kept up to date by every change
+        self._score = 0  # Packed middlegame and endgame score from white's point of view, see evaluation.py
+        self._phase = 0
+        self._cache = None  # Checkers, pins and attack maps of the position, see _cached
 
     @property
     def squares(self):
-        return self._squares
+        """ Squares grouped by row, as {row: [square on col A, ..., square on col H]} """
+        return {row: self.get_squares_at_row(row) for row in ROWS}
 
     @squares.setter
     def squares(self, squares):
-        self._squares = squares
-
-    @staticmethod
-    def initialize():
-        """ Create squares on the board"""
-
-        # Create a dict to hold the squares
-        squares = {}
-        for row in ROWS:
-            squares_on_row = []
-            for col in COLUMNS:
-                square = Square(col, row)
-                squares_on_row.append(square)
-            squares[row] = squares_on_row
-        return squares
+        for index in range(64):
+            self.set_piece_at(index, None)
+        for row_squares in squares.values():
+            for square in row_squares:
+                self.set_piece_at(square.index, square.piece)
+
+    @property
+    def turn(self):
+        """ Color of the side to move """
+        return COLORS[self._turn]
+
+    @turn.setter
+    def turn(self, color):
+        if COLOR_INDEX[color] != self._turn:
+            self._key ^= self._ep_key()
+            self._turn ^= 1
+            self._key ^= TURN_KEY ^ self._ep_key()
+
+    @property
+    def castling_rights(self):
+        return self._castling_rights
+
+    @castling_rights.setter
+    def castling_rights(self, rights):
+        self._key ^= CASTLING_KEYS[self._castling_rights] ^ CASTLING_KEYS[rights]
+        self._castling_rights = rights
+
+    @property
+    def ep_square(self):
+        return self._ep_square
+
+    @ep_square.setter
+    def ep_square(self, index):
+        self._key ^= self._ep_key()
+        self._ep_square = index
+        self._key ^= self._ep_key()
+
+    def _ep_key(self):
+        """ En passant part of the Zobrist key: the key of the en passant file when a pawn of the side to
+        move can capture there, else 0, so a position repeats whether or not a double push led to it """
+        ep_square = self._ep_square
+        if ep_square is not None and PAWN_ATTACKS[self._turn ^ 1][ep_square] & self._bitboards[self._turn * 6 + PAWN]:
+            return EP_KEYS[ep_square & 7]
+        return 0
+
+    @property
+    def zobrist_key(self):
+        """ 64-bit hash of the position: pieces, side to move, castling rights and en passant file (when a
+        capture there is possible) """
+        return self._key
+
+    def compute_zobrist_key(self):
+        """ Zobrist key computed from scratch, zobrist_key keeps the same value up to date move by move """
+        key = CASTLING_KEYS[self._castling_rights]
+        for index, code in enumerate(self._mailbox):
+            if code != EMPTY:
+                key ^= PIECE_KEYS[code][index]
+        if self._turn == BLACK:
+            key ^= TURN_KEY
+        key ^= self._ep_key()
+        return key
+
+    def compute_score(self):
+        """ (packed score, phase) of the evaluation computed from scratch, kept up to date move by move """
+        score = phase = 0
+        for index, code in enumerate(self._mailbox):
+            if code != EMPTY:
+                score += SQUARE_SCORES[code][index]
+                phase += PIECE_PHASES[code]
+        return score, phase
+
+    @property
+    def occupied(self):
+        """ Bitboard of every occupied square """
+        return self._occupancy[WHITE] | self._occupancy[BLACK]
+
+    def occupancy(self, color=None):
+        """ Bitboard of the squares occupied by color, or by any piece """
+        if color is None:
+            return self.occupied
+        return self._occupancy[COLOR_INDEX[color]]
+
+    def bitboard(self, kind, color):
+        """ Bitboard of the pieces of one kind and color """
+        return self._bitboards[COLOR_INDEX[color] * 6 + kind]
+
+    def piece_at(self, index):
+        """ Return piece on the square with bit index 0 - 63: the object placed there, else the flyweight """
+        piece = self._pieces.get(index)
+        if piece is None:
+            code = self._mailbox[index]
+            if code != EMPTY:
+                return FLYWEIGHTS[code]
+        return piece
+
+    def set_piece_at(self, index, piece):
+        """ Put piece (or None) on the square with bit index 0 - 63 """
+        bit = BB_SQUARES[index]
+        old = self._mailbox[index]
+        self._cache = None
+        # Whether en passant is possible may change with the pawns
+        self._key ^= self._ep_key()
+        if old != EMPTY:
+            self._bitboards[old] ^= bit
+            self._occupancy[old // 6] ^= bit
+            self._key ^= PIECE_KEYS[old][index]
+            self._score -= SQUARE_SCORES[old][index]
+            self._phase -= PIECE_PHASES[old]
+
+        if piece is None:
+            self._mailbox[index] = EMPTY
+        else:
+            new = piece.index
+            self._mailbox[index] = new
+            self._bitboards[new] |= bit
+            self._occupancy[new // 6] |= bit
+            self._key ^= PIECE_KEYS[new][index]
+            self._score += SQUARE_SCORES[new][index]
+            self._phase += PIECE_PHASES[new]
+
+        # Only pieces with state of their own are kept, a flyweight is implied by the mailbox
+        if piece is None or piece.flyweight:
+            self._pieces.pop(index, None)
+        else:
+            self._pieces[index] = piece
+        self._key ^= self._ep_key()
+
+    def square_at(self, index):
+        """ Return square view for bit index 0 - 63 """
+        square = self._square_views.get(index)
+        if square is None:
+            square = Square(COLUMNS[index & 7], ROWS[index >> 3], self)
+            self._square_views[index] = square
+        return square
 
     def get_square(self, col, row):
         """ Return square on col and row """
-        if col not in COLUMNS or row not in ROWS:
+        col_index = COLUMN_INDEX.get(col)
+        row_index = ROW_INDEX.get(row)
+        if col_index is None or row_index is None:
             raise Exception('Square at {}{} does not exist'.format(col, row))
-        return self.get_squares_at_row(row)[COLUMNS.index(col)]
+        return self.square_at(square_index(col_index, row_index))
 
     def get_piece(self, col, row):
         """ Return piece at col and row """
         return self.get_square(col, row).piece
 
     def get_squares_at_row(self, row):
-        if row not in ROWS:
+        row_index = ROW_INDEX.get(row)
+        if row_index is None:
             raise Exception('Row {} does not exist'.format(row))
-        return self.squares[row]
+        return [self.square_at(square_index(col_index, row_index)) for col_index in range(8)]
 
     def get_squares_at_col(self, col):
-        if col not in COLUMNS:
+        col_index = COLUMN_INDEX.get(col)
+        if col_index is None:
             raise Exception('Col {} does not exist'.format(col))
-        col_index = COLUMNS.index(col)
-        return [square[col_index] for _, square in self.squares.items() if square[col_index].col == col]
+        return [self.square_at(square_index(col_index, row_index)) for row_index in range(8)]
+
+    def copy(self):
+        """ Independent board with the same position and move stack, copied array by array
+
+        Placed Piece objects and players are shared with this board, square views are not.
+        """
+        board = Board.__new__(Board)
+        board._bitboards = self._bitboards[:]
+        board._occupancy = self._occupancy[:]
+        board._mailbox = self._mailbox[:]
+        board._pieces = self._pieces.copy()
+        board._square_views = {}
+        board._players = self._players[:]
+        board._turn = self._turn
+        board._castling_rights = self._castling_rights
+        board._ep_square = self._ep_square
+        board.halfmove_clock = self.halfmove_clock
+        board.fullmove_number = self.fullmove_number
+        board._stack = self._stack[:]
+        board._key = self._key
+        board._score = self._score
+        board._phase = self._phase
+        board._cache = None
+        return board
+
+    @classmethod
+    def from_fen(cls, fen):
+        """ Build a board from a FEN string, e.g. rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1 """
+        board = cls()
+        board.set_fen(fen)
+        return board
+
+    def set_fen(self, fen):
+        """ Replace the position with the one described by a FEN string
+
+        The clocks may be left out (they default to 0 and 1). Raises an exception for a malformed
+        FEN and for an impossible position: a side without exactly one king, a pawn on the first or
+        last rank, an en passant square behind no pawn, or the side that just moved left in check.
+        """
+        fields = fen.split()
+        if not 4 <= len(fields) <= 6:
+            raise Exception('Invalid FEN {}: expected 4 to 6 fields'.format(fen))
+        rows = fields[0].split('/')
+        if len(rows) != 8:
+            raise Exception('Invalid FEN {}: expected 8 rows'.format(fen))
+
+        expanded = [row.translate(_FEN_EXPAND) for row in rows]
+        for row, squares in zip(rows, expanded):
+            if len(squares) != 8:
+                raise Exception('Invalid FEN {}: bad row {}'.format(fen, row))
+
+        side = fields[1]
+        if side != 'w' and side != 'b':
+            raise Exception('Invalid FEN {}: bad side to move'.format(fen))
+
+        castling_rights = 0
+        if fields[2] != '-':
+            for symbol in fields[2]:
+                bit = 'KQkq'.find(symbol)
+                if bit < 0:
+                    raise Exception('Invalid FEN {}: bad castling rights'.format(fen))
+                castling_rights |= 1 << bit
+
+        ep_square = None
+        if fields[3] != '-':
+            ep = fields[3]
+            if len(ep) != 2 or ep[0].upper() not in COLUMN_INDEX or ep[1] != ('6' if side == 'w' else '3'):
+                raise Exception('Invalid FEN {}: bad en passant square'.format(fen))
+            ep_square = square_index(COLUMN_INDEX[ep[0].upper()], int(ep[1]) - 1)
+
+        clocks = fields[4:]
+        if not all(clock.isdigit() for clock in clocks):
+            raise Exception('Invalid FEN {}: bad move counters'.format(fen))
+
+        # Fill the board directly, no Piece objects are created until they are asked for
+        mailbox = [EMPTY] * 64
+        bitboards = [0] * 12
+        key = 0
+        for index, symbol in zip(_FEN_ORDER, ''.join(expanded)):
+            if symbol != '.':
+                code = _FEN_CODES.get(symbol)
+                if code is None:
+                    raise Exception('Invalid FEN {}: bad piece {}'.format(fen, symbol))
+                mailbox[index] = code
+                bitboards[code] |= BB_SQUARES[index]
+                key ^= PIECE_KEYS[code][index]
+
+        if popcount(bitboards[KING]) != 1 or popcount(bitboards[6 + KING]) != 1:
+            raise Exception('Invalid FEN {}: each side needs exactly one king'.format(fen))
+        if (bitboards[PAWN] | bitboards[6 + PAWN]) & (BB_RANKS[0] | BB_RANKS[7]):
+            raise Exception('Invalid FEN {}: pawn on the first or last rank'.format(fen))
+        if ep_square is not None and not bitboards[(6 if side == 'w' else 0) + PAWN] & BB_SQUARES[
+                ep_square - 8 if side == 'w' else ep_square + 8]:
+            raise Exception('Invalid FEN {}: no pawn to capture en passant'.format(fen))
+
+        self._mailbox = bytearray(mailbox)
+        self._bitboards = bitboards
+        self._occupancy = [bitboards[0] | bitboards[1] | bitboards[2] | bitboards[3] | bitboards[4] | bitboards[5],
+                           bitboards[6] | bitboards[7] | bitboards[8] | bitboards[9] | bitboards[10] | bitboards[11]]
+        self._pieces = {}
+        self._turn = WHITE if side == 'w' else BLACK
+        self._castling_rights = castling_rights
+        self._ep_square = ep_square
+        self.halfmove_clock = int(clocks[0]) if clocks else 0
+        self.fullmove_number = int(clocks[1]) if len(clocks) > 1 else 1
+        self._stack = []
+
+        key ^= CASTLING_KEYS[castling_rights]
+        if side == 'b':
+            key ^= TURN_KEY
+        self._key = key ^ self._ep_key()
+        self._score, self._phase = self.compute_score()
+        self._cache = None
+
+        if self._checkers(self._turn ^ 1):
+            raise Exception('Invalid FEN {}: the side not to move is in check'.format(fen))
+
+    def to_fen(self):
+        """ FEN string of the position """
+        symbols = _FEN_SYMBOLS
+        mailbox = self._mailbox
+        placement = '/'.join(''.join([symbols[code] for code in mailbox[start:start + 8]])
+                             for start in range(56, -8, -8))
+        for run, digit in _FEN_RUNS:
+            if run in placement:
+                placement = placement.replace(run, digit)
+
+        rights = self._castling_rights
+        castling = ''.join(symbol for bit, symbol in enumerate('KQkq') if rights & 1 << bit) if rights else '-'
+        ep = square_name(self._ep_square).lower() if self._ep_square is not None else '-'
+        return '{} {} {} {} {} {}'.format(placement, 'w' if self._turn == WHITE else 'b', castling, ep,
+                                          self.halfmove_clock, self.fullmove_number)
+
+    def generate_legal_moves(self, color=None, moves=None):
+        """ Return every legal move of color (default: side to move) as encoded ints
+
+        Moves are generated in a single pass without playing them: pinned pieces are restricted to the
+        line between their king and the pinner, and when in check every non-king move has to capture
+        the checker or block it. King moves are tested against attacks with the king lifted off the board.
+
+        The moves are appended to moves when given, e.g. a reused array('H') buffer, else to a new list.
+        """
+        us = self._turn if color is None else COLOR_INDEX[color]
+        them = us ^ 1
+        bbs = self._bitboards
+        own = self._occupancy[us]
+        enemy = self._occupancy[them]
+        occupied = own | enemy
+        base = us * 6
+        enemy_base = them * 6
+        if moves is None:
+            moves = []
+        append = moves.append
+
+        target = ~own & BB_ALL  # Squares the pieces other than the king may move to
+        pinned = 0
+        pin_rays = None
+        king = bbs[base + KING]
+        if king:
+            king_square = lsb(king)
+            checkers = self._checkers(us)
+
+            # King moves
+            king_targets = KING_ATTACKS[king_square] & target
+            without_king = occupied ^ king
+            while king_targets:
+                low = king_targets & -king_targets
+                king_targets ^= low
+                to = low.bit_length() - 1
+                if not self._is_attacked(to, them, without_king):
+                    append(king_square | to << 6 | (CAPTURE << 12 if low & enemy else 0))
+
+            if checkers:
+                if checkers & (checkers - 1):
+                    # Double check: only the king can move
+                    return moves
+                target &= BETWEEN[king_square][lsb(checkers)] | checkers
+            else:
+                self._add_castling_moves(append, us, king_square, occupied)
+
+            pinned, pin_rays = self._pinned(us)
+
+        # Knights: a pinned knight can never move
+        knights = bbs[base + KNIGHT] & ~pinned
+        while knights:
+            low = knights & -knights
+            knights ^= low
+            start = low.bit_length() - 1
+            _add_moves(append, start, KNIGHT_ATTACKS[start] & target, enemy)
+
+        # Sliders, queens move along both lines
+        for pieces, attacks in ((bbs[base + BISHOP] | bbs[base + QUEEN], bishop_attacks),
+                                (bbs[base + ROOK] | bbs[base + QUEEN], rook_attacks)):
+            while pieces:
+                low = pieces & -pieces
+                pieces ^= low
+                start = low.bit_length() - 1
+                targets = attacks(start, occupied) & target
+                if low & pinned:
+                    targets &= pin_rays[start]
+                _add_moves(append, start, targets, enemy)
+
+        # Pawns, generated set-wise
+        pawns = bbs[base + PAWN]
+        empty = ~occupied & BB_ALL
+        if us == WHITE:
+            forward = 8
+            single = (pawns << 8) & empty
+            double = ((single & BB_RANKS[2]) << 8) & empty
+            left = ((pawns & ~BB_FILES[0]) << 7) & enemy
+            right = ((pawns & ~BB_FILES[7]) << 9) & enemy
+            last_rank = BB_RANKS[7]
+        else:
+            forward = -8
+            single = (pawns >> 8) & empty
+            double = ((single & BB_RANKS[5]) >> 8) & empty
+            left = ((pawns & ~BB_FILES[0]) >> 9) & enemy
+            right = ((pawns & ~BB_FILES[7]) >> 7) & enemy
+            last_rank = BB_RANKS[0]
+
+        for targets, delta, flag in ((single & target, forward, QUIET),
+                                     (double & target, forward * 2, DOUBLE_PAWN_PUSH),
+                                     (left & target, forward - 1, CAPTURE),
+                                     (right & target, forward + 1, CAPTURE)):
+            while targets:
+                low = targets & -targets
+                targets ^= low
+                to = low.bit_length() - 1
+                start = to - delta
+                if pinned & BB_SQUARES[start] and not pin_rays[start] & low:
+                    continue
+                if low & last_rank:
+                    # Promotions, best piece first
+                    move = start | to << 6 | (flag | PROMOTION) << 12
+                    append(move | (QUEEN - KNIGHT) << 12)
+                    append(move | (ROOK - KNIGHT) << 12)
+                    append(move | (BISHOP - KNIGHT) << 12)
+                    append(move)
+                else:
+                    append(start | to << 6 | flag << 12)
+
+        # En passant
+        ep_square = self._ep_square
+        if ep_square is not None:
+            captured_square = ep_square - forward
+            ep_bit = BB_SQUARES[ep_square]
+            if target & (ep_bit | BB_SQUARES[captured_square]):
+                capturers = PAWN_ATTACKS[them][ep_square] & pawns
+                while capturers:
+                    low = capturers & -capturers
+                    capturers ^= low
+                    if king:
+                        # Both pawns leave their squares at once, which can expose the king along a line
+                        after = (occupied ^ low ^ BB_SQUARES[captured_square]) | ep_bit
+                        if rook_attacks(king_square, after) & (bbs[enemy_base + ROOK] | bbs[enemy_base + QUEEN]):
+                            continue
+                        if bishop_attacks(king_square, after) & (bbs[enemy_base + BISHOP] | bbs[enemy_base + QUEEN]):
+                            continue
+                    append(low.bit_length() - 1 | ep_square << 6 | EP_CAPTURE << 12)
+
+        return moves
+
+    def _add_castling_moves(self, append, us, king_square, occupied):
+        """ Castling moves for a king that is not in check """
+        rights = self._castling_rights >> (2 * us)
+        first = 56 * us  # Square index of the A file on the home rank
+        if king_square != first + 4 or not rights & 3:
+            return
+        them = us ^ 1
+        rooks = self._bitboards[us * 6 + ROOK]
+        if (rights & 1 and rooks & BB_SQUARES[first + 7] and not occupied & BETWEEN[first + 4][first + 7]
+                and not self._is_attacked(first + 5, them, occupied)
+                and not self._is_attacked(first + 6, them, occupied)):
+            append(king_square | (first + 6) << 6 | KING_CASTLE << 12)
+        if (rights & 2 and rooks & BB_SQUARES[first] and not occupied & BETWEEN[first + 4][first]
+                and not self._is_attacked(first + 3, them, occupied)
+                and not self._is_attacked(first + 2, them, occupied)):
+            append(king_square | (first + 2) << 6 | QUEEN_CASTLE << 12)
+
+    def _attackers(self, index, by, occupied):
+        """ Bitboard of the pieces of color index by attacking the square index """
+        bbs = self._bitboards
+        base = by * 6
+        return ((PAWN_ATTACKS[by ^ 1][index] & bbs[base + PAWN])
+                | (KNIGHT_ATTACKS[index] & bbs[base + KNIGHT])
+                | (KING_ATTACKS[index] & bbs[base + KING])
+                | (rook_attacks(index, occupied) & (bbs[base + ROOK] | bbs[base + QUEEN]))
+                | (bishop_attacks(index, occupied) & (bbs[base + BISHOP] | bbs[base + QUEEN])))
+
+    def _is_attacked(self, index, by, occupied):
+        """ Whether any piece of color index by attacks the square index """
+        bbs = self._bitboards
+        base = by * 6
+        if KNIGHT_ATTACKS[index] & bbs[base + KNIGHT] or PAWN_ATTACKS[by ^ 1][index] & bbs[base + PAWN]:
+            return True
+        if KING_ATTACKS[index] & bbs[base + KING]:
+            return True
+        if rook_attacks(index, occupied) & (bbs[base + ROOK] | bbs[base + QUEEN]):
+            return True
+        return bool(bishop_attacks(index, occupied) & (bbs[base + BISHOP] | bbs[base + QUEEN]))
+
+    def _pins(self, king_square, us, occupied):
+        """ Pieces of color index us pinned to their king, and the ray each of them may move along """
+        bbs = self._bitboards
+        base = (us ^ 1) * 6
+        snipers = ((rook_attacks(king_square, 0) & (bbs[base + ROOK] | bbs[base + QUEEN]))
+                   | (bishop_attacks(king_square, 0) & (bbs[base + BISHOP] | bbs[base + QUEEN])))
+        own = self._occupancy[us]
+        pinned = 0
+        pin_rays = {}
+        while snipers:
+            low = snipers & -snipers
+            snipers ^= low
+            between = BETWEEN[king_square][low.bit_length() - 1]
+            blockers = between & occupied
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pinned |= blockers
+                pin_rays[blockers.bit_length() - 1] = between | low
+        return pinned, pin_rays
+
+    def _cached(self):
+        """ Cache of the position: [checkers of white, of black, pins of white, of black, attack map of
+        white, of black], None until computed. Every change of the position drops it. """
+        cache = self._cache
+        if cache is None:
+            cache = self._cache = [None, None, None, None, None, None]
+        return cache
+
+    def _checkers(self, color_index):
+        """ Bitboard of the pieces giving check to the king of color_index """
+        cache = self._cached()
+        checkers = cache[color_index]
+        if checkers is None:
+            king = self._bitboards[color_index * 6 + KING]
+            checkers = self._attackers(lsb(king), color_index ^ 1, self.occupied) if king else 0
+            cache[color_index] = checkers
+        return checkers
+
+    def _pinned(self, color_index):
+        """ (pinned pieces, {square: ray it may move along}) of color_index, see _pins """
+        cache = self._cached()
+        pins = cache[2 + color_index]
+        if pins is None:
+            king = self._bitboards[color_index * 6 + KING]
+            pins = self._pins(lsb(king), color_index, self.occupied) if king else (0, {})
+            cache[2 + color_index] = pins
+        return pins
+
+    def _attack_map(self, color_index):
+        """ Bitboard of every square a piece of color_index attacks """
+        cache = self._cached()
+        attacked = cache[4 + color_index]
+        if attacked is None:
+            bbs = self._bitboards
+            base = color_index * 6
+            occupied = self.occupied
+            attacked = 0
+            for index in iter_bits(bbs[base + PAWN]):
+                attacked |= PAWN_ATTACKS[color_index][index]
+            for index in iter_bits(bbs[base + KNIGHT]):
+                attacked |= KNIGHT_ATTACKS[index]
+            for index in iter_bits(bbs[base + BISHOP] | bbs[base + QUEEN]):
+                attacked |= bishop_attacks(index, occupied)
+            for index in iter_bits(bbs[base + ROOK] | bbs[base + QUEEN]):
+                attacked |= rook_attacks(index, occupied)
+            for index in iter_bits(bbs[base + KING]):
+                attacked |= KING_ATTACKS[index]
+            cache[4 + color_index] = attacked
+        return attacked
+
+    def is_check(self):
+        """ Whether the side to move is in check """
+        return bool(self._checkers(self._turn))
+
+    def checkers(self, color=None):
+        """ Bitboard of the pieces giving check to the king of color (default: side to move) """
+        return self._checkers(self._turn if color is None else COLOR_INDEX[color])
+
+    def attackers_of(self, square, color):
+        """ Bitboard of the pieces of color attacking square (a Square or a bit index 0 - 63) """
+        return self._attackers(getattr(square, 'index', square), COLOR_INDEX[color], self.occupied)
+
+    def is_attacked(self, square, color):
+        """ Whether a piece of color attacks square (a Square or a bit index 0 - 63) """
+        return bool(self._attack_map(COLOR_INDEX[color]) & BB_SQUARES[getattr(square, 'index', square)])
+
+    def attack_map(self, color):
+        """ Bitboard of every square attacked by a piece of color """
+        return self._attack_map(COLOR_INDEX[color])
+
+    def pinned(self, color=None):
+        """ Bitboard of the pieces of color (default: side to move) pinned to their king """
+        return self._pinned(self._turn if color is None else COLOR_INDEX[color])[0]
+
+    def repetitions(self):
+        """ Number of times the position occurred, this time included
+
+        The Zobrist key of the position before each pushed move is kept on the move stack. Only
+        positions since the last capture or pawn move can repeat, and only with the same side to move,
+        so at most halfmove_clock / 2 keys are compared.
+        """
+        stack = self._stack
+        key = self._key
+        count = 1
+        for back in range(2, min(self.halfmove_clock, len(stack)) + 1, 2):
+            if stack[-back][7] == key:
+                count += 1
+        return count
+
+    def is_repetition(self, count=3):
+        """ Whether the position occurred count times, this time included """
+        stack = self._stack
+        key = self._key
+        for back in range(2, min(self.halfmove_clock, len(stack)) + 1, 2):
+            if stack[-back][7] == key:
+                count -= 1
+                if count == 1:
+                    return True
+        return count <= 1
+
+    def is_fifty_moves(self):
+        """ Whether fifty moves of each side were played without a capture or a pawn move """
+        return self.halfmove_clock >= 100
+
+    def is_seventy_five_moves(self):
+        """ Whether seventy-five moves of each side were played without a capture or a pawn move """
+        return self.halfmove_clock >= 150
+
+    def is_insufficient_material(self):
+        """ Whether neither side can mate: kings with at most one minor piece, or bishops all on one square color """
+        bbs = self._bitboards
+        if (bbs[PAWN] | bbs[ROOK] | bbs[QUEEN] | bbs[6 + PAWN] | bbs[6 + ROOK] | bbs[6 + QUEEN]):
+            return False
+        knights = bbs[KNIGHT] | bbs[6 + KNIGHT]
+        bishops = bbs[BISHOP] | bbs[6 + BISHOP]
+        if popcount(knights | bishops) <= 1:
+            return True
+        return not knights and (not bishops & BB_LIGHT_SQUARES or not bishops & ~BB_LIGHT_SQUARES)
+
+    def encode_move(self, start, end, promotion=QUEEN):
+        """ Encode a move between two square indexes, working out its flag from the position """
+        moved = self._mailbox[start]
+        color_index, kind = divmod(moved, 6)
+        flag = CAPTURE if self._mailbox[end] != EMPTY else QUIET
+        if kind == PAWN:
+            if end == self._ep_square and flag == QUIET and (end - start) % 8:
+                flag = EP_CAPTURE
+            elif abs(end - start) == 16:
+                flag = DOUBLE_PAWN_PUSH
+            elif end >> 3 == (7 if color_index == WHITE else 0):
+                flag |= PROMOTION | (promotion - KNIGHT)
+        elif kind == KING and abs(end - start) == 2 and start >> 3 == end >> 3:
+            flag = KING_CASTLE if end > start else QUEEN_CASTLE
+        return start | end << 6 | flag << 12
+
+    def push(self, move):
+        """ Play an encoded move: update bitboards, side to move, castling rights, en passant and clocks
+
+        Only what the move destroys is kept on the undo stack: the captured piece, the placed Piece objects
+        that moved or were taken, castling rights, en passant square, halfmove clock and Zobrist key.
+        The key is updated by XORing out and in the pieces, rights and en passant file the move changes.
+        """
+        start = move & 63
+        end = (move >> 6) & 63
+        flag = move >> 12
+        mailbox = self._mailbox
+        pieces = self._pieces
+        bbs = self._bitboards
+        occupancy = self._occupancy
+
+        moved = mailbox[start]
+        us = WHITE if moved < 6 else BLACK
+
+        # Remove the captured piece
+        captured_square = end
+        if flag == EP_CAPTURE:
+            captured_square = end - 8 if us == WHITE else end + 8
+        captured = mailbox[captured_square]
+        castling_rights = self._castling_rights
+        ep_square = self._ep_square
+        key = self._key
+        score = self._score
+        phase = self._phase
+        if pieces:
+            # Placed objects follow their square, a promoted pawn becomes the flyweight of its new kind
+            captured_piece = pieces.pop(captured_square, None)
+            moved_piece = pieces.pop(start, None)
+            if moved_piece is not None and not flag & PROMOTION:
+                pieces[end] = moved_piece
+        else:
+            captured_piece = moved_piece = None
+        self._stack.append((move, captured, captured_piece, moved_piece, castling_rights, ep_square,
+                            self.halfmove_clock, key, score, phase))
+        self._cache = None
+        key ^= TURN_KEY
+        if ep_square is not None and PAWN_ATTACKS[us ^ 1][ep_square] & bbs[us * 6 + PAWN]:
+            key ^= EP_KEYS[ep_square & 7]
+        if captured != EMPTY:
+            bit = BB_SQUARES[captured_square]
+            bbs[captured] ^= bit
+            occupancy[captured // 6] ^= bit
+            mailbox[captured_square] = EMPTY
+            key ^= PIECE_KEYS[captured][captured_square]
+            score -= SQUARE_SCORES[captured][captured_square]
+            phase -= PIECE_PHASES[captured]
+
+        # Move the piece, swapping a promoted pawn for its new piece
+        start_bit = BB_SQUARES[start]
+        end_bit = BB_SQUARES[end]
+        occupancy[us] ^= start_bit | end_bit
+        mailbox[start] = EMPTY
+        if flag & PROMOTION:
+            placed = us * 6 + KNIGHT + (flag & 3)
+            bbs[moved] ^= start_bit
+            bbs[placed] |= end_bit
+            mailbox[end] = placed
+            phase += PIECE_PHASES[placed]
+        else:
+            placed = moved
+            bbs[moved] ^= start_bit | end_bit
+            mailbox[end] = moved
+        key ^= PIECE_KEYS[moved][start] ^ PIECE_KEYS[placed][end]
+        score += SQUARE_SCORES[placed][end] - SQUARE_SCORES[moved][start]
+
+        # Castling also moves the rook
+        if flag == KING_CASTLE or flag == QUEEN_CASTLE:
+            rook = us * 6 + ROOK
+            rook_start, rook_end = (end + 1, end - 1) if flag == KING_CASTLE else (end - 2, end + 1)
+            self._move_rook(rook_start, rook_end, us)
+            key ^= PIECE_KEYS[rook][rook_start] ^ PIECE_KEYS[rook][rook_end]
+            score += SQUARE_SCORES[rook][rook_end] - SQUARE_SCORES[rook][rook_start]
+
+        rights = castling_rights & CASTLING_MASK[start] & CASTLING_MASK[end]
+        if rights != castling_rights:
+            key ^= CASTLING_KEYS[castling_rights] ^ CASTLING_KEYS[rights]
+            self._castling_rights = rights
+        if flag == DOUBLE_PAWN_PUSH:
+            ep_square = (start + end) >> 1
+            self._ep_square = ep_square
+            # Only hashed when an enemy pawn can take en passant, as in compute_zobrist_key
+            if PAWN_ATTACKS[us][ep_square] & bbs[(us ^ 1) * 6 + PAWN]:
+                key ^= EP_KEYS[start & 7]
+        else:
+            self._ep_square = None
+        self._key = key
+        self._score = score
+        self._phase = phase
+        if moved % 6 == PAWN or captured != EMPTY:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if us == BLACK:
+            self.fullmove_number += 1
+        self._turn = us ^ 1
+
+    def pop(self):
+        """ Take back the last pushed move and return it """
+        (move, captured, captured_piece, moved_piece, castling_rights, ep_square, halfmove_clock, key,
+         score, phase) = self._stack.pop()
+        self._cache = None
+        start = move & 63
+        end = (move >> 6) & 63
+        flag = move >> 12
+        mailbox = self._mailbox
+        pieces = self._pieces
+        bbs = self._bitboards
+        occupancy = self._occupancy
+
+        placed = mailbox[end]
+        us = WHITE if placed < 6 else BLACK
+        start_bit = BB_SQUARES[start]
+        end_bit = BB_SQUARES[end]
+        occupancy[us] ^= start_bit | end_bit
+        mailbox[end] = EMPTY
+        if moved_piece is not None:
+            pieces.pop(end, None)
+            pieces[start] = moved_piece
+        if flag & PROMOTION:
+            bbs[placed] ^= end_bit
+            bbs[us * 6 + PAWN] |= start_bit
+            mailbox[start] = us * 6 + PAWN
+        else:
+            bbs[placed] ^= start_bit | end_bit
+            mailbox[start] = placed
+
+        if captured != EMPTY:
+            captured_square = end
+            if flag == EP_CAPTURE:
+                captured_square = end - 8 if us == WHITE else end + 8
+            bit = BB_SQUARES[captured_square]
+            bbs[captured] |= bit
+            occupancy[captured // 6] |= bit
+            mailbox[captured_square] = captured
+            if captured_piece is not None:
+                pieces[captured_square] = captured_piece
+
+        if flag == KING_CASTLE:
+            self._move_rook(end - 1, end + 1, us)
+        elif flag == QUEEN_CASTLE:
+            self._move_rook(end + 1, end - 2, us)
+
+        self._castling_rights = castling_rights
+        self._ep_square = ep_square
+        self.halfmove_clock = halfmove_clock
+        self._key = key
+        self._score = score
+        self._phase = phase
+        if us == BLACK:
+            self.fullmove_number -= 1
+        self._turn = us
+        return move
+
+    def _move_rook(self, start, end, us):
+        rook = us * 6 + ROOK
+        bits = BB_SQUARES[start] | BB_SQUARES[end]
+        self._bitboards[rook] ^= bits
+        self._occupancy[us] ^= bits
+        self._mailbox[start] = EMPTY
+        self._mailbox[end] = rook
+        if self._pieces:
+            placed = self._pieces.pop(start, None)
+            if placed is not None:
+                self._pieces[end] = placed
 
     def __str__(self):
         print_board = ''
@@ -492,6 +1324,8 @@ class Board:
 class Player:
     """ Individual player: white or black """
 
+    __slots__ = ('_name', '_board', 'color')
+
     def __init__(self, color, name=None, board_instance=None, ):
         self._name = name
         self._board = board_instance
@@ -531,6 +1365,7 @@ class Player:
     def setup(self, board_instance: Board):
         """ Assign player side on the board """
         self.board = board_instance
+        board_instance._players[COLOR_INDEX[self.color]] = self
 
         if self.color == Color.WHITE:
             # Place piece on row 1 and 2
@@ -543,24 +1378,23 @@ class Player:
         else:
             raise Exception('Unknown Color {} while placing pieces'.format(self.color))
 
-        # Place pieces on the first row for each player
-        row_1 = board_instance.get_squares_at_row(first_row)
-        row_1[0].piece = Rook(self.color, self, self.board)
-        row_1[1].piece = Knight(self.color, self, self.board)
-        row_1[2].piece = Bishop(self.color, self, self.board)
-        row_1[3].piece = Queen(self.color, self, self.board)
-        row_1[4].piece = King(self.color, self, self.board)
-        row_1[5].piece = Bishop(self.color, self, self.board)
-        row_1[6].piece = Knight(self.color, self, self.board)
-        row_1[7].piece = Rook(self.color, self, self.board)
-
-        row_2 = board_instance.get_squares_at_row(second_row)
-        for square in row_2:
-            # Fill row 2 with 8 pawns
-            square.piece = Pawn(self.color, self, self.board)
+        # Place the shared pieces of the player's color on the first row, and 8 pawns on the second row
+        base = COLOR_INDEX[self.color] * 6
+        for col_index, kind in enumerate(BACK_RANK):
+            board_instance.set_piece_at(square_index(col_index, ROW_INDEX[first_row]), FLYWEIGHTS[base + kind])
+            board_instance.set_piece_at(square_index(col_index, ROW_INDEX[second_row]), FLYWEIGHTS[base + PAWN])
+
+        # King and rooks start on their squares: both castling rights are available
+        if self.color == Color.WHITE:
+            board_instance.castling_rights |= WHITE_KINGSIDE | WHITE_QUEENSIDE
+        else:
+            board_instance.castling_rights |= BLACK_KINGSIDE | BLACK_QUEENSIDE
 
     def has_no_legal_move(self):
-        return False
+        return not self.board.generate_legal_moves(self.color)
+
+    def in_check(self):
+        return bool(self.board.checkers(self.color))
 
     def __str__(self):
         return '{} {}'.format(self.name, self.color.value)
@@ -570,10 +1404,15 @@ class Player:
 
 
 class Move:
-    def __init__(self, player: Player, piece: Piece, start, end):
+    __slots__ = ('player', 'piece', 'promotion', '_captured', '_code', 'start', 'end', 'game')
+
+    def __init__(self, player: Player, piece: Piece, start, end, promotion=QUEEN):
         self.player = player
         self.piece = piece
+        self.promotion = promotion  # Kind a pawn reaching the last row becomes
         self._captured = None
+        self._code = None  # Encoded move once it has been made
+        self.game = None  # Game the move was made in, its history is taken back with the move
 
         if not self.player:
             raise Exception('There is no player making a move')
@@ -621,42 +1460,154 @@ class Move:
         self._captured = captured
 
     def make(self):
-        # Capture piece at destination
-        self.captured = self.end.piece if self.end.piece else None
-        self.piece.captured.append(self.captured)
-        self.piece.moves += 1
-        self.start.piece = None
-        self.end.piece = self.piece
-
-        # Promote pawn  if it move to the last row
-        # When a pawn advances to the eighth rank, as a part of the move it
-        # is promoted and must be exchanged for the player's choice of queen,
-        # rook, bishop, or knight of the same color.
-        # Let's promote it to Queen here
-        if isinstance(self.piece, Pawn):
-            if self.piece.color.WHITE and self.end.row == 8 or self.piece.color.BLACK and self.end.row == 1:
-                # remove piece from the board and replace it with a Queen piece
-                self.end.piece = Queen(self.piece.color, self.player, self.player.board)
+        board = self.player.board
+        code = board.encode_move(self.start.index, self.end.index, self.promotion)
+        flag = code >> 12
+
+        # Capture piece at destination, or behind it when taking en passant
+        captured_square = self.end.index
+        if flag == EP_CAPTURE:
+            captured_square += -8 if self.piece.color == Color.WHITE else 8
+        self.captured = board.piece_at(captured_square)
+        if not self.piece.flyweight:
+            self.piece.captured.append(self.captured)
+            self.piece.moves += 1
+        board.turn = self.piece.color  # Moves can be replayed for either side, push plays for the side to move
+
+        # When a pawn advances to the eighth rank, as a part of the move it is promoted and exchanged
+        # for the player's choice of queen, rook, bishop, or knight of the same color (queen unless told
+        # otherwise): the encoded move carries the new kind and the square gets its flyweight.
+        board.push(code)
+        self._code = code
+
+    @classmethod
+    def view(cls, player, code, game=None):
+        """ Move already played as code on the player's board, without the checks of a new move """
+        move = cls.__new__(cls)
+        move.game = game
+        board = player.board
+        flag = code >> 12
+        move.player = player
+        move.piece = None  # Looked up on the board when needed, the piece may have moved on since
+        move.promotion = KNIGHT + (flag & 3) if flag & PROMOTION else QUEEN
+        move.start = board.square_at(code & 63)
+        move.end = board.square_at((code >> 6) & 63)
+        move._captured = None
+        move._code = code
+        return move
+
+    @property
+    def code(self):
+        """ Encoded move, None until it has been made """
+        return self._code
+
+    def unmake(self):
+        """ Take the move back, it has to be the last move played on the board (and in its game) """
+        board = self.player.board
+        if self._code is None or not board._stack or board._stack[-1][0] != self._code:
+            raise Exception('Illegal unmake: {} is not the last move played'.format(self))
+
+        if self.game is not None:
+            if not self.game.move_codes or self.game.move_codes[-1] != self._code:
+                raise Exception('Illegal unmake: {} is not the last move of its game'.format(self))
+            self.game.undo_move()
+        else:
+            board.pop()
+        self._code = None
+        piece = self.piece or board.piece_at(self.start.index)
+        if not piece.flyweight:
+            piece.moves -= 1
+            if piece.captured:
+                piece.captured.pop()
+        self.captured = None
 
     def __str__(self):
+        if self.piece is None:
+            return move_name(self._code) if self._code is not None else '{}->{}'.format(self.start, self.end)
         return '{}:{}->{}'.format(self.piece, self.start, self.end)
 
     def __repr__(self):
         return self.__str__()
 
 
+class GameMoves(Sequence):
+    """ Moves of a game as Move views, created from the encoded moves when they are accessed """
+
+    __slots__ = ('_game',)
+
+    def __init__(self, game):
+        self._game = game
+
+    def __len__(self):
+        return len(self._game.move_codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        game = self._game
+        player = game.player_1 if game._movers[index] == WHITE else game.player_2
+        return Move.view(player, game.move_codes[index], game)
+
+
+# Initial position Game.new copies, built on first use
+_START_BOARD = None
+
+
 class Game:
-    def __init__(self, player_1_name='White', player_2_name='Black'):
+    __slots__ = ('round', 'board', 'player_1', 'player_2', 'winner', 'status', 'move_codes', '_movers', '_over')
+
+    def __init__(self, player_1_name='White', player_2_name='Black', fen=None):
+        self._start(Board() if fen is None else Board.from_fen(fen), player_1_name, player_2_name)
+
+        if fen is None:
+            self.setup()
+        else:
+            # Pieces are already on the board as flyweights
+            self.board._players = [self.player_1, self.player_2]
+            self.round = self.board.fullmove_number
+            if not self.board.generate_legal_moves():
+                player = self.player_2 if self.board.turn == Color.WHITE else self.player_1
+                if self.board._checkers(self.board._turn):
+                    self.status = GameStatus.CHECKMATE
+                    self.winner = player
+                else:
+                    self.status = GameStatus.STALEMATE
+                self.over = True
+            else:
+                self._adjudicate_draw()
+
+    def _start(self, board, player_1_name, player_2_name):
         self.round = 1  # current round
-        self.board = Board()
-        self.player_1 = Player(color='white', board_instance=self.board, name=player_1_name)
-        self.player_2 = Player(color='black', board_instance=self.board, name=player_2_name)
-        self.setup()
+        self.board = board
+        self.player_1 = Player(color='white', board_instance=board, name=player_1_name)
+        self.player_2 = Player(color='black', board_instance=board, name=player_2_name)
         self.winner = None
         self.status = GameStatus.IN_PROGRESS
-        self.moves = []  # all moves made during this game
+        self.move_codes = array('H')  # all moves made during this game, encoded
+        self._movers = bytearray()  # Color index of the player who made each move
         self._over = False
 
+    @classmethod
+    def from_fen(cls, fen, player_1_name='White', player_2_name='Black'):
+        """ Game continuing from the position of a FEN string, without replaying the moves that led to it """
+        return cls(player_1_name, player_2_name, fen)
+
+    @classmethod
+    def new(cls, player_1_name='White', player_2_name='Black'):
+        """ Game from the initial position, its board a copy of a prebuilt template instead of set up piece by piece """
+        global _START_BOARD
+        if _START_BOARD is None:
+            _START_BOARD = Board.from_fen(START_FEN)
+        game = cls.__new__(cls)
+        game._start(_START_BOARD.copy(), player_1_name, player_2_name)
+        game.board._players = [game.player_1, game.player_2]
+        return game
+
+    @property
+    def moves(self):
+        """ Moves made during this game, oldest first """
+        return GameMoves(self)
+
     @property
     def over(self):
         return self._over
@@ -669,27 +1620,91 @@ class Game:
         self.player_1.setup(self.board)
         self.player_2.setup(self.board)
 
-    def make_move(self, player: Player, piece: Piece, start: Square, end: Square):
-        if self.status == GameStatus.CHECKMATE:
-            raise Exception('Game is already over')
+    def undo_move(self):
+        """ Take back the last move of the game on the board and in the move history, returning its code
 
-        new_move = Move(player, piece, start, end)
-        new_move.make()
-        self.moves.append(new_move)
+        A game that move ended is in progress again.
+        """
+        if not self.move_codes:
+            raise Exception('Illegal undo: no move has been made')
+        self.board.pop()
+        self._movers.pop()
+        self.status = GameStatus.IN_PROGRESS
+        self.winner = None
+        self.over = False
+        return self.move_codes.pop()
 
-        # Checkmate when King is captured
-        if isinstance(new_move.captured, King):
-            self.status = GameStatus.CHECKMATE
+    def make_move(self, player: Player, piece: Piece, start: Square, end: Square, promotion=QUEEN):
+        if self.over:
+            raise Exception('Game is already over')
+        if player.color != self.board.turn:
+            raise Exception('Illegal move: it is not {}\'s turn'.format(player.name))
+
+        new_move = Move(player, piece, start, end, promotion)
+        # Move checks the piece's own movement, a legal move also must not leave the king in check
+        if self.board.encode_move(new_move.start.index, new_move.end.index, promotion) not in \
+                self.board.generate_legal_moves(player.color):
+            raise Exception('Illegal move: {} from {} to {} leaves the king in check'.format(
+                piece, new_move.start, new_move.end))
+        new_move.game = self
+        new_move.make()
+        self.move_codes.append(new_move.code)
+        self._movers.append(COLOR_INDEX[player.color])
+        opponent = self.player_2 if player is self.player_1 else self.player_1
+
+        if opponent.has_no_legal_move():
+            # No legal reply: checkmate if the opponent is in check, stalemate otherwise
+            if opponent.in_check():
+                self.status = GameStatus.CHECKMATE
+                self.winner = player
+            else:
+                self.status = GameStatus.STALEMATE
             self.over = True
+        else:
+            self._adjudicate_draw()
+        return new_move
+
+    def _adjudicate_draw(self):
+        """ End the game as a draw when the position is drawn whether or not a player claims it
+
+        Threefold repetition and the fifty-move rule only end the game when claimed, see claim_draw.
+        """
+        board = self.board
+        if board.is_insufficient_material():
+            self.status = GameStatus.INSUFFICIENT_MATERIAL
+        elif board.is_repetition(5):
+            self.status = GameStatus.DRAW_FIVEFOLD_REPETITION
+        elif board.is_seventy_five_moves():
+            self.status = GameStatus.DRAW_SEVENTY_FIVE_MOVE
+        else:
+            return
+        self.over = True
 
-            if new_move.captured.color == Color.BLACK:
-                self.winner = self.player_1
-            elif new_move.captured.color == Color.WHITE:
-                self.winner = self.player_2
-
-        elif player.has_no_legal_move():
-            self.status = GameStatus.STALEMATE
-            self.over = True
+    @property
+    def can_claim_draw(self):
+        """ Whether the side to move may end the game as a draw by threefold repetition or the fifty-move rule """
+        return not self.over and (self.board.is_repetition(3) or self.board.is_fifty_moves())
+
+    def claim_draw(self):
+        """ End the game as a draw by threefold repetition or the fifty-move rule """
+        if not self.can_claim_draw:
+            raise Exception('Illegal claim: the position is not drawn by repetition or the fifty-move rule')
+        self.status = GameStatus.DRAW_REPETITION if self.board.is_repetition(3) else GameStatus.DRAW_FIFTY_MOVE
+        self.over = True
+
+    def play_move(self, move):
+        """ Play an encoded legal move for the side to move through make_move """
+        board = self.board
+        start = board.square_at(move & 63)
+        end = board.square_at((move >> 6) & 63)
+        player = self.player_1 if board.turn == Color.WHITE else self.player_2
+        flag = move >> 12
+        self.make_move(player, start.piece, start, end, KNIGHT + (flag & 3) if flag & PROMOTION else QUEEN)
+
+    def play(self, notation):
+        """ Play a move of the side to move written in SAN (Nf3), UCI (g1f3) or square to square (G1->F3) """
+        from notation import parse_move
+        self.play_move(parse_move(self.board, notation))
 
     def play_round(self, _start_1, _start_2, _end_1, _end_2):
 
@@ -720,20 +1735,40 @@ class Game:
 
 if __name__ == "__main__":
     # To run: python chess.py
+    # To play white against the computer: python chess.py --engine [--book book.bin]
+    import sys
+
+    new_game = Game.new()
+    opponent = None
+    if '--engine' in sys.argv[1:]:
+        from engine import Engine
+        opening_book = None
+        if '--book' in sys.argv[1:-1]:
+            from book import OpeningBook
+            opening_book = OpeningBook(sys.argv[sys.argv.index('--book') + 1])
+        opponent = Engine(new_game, book=opening_book)
+
+    from notation import san
 
-    new_game = Game()
     while not new_game.over:
         try:
             print(new_game)
-            move_1 = input('White: Enter your move. Ex: D2->D4 \n')
-            move_2 = input('Black: Enter your move. Ex: C7->C5 \n')
-
-            start_1 = move_1.split('->')[0]
-            start_2 = move_2.split('->')[0]
-            end_1 = move_1.split('->')[1]
-            end_2 = move_2.split('->')[1]
-
-            new_game.play_round(start_1, start_2, end_1, end_2)
+            # Moves may be entered in SAN (d4, Nf3), UCI (d2d4) or square to square (D2->D4), or 'draw' to claim one
+            if new_game.board.turn == Color.WHITE:
+                entry = input('White: Enter your move. Ex: D2->D4 or d4 \n')
+            elif opponent:
+                reply = opponent.best_move(time_limit=3)
+                print('Black: {}'.format(san(new_game.board, reply)))
+                new_game.play_move(reply)
+                new_game.round += 1
+                continue
+            else:
+                entry = input('Black: Enter your move. Ex: C7->C5 or c5 \n')
+            if entry.strip().lower() == 'draw':
+                new_game.claim_draw()
+            else:
+                new_game.play(entry)
+                if new_game.board.turn == Color.WHITE:
+                    new_game.round += 1
         except Exception as exc:
             print(color_fg_reset('Error: {}\n'.format(exc), 'red'))
-
@@ -1,5 +1,7 @@
 import unittest
 import chess
+import bitboard
+import perft
 import random
 import string
 
@@ -162,6 +164,51 @@ class TestPiece(unittest.TestCase):
 
         self.assertEqual(len(self.rook._get_rook_legal_movements(square)), 14)
 
+        # Blockers: own piece stops before, enemy piece can be captured
+        self.board.get_square('D', 7).piece = chess.Pawn('white')
+        self.board.get_square('B', 5).piece = chess.Pawn('black')
+        self.assertEqual(len(self.rook._get_rook_legal_movements(square)), 11)
+        self.assertTrue(self.rook.can_move(square, self.board.get_square('D', 6)))
+        self.assertFalse(self.rook.can_move(square, self.board.get_square('D', 7)))
+        self.assertFalse(self.rook.can_move(square, self.board.get_square('D', 8)))
+        self.assertTrue(self.rook.can_move(square, self.board.get_square('B', 5)))
+        self.assertFalse(self.rook.can_move(square, self.board.get_square('A', 5)))
+        self.assertFalse(self.rook.can_move(square, self.board.get_square('E', 6)))
+
+    def test_bishop_and_queen_can_move(self):
+        square = self.board.get_square('C', 1)
+        square.piece = self.bishop
+        self.bishop.board = self.board
+        self.bishop.player = self.player
+        self.board.get_square('E', 3).piece = chess.Pawn('black')
+
+        self.assertTrue(self.bishop.can_move(square, self.board.get_square('D', 2)))
+        self.assertTrue(self.bishop.can_move(square, self.board.get_square('E', 3)))
+        self.assertFalse(self.bishop.can_move(square, self.board.get_square('F', 4)))
+        self.assertTrue(self.bishop.can_move(square, self.board.get_square('A', 3)))
+        self.assertFalse(self.bishop.can_move(square, self.board.get_square('C', 2)))
+
+        square = self.board.get_square('H', 3)
+        square.piece = self.queen
+        self.queen.board = self.board
+        self.queen.player = self.player
+        self.assertTrue(self.queen.can_move(square, self.board.get_square('F', 3)))
+        self.assertTrue(self.queen.can_move(square, self.board.get_square('E', 3)))
+        self.assertFalse(self.queen.can_move(square, self.board.get_square('D', 3)))
+        self.assertTrue(self.queen.can_move(square, self.board.get_square('D', 7)))
+        self.assertTrue(self.queen.can_move(square, self.board.get_square('H', 8)))
+        self.assertFalse(self.queen.can_move(square, self.board.get_square('G', 5)))
+
+    def test_magic_slider_attacks(self):
+        rand = random.Random(7)
+        for i in range(0, 2000):
+            index = rand.randrange(64)
+            occupied = rand.getrandbits(64) & rand.getrandbits(64)
+            self.assertEqual(bitboard.rook_attacks(index, occupied),
+                             bitboard._slider_attacks(index, bitboard.ROOK_DIRECTIONS, occupied))
+            self.assertEqual(bitboard.bishop_attacks(index, occupied),
+                             bitboard._slider_attacks(index, bitboard.BISHOP_DIRECTIONS, occupied))
+
     def test_knight_can_move(self):
         square = self.board.get_square('D', 5)
         square.piece = self.knight
@@ -171,6 +218,34 @@ class TestPiece(unittest.TestCase):
         print(self.board)
         print(self.knight._get_knight_legal_moves(square))
 
+    def test_knight_attack_table(self):
+        self.knight.board = self.board
+        self.knight.player = self.player
+        self.assertEqual(len(self.knight._get_knight_legal_moves(self.board.get_square('D', 5))), 8)
+        self.assertEqual(len(self.knight._get_knight_legal_moves(self.board.get_square('A', 1))), 2)
+        self.assertEqual(len(self.knight._get_knight_legal_moves(self.board.get_square('H', 2))), 3)
+
+        # Own pieces block the target square, enemy pieces can be captured
+        start = self.board.get_square('A', 1)
+        start.piece = self.knight
+        self.board.get_square('B', 3).piece = chess.Pawn('white')
+        self.board.get_square('C', 2).piece = chess.Pawn('black')
+        self.assertFalse(self.knight.can_move(start, self.board.get_square('B', 3)))
+        self.assertTrue(self.knight.can_move(start, self.board.get_square('C', 2)))
+        self.assertFalse(self.knight.can_move(start, self.board.get_square('B', 2)))
+
+    def test_king_attack_table(self):
+        square = self.board.get_square('H', 8)
+        square.piece = self.king
+        self.king.board = self.board
+        self.king.player = self.player
+        self.assertEqual(len(self.king._get_king_neighbor_squares(square)), 3)
+
+        self.board.get_square('G', 7).piece = chess.Pawn('white')
+        self.assertFalse(self.king.can_move(square, self.board.get_square('G', 7)))
+        self.assertTrue(self.king.can_move(square, self.board.get_square('G', 8)))
+        self.assertFalse(self.king.can_move(square, self.board.get_square('F', 8)))
+
 
 class BoardTest(unittest.TestCase):
     def setUp(self) -> None:
@@ -228,6 +303,28 @@ class BoardTest(unittest.TestCase):
                     self.assertEqual(square.col, rand_col)
                     self.assertEqual(square.row, row_index + 1)
 
+    def test_bitboards(self):
+        knight = chess.Knight('white')
+        pawn = chess.Pawn('black')
+        self.board.get_square('B', 1).piece = knight
+        self.board.get_square('E', 7).piece = pawn
+
+        # B1 is bit 1, E7 is bit 52
+        self.assertEqual(self.board.bitboard(chess.KNIGHT, chess.Color.WHITE), 1 << 1)
+        self.assertEqual(self.board.bitboard(chess.PAWN, chess.Color.BLACK), 1 << 52)
+        self.assertEqual(self.board.occupancy(chess.Color.WHITE), 1 << 1)
+        self.assertEqual(self.board.occupied, (1 << 1) | (1 << 52))
+        self.assertIs(self.board.get_piece('B', 1), knight)
+        self.assertIs(self.board.get_square('E', 7), self.board.get_square('E', 7))
+
+        # Replacing and removing pieces keeps the masks in sync
+        self.board.get_square('B', 1).piece = pawn
+        self.assertEqual(self.board.bitboard(chess.KNIGHT, chess.Color.WHITE), 0)
+        self.assertEqual(self.board.occupancy(chess.Color.BLACK), (1 << 1) | (1 << 52))
+        self.board.get_square('E', 7).piece = None
+        self.assertEqual(self.board.occupied, 1 << 1)
+        self.assertIsNone(self.board.get_piece('E', 7))
+
 
 class TestPlayer(unittest.TestCase):
     def setUp(self) -> None:
@@ -253,6 +350,454 @@ class TestGame(unittest.TestCase):
         self.assertEqual(self.game.player_2.color, chess.Color.BLACK)
         self.assertEqual(self.game.player_2.name, 'Black')
 
+    def test_new(self):
+        game = chess.Game.new('Alice', 'Bob')
+        self.assertEqual(game.board.to_fen(), self.game.board.to_fen())
+        self.assertEqual(game.board.zobrist_key, self.game.board.zobrist_key)
+        self.assertEqual(game.board.castling_rights, self.game.board.castling_rights)
+        self.assertEqual(game.player_1.name, 'Alice')
+        self.assertIs(game.player_2.board, game.board)
+
+        # Each game gets its own copy of the template
+        game.play('e4')
+        self.assertEqual(chess.Game.new().board.to_fen(), chess.START_FEN)
+        self.assertEqual(len(game.board.generate_legal_moves()), 20)
+        self.assertIsInstance(game.board.get_piece('E', 4), chess.Pawn)
+
+    def test_board_copy(self):
+        board = chess.Board.from_fen('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1')
+        knight = chess.Knight('white')
+        board.set_piece_at(bitboard.square_index(0, 2), knight)
+        fen = board.to_fen()
+        copy = board.copy()
+        for move in copy.generate_legal_moves():
+            copy.push(move)
+            self.assertEqual(board.to_fen(), fen)
+            copy.pop()
+        copy.push(copy.generate_legal_moves()[0])
+        self.assertEqual(copy.copy().pop(), copy.pop())
+        self.assertEqual(copy.to_fen(), fen)
+        self.assertIs(copy.get_piece('A', 3), knight)
+        self.assertIsNot(copy.get_square('A', 3), board.get_square('A', 3))
+
+    def test_flyweights(self):
+        import tracemalloc
+        board = self.game.board
+        self.assertIs(board.get_piece('E', 2), chess.FLYWEIGHTS[chess.PAWN])
+        self.assertIs(board.get_piece('E', 8), chess.FLYWEIGHTS[6 + chess.KING])
+        self.assertEqual(board._pieces, {})
+        for instance in (board, board.get_square('E', 2), board.get_piece('E', 2), self.game.player_1, self.game):
+            self.assertFalse(hasattr(instance, '__dict__'), instance)
+
+        # Flyweights keep no history, a pawn may step twice from its starting row only
+        self.game.play('e4')
+        self.assertEqual(chess.FLYWEIGHTS[chess.PAWN].moves, 0)
+        self.assertFalse(board.get_piece('E', 4).can_move(board.get_square('E', 4), board.get_square('E', 6)))
+
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            games = [chess.Game() for _ in range(50)]
+            size = (tracemalloc.get_traced_memory()[0] - before) // len(games)
+        finally:
+            tracemalloc.stop()
+        self.assertLess(size, 2048)
+
+    def test_flyweights_read_only(self):
+        game_1, game_2 = chess.Game.new(), chess.Game.new()
+        knight = game_1.board.get_piece('B', 1)
+        self.assertTrue(knight.flyweight)
+        knight.board = game_1.board
+        knight.player = game_1.player_1
+        knight.alive = False
+        knight.moves += 1
+        self.assertIsNone(knight.board)
+        self.assertIsNone(knight.player)
+        self.assertTrue(knight.alive)
+        self.assertEqual(knight.moves, 0)
+        with self.assertRaises(AttributeError):
+            knight.captured.append(chess.Pawn('black'))
+
+        # Blocking c3 on one board leaves the knight free to move there on the other
+        game_1.board.set_piece_at(bitboard.square_index(2, 2), chess.FLYWEIGHTS[chess.PAWN])
+        self.assertFalse(knight.can_move(game_1.board.get_square('B', 1), game_1.board.get_square('C', 3)))
+        self.assertTrue(knight.can_move(game_2.board.get_square('B', 1), game_2.board.get_square('C', 3)))
+
+
+class TestLegalMoves(unittest.TestCase):
+    def setUp(self) -> None:
+        self.board = chess.Board()
+
+    def place(self, col, row, piece):
+        self.board.get_square(col, row).piece = piece
+
+    def move_names(self, moves):
+        return sorted('{}{}'.format(self.board.square_at(code & 63).col, self.board.square_at(code & 63).row) + '->' +
+                      '{}{}'.format(self.board.square_at((code >> 6) & 63).col, self.board.square_at((code >> 6) & 63).row)
+                      for code in moves)
+
+    def test_start_position(self):
+        game = chess.Game()
+        self.assertEqual(len(game.board.generate_legal_moves()), 20)
+        self.assertEqual(len(game.board.generate_legal_moves(chess.Color.BLACK)), 20)
+        self.assertFalse(game.player_1.has_no_legal_move())
+
+    def test_pinned_piece(self):
+        self.place('E', 1, chess.King('white'))
+        self.place('E', 2, chess.Rook('white'))
+        self.place('E', 8, chess.Rook('black'))
+        self.place('A', 8, chess.King('black'))
+
+        rook_moves = [name for name in self.move_names(self.board.generate_legal_moves()) if name.startswith('E2')]
+        self.assertEqual(rook_moves, ['E2->E3', 'E2->E4', 'E2->E5', 'E2->E6', 'E2->E7', 'E2->E8'])
+
+    def test_check_evasion(self):
+        self.place('E', 1, chess.King('white'))
+        self.place('A', 2, chess.Rook('white'))
+        self.place('H', 4, chess.Bishop('white'))
+        self.place('E', 8, chess.Rook('black'))
+        self.place('A', 8, chess.King('black'))
+
+        # Block with the rook, capture with the bishop or step aside
+        self.assertEqual(self.move_names(self.board.generate_legal_moves()),
+                         ['A2->E2', 'E1->D1', 'E1->D2', 'E1->F1', 'E1->F2', 'H4->E7'])
+
+    def test_double_check(self):
+        self.place('E', 1, chess.King('white'))
+        self.place('D', 1, chess.Queen('white'))
+        self.place('E', 8, chess.Rook('black'))
+        self.place('D', 3, chess.Knight('black'))
+        self.place('A', 8, chess.King('black'))
+
+        self.assertEqual(self.move_names(self.board.generate_legal_moves()), ['E1->D2', 'E1->F1'])
+
+    def test_check_pins_and_attacks(self):
+        self.place('E', 1, chess.King('white'))
+        self.place('E', 2, chess.Rook('white'))
+        self.place('E', 8, chess.Rook('black'))
+        self.place('A', 8, chess.King('black'))
+        self.place('G', 5, chess.Bishop('black'))
+        board = self.board
+        e2 = board.get_square('E', 2)
+
+        self.assertFalse(board.is_check())
+        self.assertEqual(board.pinned(), bitboard.BB_SQUARES[e2.index])
+        self.assertEqual(board.pinned(chess.Color.BLACK), 0)
+        self.assertEqual(board.attackers_of(e2, chess.Color.BLACK), bitboard.BB_SQUARES[board.get_square('E', 8).index])
+        self.assertTrue(board.is_attacked(board.get_square('D', 2), chess.Color.BLACK))
+        self.assertFalse(board.is_attacked(board.get_square('D', 3), chess.Color.WHITE))
+
+        # The cached maps follow moves, taking them back, and pieces placed by hand
+        board.push(board.encode_move(e2.index, board.get_square('E', 5).index))
+        board.push(board.encode_move(board.get_square('G', 5).index, board.get_square('H', 4).index))
+        self.assertTrue(board.is_check())
+        self.assertEqual(board.checkers(), bitboard.BB_SQUARES[board.get_square('H', 4).index])
+        board.pop()
+        self.assertFalse(board.is_check())
+        board.get_square('C', 3).piece = chess.Knight('black')
+        self.assertTrue(board.is_attacked(board.get_square('D', 1), chess.Color.BLACK))
+        self.assertEqual(board.checkers(chess.Color.WHITE), 0)
+        board.get_square('D', 3).piece = chess.Knight('black')
+        self.assertEqual(board.checkers(chess.Color.WHITE), bitboard.BB_SQUARES[board.get_square('D', 3).index])
+
+        # The attack map agrees with the attackers of every square, from the reference positions
+        for _, fen, _, _ in perft.REFERENCE_POSITIONS:
+            board = chess.Board.from_fen(fen)
+            for color in chess.COLORS:
+                expected = sum(bitboard.BB_SQUARES[index] for index in range(64) if board.attackers_of(index, color))
+                self.assertEqual(board.attack_map(color), expected, fen)
+
+    def test_en_passant_pin(self):
+        # Capturing en passant would expose the king along the rank
+        self.place('A', 5, chess.King('white'))
+        self.place('B', 5, chess.Pawn('white'))
+        self.place('C', 5, chess.Pawn('black'))
+        self.place('H', 5, chess.Rook('black'))
+        self.place('H', 8, chess.King('black'))
+        self.board.ep_square = self.board.get_square('C', 6).index
+        self.assertNotIn('B5->C6', self.move_names(self.board.generate_legal_moves()))
+
+        self.place('H', 5, None)
+        self.assertIn('B5->C6', self.move_names(self.board.generate_legal_moves()))
+
+    def test_castling(self):
+        game = chess.Game()
+        board = self.board = game.board
+        for name in ['F1', 'G1', 'B1', 'C1', 'D1']:
+            board.get_square(name[0], int(name[1])).piece = None
+        moves = self.move_names(board.generate_legal_moves())
+        self.assertIn('E1->G1', moves)
+        self.assertIn('E1->C1', moves)
+
+        game.make_move(game.player_1, board.get_piece('E', 1), board.get_square('E', 1), board.get_square('G', 1))
+        self.assertIsInstance(board.get_piece('F', 1), chess.Rook)
+        self.assertIsNone(board.get_piece('H', 1))
+        self.assertEqual(board.castling_rights, chess.BLACK_KINGSIDE | chess.BLACK_QUEENSIDE)
+
+    def test_checkmate(self):
+        # Fool's mate
+        game = chess.Game()
+        for start, end in [('F2', 'F3'), ('E7', 'E5'), ('G2', 'G4'), ('D8', 'H4')]:
+            player = game.player_1 if game.board.turn == chess.Color.WHITE else game.player_2
+            start = game.board.get_square(start[0], int(start[1]))
+            game.make_move(player, start.piece, start, game.board.get_square(end[0], int(end[1])))
+
+        self.assertEqual(game.status, chess.GameStatus.CHECKMATE)
+        self.assertEqual(game.winner, game.player_2)
+        self.assertTrue(game.player_1.has_no_legal_move())
+        self.assertTrue(game.over)
+
+    def test_zobrist_key_game(self):
+        game = chess.Game()
+        self.assertEqual(game.board.zobrist_key, game.board.compute_zobrist_key())
+        start_key = game.board.zobrist_key
+        game.play_round('E2', 'E7', 'E4', 'E5')
+        self.assertEqual(game.board.zobrist_key, game.board.compute_zobrist_key())
+        self.assertNotEqual(game.board.zobrist_key, start_key)
+
+        game.moves[-1].unmake()
+        self.assertEqual(len(game.moves), 1)
+        self.assertEqual(str(game.moves[0]), 'E2->E4')
+        game.moves[-1].unmake()
+        self.assertEqual(game.board.zobrist_key, start_key)
+        self.assertEqual(len(game.moves), 0)
+
+    def test_pinned_piece_move(self):
+        # The knight on d2 is pinned by the bishop on b4, the rook on h2 guards the second rank
+        game = chess.Game.from_fen('4k3/8/8/8/1b6/8/3N3r/4K3 w - - 0 1')
+        start = game.board.get_square('D', 2)
+        with self.assertRaises(Exception):
+            game.make_move(game.player_1, start.piece, start, game.board.get_square('F', 3))
+        self.assertEqual(len(game.moves), 0)
+        self.assertEqual(game.board.to_fen(), '4k3/8/8/8/1b6/8/3N3r/4K3 w - - 0 1')
+
+        # Nor may the king step into check
+        king = game.board.get_square('E', 1)
+        with self.assertRaises(Exception):
+            game.make_move(game.player_1, king.piece, king, game.board.get_square('F', 2))
+        game.make_move(game.player_1, king.piece, king, game.board.get_square('F', 1))
+        self.assertEqual(len(game.moves), 1)
+
+    def test_move_out_of_turn(self):
+        game = chess.Game.new()
+        pawn = game.board.get_square('E', 7)
+        with self.assertRaises(Exception):
+            game.make_move(game.player_2, pawn.piece, pawn, game.board.get_square('E', 5))
+        self.assertEqual(game.board.to_fen(), chess.START_FEN)
+
+        game.play('e4')
+        pawn = game.board.get_square('D', 2)
+        with self.assertRaises(Exception):
+            game.make_move(game.player_1, pawn.piece, pawn, game.board.get_square('D', 4))
+        self.assertEqual(len(game.moves), 1)
+        self.assertEqual(game.board.turn, chess.Color.BLACK)
+        pawn = game.board.get_square('E', 7)
+        game.make_move(game.player_2, pawn.piece, pawn, game.board.get_square('E', 5))
+        self.assertEqual(len(game.moves), 2)
+
+    def test_unmake_game_move(self):
+        game = chess.Game.new()
+        start = game.board.get_square('E', 2)
+        move = game.make_move(game.player_1, start.piece, start, game.board.get_square('E', 4))
+        game.play('e5')
+        with self.assertRaises(Exception):
+            move.unmake()  # Not the last move
+
+        game.moves[-1].unmake()
+        move.unmake()
+        self.assertEqual(len(game.moves), 0)
+        self.assertEqual(game.board.to_fen(), chess.START_FEN)
+        with self.assertRaises(Exception):
+            game.undo_move()
+
+        # Undoing a mate resumes the game
+        for notation in ['f3', 'e5', 'g4', 'Qh4']:
+            game.play(notation)
+        self.assertTrue(game.over)
+        last = game.moves[-1].code
+        self.assertEqual(game.undo_move(), last)
+        self.assertFalse(game.over)
+        self.assertEqual(game.status, chess.GameStatus.IN_PROGRESS)
+        self.assertEqual(len(game.moves), 3)
+
+    def test_stalemate(self):
+        # Shortest known stalemate, reached after 10. Qe6
+        game = chess.Game()
+        moves = ['E2E3', 'A7A5', 'D1H5', 'A8A6', 'H5A5', 'H7H5', 'H2H4', 'A6H6', 'A5C7', 'F7F6', 'C7D7', 'E8F7',
+                 'D7B7', 'D8D3', 'B7B8', 'D3H7', 'B8C8', 'F7G6', 'C8E6']
+        for index, move in enumerate(moves):
+            player = game.player_1 if index % 2 == 0 else game.player_2
+            start = game.board.get_square(move[0], int(move[1]))
+            game.make_move(player, start.piece, start, game.board.get_square(move[2], int(move[3])))
+
+        self.assertEqual(game.status, chess.GameStatus.STALEMATE)
+        self.assertIsNone(game.winner)
+        self.assertTrue(game.over)
+
+    def test_move_codes(self):
+        game = chess.Game()
+        for text in ['e4', 'd5', 'exd5', 'Qxd5']:
+            game.play(text)
+        self.assertEqual(game.move_codes.typecode, 'H')
+        self.assertEqual([chess.move_name(code) for code in game.move_codes], ['E2->E4', 'D7->D5', 'E4->D5', 'D8->D5'])
+
+        # Moves are views created from the codes
+        self.assertEqual(len(game.moves), 4)
+        last = game.moves[-1]
+        self.assertIs(last.player, game.player_2)
+        self.assertEqual(last.code, game.move_codes[-1])
+        self.assertEqual([move.end.index for move in game.moves[1:3]], [bitboard.square_index(3, 4)] * 2)
+        with self.assertRaises(Exception):
+            game.moves[0].unmake()
+        last.unmake()
+        self.assertEqual(game.board.get_piece('D', 8).moves, 0)
+
+    def test_move_buffer(self):
+        from array import array
+        board = chess.Board.from_fen('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1')
+        buffer = array('H')
+        self.assertIs(board.generate_legal_moves(moves=buffer), buffer)
+        self.assertEqual(list(buffer), board.generate_legal_moves())
+
+
+class TestFen(unittest.TestCase):
+    def test_round_trip(self):
+        for fen in ['rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+                    'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3',
+                    'rnbqkbnr/pppp1ppp/8/8/3Pp3/8/PPP1PPPP/RNBQKBNR b Kq d3 0 2',
+                    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 37 112',
+                    '4k3/8/8/8/8/8/8/4K2R b K - 99 70']:
+            board = chess.Board.from_fen(fen)
+            self.assertEqual(board.to_fen(), fen)
+            self.assertEqual(board.zobrist_key, board.compute_zobrist_key())
+
+        board = chess.Board.from_fen('4k3/8/8/8/8/8/8/4K3 b - -')
+        self.assertEqual(board.to_fen(), '4k3/8/8/8/8/8/8/4K3 b - - 0 1')
+        self.assertEqual(board.turn, chess.Color.BLACK)
+        self.assertIsInstance(board.get_piece('E', 1), chess.King)
+
+    def test_invalid(self):
+        for fen in ['', '4k3/8/8/8/8/8/8/4K3', '4k3/8/8/8/8/8/8/4K3 w - - 0 1 extra',
+                    '4k3/8/8/8/8/8/4K3 w - - 0 1', '4k3/8/8/8/8/8/8/4K2 w - - 0 1', '4k3/9/8/8/8/8/8/4K3 w - - 0 1',
+                    '4k3/8/8/8/8/8/8/4X3 w - - 0 1', '4k3/8/8/8/8/8/8/4K3 x - - 0 1', '4k3/8/8/8/8/8/8/4K3 w X - 0 1',
+                    '4k3/8/8/8/8/8/8/4K3 w - e3 0 1', '4k3/8/8/8/8/8/8/4K3 w - - a 1',
+                    '8/8/8/8/8/8/8/4K3 w - - 0 1', '4k3/8/8/8/8/8/8/3KK3 w - - 0 1', 'P3k3/8/8/8/8/8/8/4K3 w - - 0 1',
+                    '4k3/8/8/8/8/8/8/4K3 w - e6 0 1', '4k3/4R3/8/8/8/8/8/4K3 w - - 0 1']:
+            with self.assertRaises(Exception, msg=fen):
+                chess.Board.from_fen(fen)
+
+    def test_game_from_fen(self):
+        game = chess.Game.from_fen('4k3/8/8/8/8/8/4P3/4K3 w - - 5 40', 'Alice', 'Bob')
+        self.assertEqual(game.round, 40)
+        self.assertEqual(game.player_1.name, 'Alice')
+        self.assertFalse(game.over)
+        start = game.board.get_square('E', 2)
+        self.assertIs(start.piece, chess.FLYWEIGHTS[chess.PAWN])
+        game.make_move(game.player_1, start.piece, start, game.board.get_square('E', 3))
+        self.assertEqual(game.board.to_fen(), '4k3/8/8/8/8/4P3/8/4K3 b - - 0 40')
+
+        # Fool's mate: the game is already decided
+        game = chess.Game.from_fen('rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3')
+        self.assertTrue(game.over)
+        self.assertEqual(game.status, chess.GameStatus.CHECKMATE)
+        self.assertIs(game.winner, game.player_2)
+
+
+class TestDrawRules(unittest.TestCase):
+    def test_repetition(self):
+        game = chess.Game.new()
+        for notation in ['Nf3', 'Nf6', 'Ng1', 'Ng8']:
+            game.play(notation)
+        self.assertEqual(game.board.repetitions(), 2)
+        self.assertTrue(game.board.is_repetition(2))
+        self.assertFalse(game.over)
+        for notation in ['Nf3', 'Nf6', 'Ng1']:
+            game.play(notation)
+        self.assertFalse(game.over)
+        self.assertFalse(game.can_claim_draw)
+        with self.assertRaises(Exception):
+            game.claim_draw()
+        game.play('Ng8')
+        self.assertEqual(game.board.repetitions(), 3)
+
+        # A threefold repetition is a draw only when claimed, the game may go on
+        self.assertFalse(game.over)
+        self.assertTrue(game.can_claim_draw)
+        for notation in ['Nf3', 'Nf6', 'Ng1', 'Ng8', 'Nf3', 'Nf6', 'Ng1']:
+            game.play(notation)
+        self.assertFalse(game.over)
+        game.play('Ng8')
+        self.assertEqual(game.board.repetitions(), 5)
+        self.assertTrue(game.over)
+        self.assertEqual(game.status, chess.GameStatus.DRAW_FIVEFOLD_REPETITION)
+        self.assertIsNone(game.winner)
+        self.assertFalse(game.can_claim_draw)
+
+        game.undo_move()
+        game.undo_move()
+        game.undo_move()
+        game.undo_move()
+        game.claim_draw()
+        self.assertTrue(game.over)
+        self.assertEqual(game.status, chess.GameStatus.DRAW_REPETITION)
+
+        # A pawn move ends the positions that can repeat
+        board = game.board
+        board.push(board.encode_move(12, 28))  # E2 -> E4
+        self.assertEqual(board.repetitions(), 1)
+
+    def test_repetition_after_double_push(self):
+        # The position after 1.e4 comes back after 3.Ng1 and 5.Ng1: no black pawn can take on e3, so
+        # the en passant square left by the double push does not make it a different position
+        game = chess.Game.new()
+        for notation in ['e4', 'Nf6', 'Nf3', 'Ng8', 'Ng1', 'Nf6', 'Nf3', 'Ng8']:
+            game.play(notation)
+            self.assertEqual(game.board.zobrist_key, game.board.compute_zobrist_key())
+        self.assertFalse(game.over)
+        game.play('Ng1')
+        self.assertEqual(game.board.repetitions(), 3)
+        self.assertTrue(game.can_claim_draw)
+
+        # With a pawn that can take en passant the square is part of the position
+        board = chess.Board.from_fen('4k3/8/8/8/5p2/8/4P3/4K3 w - - 0 1')
+        board.push(board.encode_move(12, 28))  # E2 -> E4
+        key = board.zobrist_key
+        self.assertEqual(key, board.compute_zobrist_key())
+        board.ep_square = None
+        self.assertNotEqual(board.zobrist_key, key)
+
+    def test_fifty_moves(self):
+        game = chess.Game.from_fen('4k3/8/8/8/8/8/8/R3K3 w - - 99 80')
+        self.assertFalse(game.over)
+        game.play('Ra2')
+        self.assertTrue(game.board.is_fifty_moves())
+        self.assertFalse(game.over)
+        game.claim_draw()
+        self.assertEqual(game.status, chess.GameStatus.DRAW_FIFTY_MOVE)
+
+        game = chess.Game.from_fen('4k3/8/8/8/8/8/8/R3K3 w - - 149 80')
+        self.assertTrue(game.can_claim_draw)
+        game.play('Ra2')
+        self.assertTrue(game.over)
+        self.assertEqual(game.status, chess.GameStatus.DRAW_SEVENTY_FIVE_MOVE)
+
+        # Mate on the hundredth half move still wins
+        game = chess.Game.from_fen('4k3/R7/8/8/8/8/8/4K2R w - - 99 80')
+        game.play('Rh8')
+        self.assertEqual(game.status, chess.GameStatus.CHECKMATE)
+
+    def test_insufficient_material(self):
+        for fen, expected in [('4k3/8/8/8/8/8/8/4K3 w - - 0 1', True), ('4k3/8/8/8/8/8/8/4KN2 w - - 0 1', True),
+                              ('2b1k3/8/8/8/8/8/8/4KB2 w - - 0 1', True), ('1b2k3/8/8/8/8/8/8/4KB2 w - - 0 1', False),
+                              ('4k3/8/8/8/8/8/8/3NKN2 w - - 0 1', False), ('4k3/8/8/8/8/8/4P3/4K3 w - - 0 1', False)]:
+            self.assertEqual(chess.Board.from_fen(fen).is_insufficient_material(), expected, fen)
+
+        game = chess.Game.from_fen('4k3/8/8/8/8/8/4r3/4KN2 w - - 0 1')
+        self.assertFalse(game.over)
+        game.play('Kxe2')
+        self.assertEqual(game.status, chess.GameStatus.INSUFFICIENT_MATERIAL)
+        self.assertTrue(chess.Game.from_fen('4k3/8/8/8/8/8/8/4K3 w - - 0 1').over)
+
 
 class TestMove(unittest.TestCase):
     def setUp(self) -> None:
@@ -282,6 +827,38 @@ class TestMove(unittest.TestCase):
         new_move.make()
         self.assertTrue(isinstance(self.player.board.get_square('B', 8).piece, chess.Queen))
 
+    def test_unmake(self):
+        pawn = self.start.piece
+        self.end.piece = chess.Knight('black')
+        knight = self.end.piece
+        self.move.make()
+        self.assertIs(self.move.captured, knight)
+        self.assertEqual(pawn.moves, 1)
+
+        self.move.unmake()
+        self.assertIs(self.start.piece, pawn)
+        self.assertIs(self.end.piece, knight)
+        self.assertEqual(pawn.moves, 0)
+        self.assertEqual(pawn.captured, [])
+        self.assertEqual(self.board.occupancy(chess.Color.BLACK), 1 << self.end.index)
+        self.assertRaises(Exception, self.move.unmake)
+
+    def test_unmake_promotion(self):
+        start = self.board.get_square('B', 7)
+        end = self.board.get_square('A', 8)
+        pawn = chess.Pawn('white', self.player, self.board)
+        rook = chess.Rook('black')
+        start.piece = pawn
+        end.piece = rook
+
+        new_move = chess.Move(self.player, pawn, start, end)
+        new_move.make()
+        self.assertIsInstance(end.piece, chess.Queen)
+        new_move.unmake()
+        self.assertIs(start.piece, pawn)
+        self.assertIs(end.piece, rook)
+        self.assertEqual(self.board.bitboard(chess.QUEEN, chess.Color.WHITE), 0)
+
 
 if __name__ == '__main__':
     # To run: python -m unittest chess_tests
@@ -0,0 +1,398 @@
+""" Move search: iterative deepening principal variation search (negamax with alpha-beta pruning)
+
+With threads > 1 the search runs Lazy SMP: helper processes search the same position at staggered
+depths and share the transposition table through shared memory, so each one profits from what the
+others found. The main search decides when to stop and its deepest result wins ties.
+"""
+import argparse
+import multiprocessing
+import sys
+import time
+import weakref
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+from bitboard import EMPTY, popcount
+from chess import Board, CAPTURE, PROMOTION
+from evaluation import evaluate, PIECE_VALUES
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+
+MATE = 30000  # Score of being mated now, being mated in n plies scores -(MATE - n)
+INFINITE = 32000
+MAX_PLY = 64
+DEFAULT_DEPTH = 4
+ASPIRATION_WINDOW = 50  # Centipawns around the previous iteration's score
+
+SearchResult = namedtuple('SearchResult', 'best_move score depth pv nodes seconds')
+
+
+class SearchStopped(Exception):
+    """ Raised inside the search when the node budget or the time limit is used up """
+
+
+def score_to_tt(score, ply):
+    """ Mate scores are stored relative to the position, not to the root """
+    if score >= MATE - MAX_PLY:
+        return score + ply
+    if score <= -MATE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score >= MATE - MAX_PLY:
+        return score - ply
+    if score <= -MATE + MAX_PLY:
+        return score + ply
+    return score
+
+
+# State of a helper process of a parallel search, set once by _init_helper
+_helper = {}
+
+
+def _init_helper(block_name, stop):
+    block = shared_memory.SharedMemory(name=block_name)
+    _helper['block'] = block
+    _helper['tt'] = TranspositionTable(buffer=block.buf)
+    _helper['stop'] = stop
+
+
+def _helper_search(fen, depth, nodes, time_limit, first_depth, generation):
+    """ Search run by a helper process, until done or until the main search sets the stop event """
+    search = Engine(Board.from_fen(fen), hash_mb=0)
+    search.tt = _helper['tt']
+    search.tt.generation = generation
+    search._abort = _helper['stop']
+    return tuple(search._iterate(depth, nodes, time_limit, first_depth))
+
+
+def _shutdown(pool, block, tt):
+    pool.terminate()
+    pool.join()
+    tt.release()
+    block.close()
+    block.unlink()
+
+
+class Engine:
+    """ Chooses a move for the side to move of a Game or Board
+
+    The search plays and takes back moves on the board itself (Board.push/pop), so no position is ever
+    copied. Results are kept in a transposition table shared by consecutive searches.
+
+    threads > 1 starts threads - 1 helper processes that stay alive until close() is called (or the
+    engine is garbage collected); the engine can be used as a context manager. With an opening book
+    (see book.OpeningBook) best_move plays a book move whenever the position is in the book. With a
+    tablebase (see tablebase.Tablebase) positions with few pieces are scored by the tables instead of
+    searched, and best_move plays the table's move once the root position is in them.
+    """
+
+    def __init__(self, position, hash_mb=16, threads=1, book=None, tablebase=None):
+        self.board = getattr(position, 'board', position)  # A Game or a Board
+        self.threads = threads
+        self.book = book
+        self.tablebase = tablebase
+        self.nodes = 0
+        self._node_limit = None
+        self._deadline = None
+        self._abort = None  # Event set by the main search to stop a helper
+        self._finalizer = None
+        if threads > 1:
+            block = shared_memory.SharedMemory(create=True, size=TranspositionTable.bytes_for(hash_mb))
+            self.tt = TranspositionTable(buffer=block.buf)
+            self._stop = multiprocessing.Event()
+            self._pool = multiprocessing.Pool(threads - 1, _init_helper, (block.name, self._stop))
+            self._finalizer = weakref.finalize(self, _shutdown, self._pool, block, self.tt)
+        else:
+            self.tt = TranspositionTable(hash_mb)
+        self._pv = [[] for _ in range(MAX_PLY + 2)]
+        self._killers = [[0, 0] for _ in range(MAX_PLY + 2)]
+        self._history = [0] * 4096
+
+    def best_move(self, depth=None, nodes=None, time_limit=None):
+        """ Encoded best move for the side to move, 0 if there is none """
+        if self.book is not None:
+            move = self.book.choose(self.board)
+            if move is not None:
+                return move
+        if self.tablebase is not None:
+            move = self.tablebase.best_move(self.board)
+            if move is not None:
+                return move
+        return self.search(depth, nodes, time_limit).best_move
+
+    def close(self):
+        """ Stop the helper processes and free the shared transposition table """
+        if self._finalizer:
+            self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def search(self, depth=None, nodes=None, time_limit=None):
+        """ Search to depth plies, or as deep as a node budget or time limit (seconds) allows
+
+        Returns the result of the deepest completed iteration: best move, score, depth, principal
+        variation, nodes searched and seconds used (nodes of all processes for a parallel search).
+        """
+        self.tt.new_search()
+        if self.threads > 1:
+            return self._parallel_search(depth, nodes, time_limit)
+        return self._iterate(depth, nodes, time_limit)
+
+    def _parallel_search(self, depth, nodes, time_limit):
+        start = time.perf_counter()
+        fen = self.board.to_fen()
+        self._stop.clear()
+        # Half of the helpers start one ply deeper, so the processes spread over different depths
+        pending = [self._pool.apply_async(_helper_search, (fen, depth, nodes, time_limit, 1 + helper % 2,
+                                                           self.tt.generation))
+                   for helper in range(1, self.threads)]
+        try:
+            result = self._iterate(depth, nodes, time_limit)
+        finally:
+            self._stop.set()
+        results = [result] + [SearchResult(*helper.get()) for helper in pending]
+        best = max(results, key=lambda item: item.depth)
+        return best._replace(nodes=sum(item.nodes for item in results), seconds=time.perf_counter() - start)
+
+    def _iterate(self, depth, nodes, time_limit, first_depth=1):
+        """ Iterative deepening from first_depth """
+        max_depth = depth or (MAX_PLY if nodes or time_limit else DEFAULT_DEPTH)
+        self._node_limit = nodes
+        self._deadline = time.perf_counter() + time_limit if time_limit else None
+        self.nodes = 0
+        self._killers = [[0, 0] for _ in range(MAX_PLY + 2)]
+        self._history = [0] * 4096
+
+        board = self.board
+        root_moves = len(board._stack)
+        start = time.perf_counter()
+        result = None
+        score = 0
+        for current in range(min(first_depth, max_depth), max_depth + 1):
+            try:
+                score = self._aspiration(current, score)
+            except SearchStopped:
+                # Unwind the moves the interrupted iteration left on the board
+                while len(board._stack) > root_moves:
+                    board.pop()
+                break
+
+            pv = list(self._pv[0])
+            result = SearchResult(pv[0] if pv else 0, score, current, pv, self.nodes, time.perf_counter() - start)
+            if abs(score) >= MATE - MAX_PLY:
+                # Forced mate found, searching deeper cannot change the outcome
+                break
+
+        if result is None:
+            # Stopped before the first iteration completed: any legal move will do
+            moves = board.generate_legal_moves()
+            result = SearchResult(moves[0] if moves else 0, 0, 0, moves[:1], self.nodes,
+                                  time.perf_counter() - start)
+        return result
+
+    def _aspiration(self, depth, previous):
+        """ Search a narrow window around the previous score first, widening it on a fail """
+        if depth < 4:
+            return self._search(depth, -INFINITE, INFINITE, 0, True)
+
+        delta = ASPIRATION_WINDOW
+        alpha = max(previous - delta, -INFINITE)
+        beta = min(previous + delta, INFINITE)
+        while True:
+            score = self._search(depth, alpha, beta, 0, True)
+            if score <= alpha:
+                alpha = max(score - delta, -INFINITE)
+            elif score >= beta:
+                beta = min(score + delta, INFINITE)
+            else:
+                return score
+            delta *= 2
+
+    def _check_limits(self):
+        if self._node_limit and self.nodes >= self._node_limit:
+            raise SearchStopped()
+        if self._deadline and time.perf_counter() >= self._deadline:
+            raise SearchStopped()
+        if self._abort is not None and self._abort.is_set():
+            raise SearchStopped()
+
+    def _search(self, depth, alpha, beta, ply, pv_node):
+        board = self.board
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self._check_limits()
+        self._pv[ply] = []
+
+        if ply and (board.halfmove_clock >= 100 or board.is_repetition(2)):
+            # Drawn by rule, a repetition inside the search is scored as the draw it can be turned into
+            return 0
+        if ply >= MAX_PLY:
+            return evaluate(board)
+        if ply and self.tablebase is not None and popcount(board.occupied) <= self.tablebase.max_pieces:
+            found = self.tablebase.probe(board)
+            if found is not None:
+                wdl, plies = found
+                return MATE - ply - plies if wdl > 0 else -MATE + ply + plies if wdl < 0 else 0
+
+        in_check = board._checkers(board._turn)
+        if in_check:
+            depth += 1
+        if depth <= 0:
+            return self._quiescence(alpha, beta, ply)
+
+        key = board._key
+        tt_move = 0
+        entry = self.tt.probe(key)
+        if entry:
+            tt_move, tt_score, tt_depth, bound = entry
+            if not pv_node and tt_depth >= depth:
+                tt_score = score_from_tt(tt_score, ply)
+                if (bound == EXACT or (bound == LOWER and tt_score >= beta)
+                        or (bound == UPPER and tt_score <= alpha)):
+                    return tt_score
+
+        moves = board.generate_legal_moves()
+        if not moves:
+            return -MATE + ply if in_check else 0
+        self._order(moves, tt_move, ply)
+
+        original_alpha = alpha
+        best_score = -INFINITE
+        best_move = 0
+        for index, move in enumerate(moves):
+            board.push(move)
+            if index == 0:
+                score = -self._search(depth - 1, -beta, -alpha, ply + 1, pv_node)
+            else:
+                # Null window first: later moves are expected to be worse than the first one
+                score = -self._search(depth - 1, -alpha - 1, -alpha, ply + 1, False)
+                if alpha < score < beta:
+                    score = -self._search(depth - 1, -beta, -alpha, ply + 1, True)
+            board.pop()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    self._pv[ply] = [move] + self._pv[ply + 1]
+                    if score >= beta:
+                        if not move >> 12 & (CAPTURE | PROMOTION):
+                            self._add_killer(move, ply, depth)
+                        break
+
+        if best_score >= beta:
+            bound = LOWER
+        elif best_score > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER
+        self.tt.store(key, best_move, score_to_tt(best_score, ply), depth, bound)
+        return best_score
+
+    def _quiescence(self, alpha, beta, ply):
+        """ Resolve captures and promotions so the static evaluation is only taken in quiet positions """
+        board = self.board
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self._check_limits()
+        self._pv[ply] = []
+
+        best_score = evaluate(board)
+        if best_score >= beta or ply >= MAX_PLY:
+            return best_score
+        if best_score > alpha:
+            alpha = best_score
+
+        moves = [move for move in board.generate_legal_moves() if move >> 12 & (CAPTURE | PROMOTION)]
+        self._order(moves, 0, ply)
+        for move in moves:
+            board.push(move)
+            score = -self._quiescence(-beta, -alpha, ply + 1)
+            board.pop()
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if score >= beta:
+                        break
+        return best_score
+
+    def _order(self, moves, tt_move, ply):
+        """ Sort moves in place: hash move, captures by victim then attacker value, killers, history """
+        mailbox = self.board._mailbox
+        killers = self._killers[ply]
+        history = self._history
+
+        def priority(move):
+            if move == tt_move:
+                return 1 << 30
+            flag = move >> 12
+            if flag & (CAPTURE | PROMOTION):
+                victim = mailbox[(move >> 6) & 63]
+                gain = PIECE_VALUES[victim % 6] if victim != EMPTY else 0
+                if flag & PROMOTION:
+                    gain += PIECE_VALUES[1 + (flag & 3)]
+                elif victim == EMPTY:
+                    gain = PIECE_VALUES[0]  # En passant
+                return (1 << 28) + gain * 16 - PIECE_VALUES[mailbox[move & 63] % 6] // 16
+            if move == killers[0] or move == killers[1]:
+                return 1 << 27
+            return history[move & 0xFFF]
+
+        moves.sort(key=priority, reverse=True)
+
+    def _add_killer(self, move, ply, depth):
+        """ Remember a quiet move that caused a beta cutoff """
+        killers = self._killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self._history[move & 0xFFF] += depth * depth
+
+
+def time_to_depth(fen, depth, threads, hash_mb=16):
+    """ Seconds a single process and threads processes take to complete a search to depth """
+    report = {'fen': fen, 'depth': depth, 'threads': threads}
+    for label, count in (('single', 1), ('parallel', threads)):
+        with Engine(Board.from_fen(fen), hash_mb, count) as search:
+            result = search.search(depth)
+        report[label + '_seconds'] = round(result.seconds, 3)
+        report[label + '_nodes'] = result.nodes
+        report[label + '_move'] = result.best_move
+    report['speedup'] = round(report['single_seconds'] / max(report['parallel_seconds'], 1e-9), 2)
+    return report
+
+
+def main(argv=None):
+    from perft import REFERENCE_POSITIONS
+    from chess import move_name
+
+    parser = argparse.ArgumentParser(description='Lazy SMP time-to-depth benchmark')
+    parser.add_argument('--threads', type=int, default=multiprocessing.cpu_count(), help='processes to search with')
+    parser.add_argument('--depth', type=int, default=5, help='depth every search completes')
+    parser.add_argument('--hash', type=int, default=16, help='transposition table size in MB')
+    parser.add_argument('--fen', action='append', help='position(s) to search (default: perft reference positions)')
+    args = parser.parse_args(argv)
+
+    fens = args.fen or [fen for _, fen, _, _ in REFERENCE_POSITIONS]
+    print('{:>6}{:>10}{:>10}{:>9}  {}'.format('depth', 'single', args.threads, 'speedup', 'position'))
+    for fen in fens:
+        report = time_to_depth(fen, args.depth, args.threads, args.hash)
+        print('{depth:>6}{single_seconds:>10.3f}{parallel_seconds:>10.3f}{speedup:>9.2f}  {fen}'.format(**report))
+        if report['single_move'] != report['parallel_move']:
+            print('        moves differ: {} and {}'.format(
+                move_name(report['single_move']), move_name(report['parallel_move'])))
+    return 0
+
+
+if __name__ == '__main__':
+    # To run: python engine.py --threads 4 --depth 5
+    sys.exit(main())
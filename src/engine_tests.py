@@ -0,0 +1,76 @@
+import unittest
+import chess
+import engine
+import perft
+
+
+class TestEngine(unittest.TestCase):
+
+    def test_mate_in_one(self):
+        board = chess.Board.from_fen('6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1')
+        result = engine.Engine(board).search(depth=3)
+        self.assertEqual(chess.move_name(result.best_move), 'A1->A8')
+        self.assertEqual(result.score, engine.MATE - 1)
+
+    def test_mate_in_two(self):
+        fen = '7k/8/5K2/8/8/8/8/6R1 w - - 0 1'
+        board = chess.Board.from_fen(fen)
+        result = engine.Engine(board).search(depth=4)
+        self.assertEqual(result.score, engine.MATE - 3)
+        self.assertEqual(board.to_fen(), fen)
+
+        # Playing the principal variation mates
+        for move in result.pv:
+            self.assertIn(move, board.generate_legal_moves())
+            board.push(move)
+        self.assertEqual(board.generate_legal_moves(), [])
+        self.assertTrue(board._checkers(board._turn))
+
+    def test_wins_material(self):
+        # The black queen on D5 is left hanging to the knight
+        board = chess.Board.from_fen('4k3/8/8/3q4/8/4N3/8/4K3 w - - 0 1')
+        self.assertEqual(chess.move_name(engine.Engine(board).best_move(depth=2)), 'E3->D5')
+
+    def test_game_and_limits(self):
+        game = chess.Game()
+        fen = game.board.to_fen()
+        search = engine.Engine(game)
+
+        result = search.search(nodes=3000)
+        self.assertIn(result.best_move, game.board.generate_legal_moves())
+        self.assertLess(result.nodes, 3000 + 1024)
+        self.assertEqual(game.board.to_fen(), fen)
+
+        result = search.search(time_limit=0.2)
+        self.assertLess(result.seconds, 0.5)
+        self.assertGreaterEqual(result.depth, 1)
+        self.assertEqual(game.board.to_fen(), fen)
+        self.assertGreater(search.tt.hits, 0)
+
+    def test_no_legal_move(self):
+        board = chess.Board.from_fen(perft.START_FEN)
+        board.set_fen('7k/5Q2/6K1/8/8/8/8/8 b - - 0 1')  # Stalemate
+        self.assertEqual(engine.Engine(board).best_move(depth=2), 0)
+
+    def test_parallel_search(self):
+        fen = '7k/8/5K2/8/8/8/8/6R1 w - - 0 1'
+        board = chess.Board.from_fen(fen)
+        with engine.Engine(board, hash_mb=1, threads=2) as search:
+            result = search.search(depth=4)
+            self.assertEqual(result.score, engine.MATE - 3)
+            self.assertEqual(board.to_fen(), fen)
+
+            result = search.search(time_limit=0.3)
+            self.assertIn(result.best_move, board.generate_legal_moves())
+            self.assertIsNotNone(search.tt.probe(board.zobrist_key))
+
+    def test_time_to_depth(self):
+        report = engine.time_to_depth(perft.START_FEN, 2, 2, hash_mb=1)
+        self.assertEqual(report['depth'], 2)
+        self.assertGreater(report['single_nodes'], 0)
+        self.assertGreater(report['speedup'], 0)
+
+
+if __name__ == '__main__':
+    # To run: python -m unittest engine_tests
+    unittest.main()
@@ -0,0 +1,229 @@
+""" Static evaluation of a position, in centipawns from the point of view of the side to move
+
+The score is material plus piece-square tables, tapered between a middlegame and an endgame table by
+the game phase: the knights, bishops, rooks and queens left on the board (24 with all of them, 0 with
+only kings and pawns). evaluate scores one Board, evaluate_batch scores many positions at once with
+numpy, from piece planes, mailbox codes or packed position store placements.
+"""
+from bitboard import WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, EMPTY, popcount
+
+try:
+    import numpy
+except ImportError:  # Optional: only evaluate_batch and to_planes need it
+    numpy = None
+
+# Material value of each piece kind, the king is never traded
+PIECE_VALUES = [100, 320, 330, 500, 900, 0]
+
+# Contribution of each piece kind to the game phase
+PHASE_WEIGHTS = [0, 1, 1, 2, 4, 0]
+PIECE_PHASES = PHASE_WEIGHTS * 2  # By piece code
+MAX_PHASE = 24
+
+# Piece-square tables from white's point of view, laid out as seen from white: rank 8 first
+_PAWN_MIDDLEGAME = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0]
+_PAWN_ENDGAME = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    80, 80, 80, 80, 80, 80, 80, 80,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    30, 30, 30, 30, 30, 30, 30, 30,
+    15, 15, 15, 15, 15, 15, 15, 15,
+    5, 5, 5, 5, 5, 5, 5, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+    0, 0, 0, 0, 0, 0, 0, 0]
+_KNIGHT = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50]
+_BISHOP = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20]
+_ROOK = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0]
+_QUEEN = [
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20]
+_KING_MIDDLEGAME = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20]
+_KING_ENDGAME = [
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50]
+
+_MIDDLEGAME_TABLES = [_PAWN_MIDDLEGAME, _KNIGHT, _BISHOP, _ROOK, _QUEEN, _KING_MIDDLEGAME]
+_ENDGAME_TABLES = [_PAWN_ENDGAME, _KNIGHT, _BISHOP, _ROOK, _QUEEN, _KING_ENDGAME]
+
+
+def _square_values(tables):
+    """ [piece code][square] -> material + table value, positive for white and negative for black pieces
+
+    A white piece on square s reads the table at s ^ 56 (the tables start with rank 8), a black piece
+    reads it at s, which is the same square seen from black's side.
+    """
+    values = []
+    for color_sign, flip in ((1, 56), (-1, 0)):
+        for kind, table in enumerate(tables):
+            values.append([color_sign * (PIECE_VALUES[kind] + table[square ^ flip]) for square in range(64)])
+    return values
+
+
+def pack_score(middlegame, endgame):
+    """ Middlegame and endgame score in one int, so both are updated with one addition """
+    return (endgame << 16) + middlegame
+
+
+def unpack_score(score):
+    """ (middlegame, endgame) of a packed score """
+    middlegame = ((score + 0x8000) & 0xFFFF) - 0x8000
+    return middlegame, (score - middlegame) >> 16
+
+
+MIDDLEGAME_VALUES = _square_values(_MIDDLEGAME_TABLES)
+ENDGAME_VALUES = _square_values(_ENDGAME_TABLES)
+# Packed scores by [piece code][square], what Board keeps the sum of
+SQUARE_SCORES = [[pack_score(middlegame, endgame) for middlegame, endgame in zip(middlegame_values, endgame_values)]
+                 for middlegame_values, endgame_values in zip(MIDDLEGAME_VALUES, ENDGAME_VALUES)]
+
+if numpy is not None:
+    # Rows for the 12 piece codes and a row of zeros for EMPTY, so mailbox codes index them directly
+    MIDDLEGAME_ARRAY = numpy.array(MIDDLEGAME_VALUES + [[0] * 64], dtype=numpy.int32)
+    ENDGAME_ARRAY = numpy.array(ENDGAME_VALUES + [[0] * 64], dtype=numpy.int32)
+    PHASE_ARRAY = numpy.array(PIECE_PHASES + [0], dtype=numpy.int32)
+
+
+def material(board):
+    """ White material minus black material """
+    bbs = board._bitboards
+    score = 0
+    for kind in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN):
+        score += PIECE_VALUES[kind] * (popcount(bbs[kind]) - popcount(bbs[6 + kind]))
+    return score
+
+
+def game_phase(board):
+    """ 24 in the opening down to 0 with only kings and pawns left """
+    return min(board._phase, MAX_PHASE)
+
+
+def taper(middlegame, endgame, phase):
+    """ Blend of the middlegame and endgame scores for a game phase of 0 - 24, rounded towards zero so a
+    position and its color-swapped mirror get opposite scores """
+    total = middlegame * phase + endgame * (MAX_PHASE - phase)
+    return total // MAX_PHASE if total >= 0 else -(-total // MAX_PHASE)
+
+
+def evaluate_white(board):
+    """ Tapered score from white's point of view, from the score the board keeps up to date move by move """
+    score = board._score
+    middlegame = ((score + 0x8000) & 0xFFFF) - 0x8000
+    phase = board._phase
+    return taper(middlegame, (score - middlegame) >> 16, phase if phase < MAX_PHASE else MAX_PHASE)
+
+
+def evaluate(board):
+    score = evaluate_white(board)
+    return score if board._turn == WHITE else -score
+
+
+def to_planes(boards):
+    """ numpy (N, 12, 64) array of piece planes: 1 where a piece of that code stands """
+    if numpy is None:
+        raise Exception('to_planes requires numpy')
+    codes = _mailboxes(boards)
+    return (codes[:, None, :] == numpy.arange(12, dtype=numpy.uint8)[None, :, None]).astype(numpy.uint8)
+
+
+def _mailboxes(boards):
+    """ numpy (N, 64) array of the mailbox codes of boards """
+    data = b''.join(bytes(board._mailbox) for board in boards)
+    return numpy.frombuffer(data, dtype=numpy.uint8).reshape(-1, 64)
+
+
+def evaluate_batch(positions, turns=None):
+    """ Scores of many positions in one vectorized pass, as a numpy array of N int32 values
+
+    positions is one of:
+      - an (N, 12, 64) array of piece planes (see to_planes),
+      - an (N, 64) array of mailbox codes (12 for an empty square),
+      - an (N, 32) array of packed placements, as in position_store records (array()['placement']),
+      - a sequence of Boards.
+    Scores are from white's point of view, or from the side to move's with turns: an array of N side
+    to move values, 0 for white and 1 for black (for position store records: array()['state'] & 1).
+    """
+    if numpy is None:
+        raise Exception('evaluate_batch requires numpy')
+    if not isinstance(positions, numpy.ndarray):
+        positions = _mailboxes(positions)
+
+    if positions.ndim == 3:
+        if positions.shape[1:] != (12, 64):
+            raise Exception('Invalid piece planes: expected shape (N, 12, 64), got {}'.format(positions.shape))
+        planes = positions.astype(numpy.int32, copy=False)
+        middlegame = numpy.einsum('npq,pq->n', planes, MIDDLEGAME_ARRAY[:12])
+        endgame = numpy.einsum('npq,pq->n', planes, ENDGAME_ARRAY[:12])
+        phase = planes.sum(axis=2) @ PHASE_ARRAY[:12]
+    else:
+        if positions.ndim != 2 or positions.shape[1] not in (32, 64):
+            raise Exception('Invalid positions: expected shape (N, 64) or (N, 32), got {}'.format(positions.shape))
+        codes = positions
+        if positions.shape[1] == 32:
+            codes = numpy.empty((len(positions), 64), dtype=numpy.uint8)
+            codes[:, 0::2] = positions & 15
+            codes[:, 1::2] = positions >> 4
+        if codes.size and codes.max() > EMPTY:
+            raise Exception('Invalid mailbox codes: {} is above {}'.format(codes.max(), EMPTY))
+        squares = numpy.arange(64)
+        middlegame = MIDDLEGAME_ARRAY[codes, squares].sum(axis=1)
+        endgame = ENDGAME_ARRAY[codes, squares].sum(axis=1)
+        phase = PHASE_ARRAY[codes].sum(axis=1)
+
+    phase = numpy.minimum(phase, MAX_PHASE)
+    total = middlegame * phase + endgame * (MAX_PHASE - phase)
+    scores = (numpy.sign(total) * (numpy.abs(total) // MAX_PHASE)).astype(numpy.int32)
+    if turns is not None:
+        scores = numpy.where(numpy.asarray(turns) & 1, -scores, scores).astype(numpy.int32)
+    return scores
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import random
+import unittest
+import chess
+import evaluation
+import perft
+import position_store
+from position_store_tests import sample_boards
+
+
+def mirror(board):
+    """ Board with the ranks flipped and the colors swapped """
+    fields = board.to_fen().split()
+    placement = '/'.join(reversed(fields[0].split('/'))).swapcase()
+    return chess.Board.from_fen(' '.join([placement, 'b' if fields[1] == 'w' else 'w', '-', '-'] + fields[4:]))
+
+
+class TestEvaluation(unittest.TestCase):
+    def test_evaluate(self):
+        board = chess.Board.from_fen(chess.START_FEN)
+        self.assertEqual(evaluation.evaluate(board), 0)
+        self.assertEqual(evaluation.game_phase(board), evaluation.MAX_PHASE)
+        self.assertEqual(evaluation.game_phase(chess.Board.from_fen('4k3/pppp4/8/8/8/8/4PPPP/4K3 w - - 0 1')), 0)
+
+        # A central pawn beats a pawn on its start square, a centralized king is worth more without queens
+        board.push(board.encode_move(12, 28))  # E2 -> E4
+        self.assertLess(evaluation.evaluate(board), 0)
+        self.assertLess(evaluation.evaluate_white(chess.Board.from_fen('8/8/8/4k3/8/8/8/K7 b - - 0 1')), 0)
+        self.assertGreater(evaluation.evaluate(chess.Board.from_fen('8/8/8/4k3/8/8/8/K7 b - - 0 1')), 0)
+
+        for board in sample_boards():
+            self.assertEqual(evaluation.evaluate(mirror(board)), evaluation.evaluate(board), board.to_fen())
+
+    def test_incremental(self):
+        # The sums kept by push, pop and set_piece_at match a full scan through captures, castling,
+        # en passant and promotions
+        rng = random.Random(7)
+        for _, fen, _, _ in perft.REFERENCE_POSITIONS:
+            board = chess.Board.from_fen(fen)
+            start = board.compute_score()
+            for _ in range(60):
+                moves = board.generate_legal_moves()
+                if not moves:
+                    break
+                board.push(rng.choice(moves))
+                self.assertEqual((board._score, board._phase), board.compute_score())
+                self.assertEqual(board.copy().compute_score(), board.compute_score())
+            while board._stack:
+                board.pop()
+                self.assertEqual((board._score, board._phase), board.compute_score())
+            self.assertEqual(board.compute_score(), start)
+
+        board = chess.Board.from_fen(chess.START_FEN)
+        board.set_piece_at(3, None)
+        board.set_piece_at(35, chess.FLYWEIGHTS[chess.QUEEN])
+        self.assertEqual((board._score, board._phase), board.compute_score())
+        self.assertEqual(evaluation.unpack_score(evaluation.pack_score(-1234, 567)), (-1234, 567))
+        self.assertEqual(evaluation.unpack_score(evaluation.pack_score(4321, -8765)), (4321, -8765))
+
+    @unittest.skipIf(evaluation.numpy is None, 'numpy is not installed')
+    def test_evaluate_batch(self):
+        boards = sample_boards()
+        expected = [evaluation.evaluate_white(board) for board in boards]
+        turns = [board._turn for board in boards]
+
+        self.assertEqual(list(evaluation.evaluate_batch(boards)), expected)
+        self.assertEqual(list(evaluation.evaluate_batch(evaluation.to_planes(boards))), expected)
+        self.assertEqual(list(evaluation.evaluate_batch(boards, turns)), [evaluation.evaluate(board) for board in boards])
+
+        with tempfile.TemporaryDirectory() as directory:
+            with position_store.PositionStore(os.path.join(directory, 'positions.bin'), 'w') as store:
+                store.extend(boards)
+                records = store.array()
+                scores = evaluation.evaluate_batch(records['placement'], records['state'] & 1)
+                self.assertEqual(list(scores), [evaluation.evaluate(board) for board in boards])
+                del records
+
+        with self.assertRaises(Exception):
+            evaluation.evaluate_batch(evaluation.numpy.zeros((2, 10)))
+
+
+if __name__ == '__main__':
+    # To run: python -m unittest evaluation_tests
+    unittest.main()
@@ -0,0 +1,284 @@
+""" Move notation: standard algebraic notation (SAN) and UCI notation of encoded moves against a position
+
+Moves are looked up with bitboards first: the pieces of the moving kind that reach the target square
+are the only candidates, and a single candidate that is not pinned away from the target is the move.
+Everything else (castling, en passant, check evasions, ambiguous or illegal input) is matched against
+the legal move list, which is also where disambiguation of printed moves comes from.
+
+To run the benchmark: python notation.py [--games N] [--plies N]
+"""
+import argparse
+import random
+import re
+import sys
+import time
+
+from bitboard import BB_SQUARES, BB_FILES, BB_RANKS, EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+from bitboard import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, LINE, bishop_attacks, rook_attacks, queen_attacks
+from bitboard import lsb
+from chess import Board, START_FEN, COLUMNS, COLUMN_INDEX, KING_CASTLE, QUEEN_CASTLE, CAPTURE, PROMOTION
+
+# Piece letter of SAN -> piece kind
+SAN_KINDS = {'N': KNIGHT, 'B': BISHOP, 'R': ROOK, 'Q': QUEEN, 'K': KING}
+SAN_LETTERS = ['', 'N', 'B', 'R', 'Q', 'K']
+
+_SAN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?(x)?([a-h])([1-8])(?:=?([NBRQ]))?$')
+_UCI = re.compile(r'^([a-h][1-8])([a-h][1-8])([nbrq])?$')
+_ARROW = re.compile(r'^([a-hA-H][1-8])->([a-hA-H][1-8])(?:=([NBRQnbrq]))?$')
+
+
+def _square(name):
+    """ Square index of a name like e4 or E4 """
+    return COLUMN_INDEX[name[0].upper()] + 8 * (int(name[1]) - 1)
+
+
+def _reaching(board, kind, end, us):
+    """ Bitboard of the pieces of kind and color index us that attack (or, for pawns, push to) end """
+    bbs = board._bitboards
+    pieces = bbs[us * 6 + kind]
+    if kind == KNIGHT:
+        return KNIGHT_ATTACKS[end] & pieces
+    if kind == BISHOP:
+        return bishop_attacks(end, board.occupied) & pieces
+    if kind == ROOK:
+        return rook_attacks(end, board.occupied) & pieces
+    if kind == QUEEN:
+        return queen_attacks(end, board.occupied) & pieces
+    if kind == KING:
+        return KING_ATTACKS[end] & pieces
+
+    # Pawns: captures when end holds an enemy piece, pushes when it is empty
+    if board._mailbox[end] != EMPTY:
+        return PAWN_ATTACKS[us ^ 1][end] & pieces
+    behind = end - 8 if us == 0 else end + 8
+    if not 0 <= behind < 64:
+        return 0
+    if pieces & BB_SQUARES[behind]:
+        return BB_SQUARES[behind]
+    double = behind - 8 if us == 0 else behind + 8
+    if board._mailbox[behind] == EMPTY and end >> 3 == (3 if us == 0 else 4) and pieces & BB_SQUARES[double]:
+        return BB_SQUARES[double]
+    return 0
+
+
+def _fast_move(board, kind, end, candidates, promotion):
+    """ Encoded move when exactly one candidate can legally go to end, otherwise None (use the legal list) """
+    us = board._turn
+    if candidates & (candidates - 1) or board._mailbox[end] // 6 == us or board._checkers(us):
+        return None
+    start = lsb(candidates)
+    king = board._bitboards[us * 6 + KING]
+    if not king:
+        return None
+    king_square = lsb(king)
+    occupied = board.occupied
+
+    if kind == KING:
+        if board._is_attacked(end, us ^ 1, occupied ^ king):
+            return None
+    else:
+        pinned, _ = board._pins(king_square, us, occupied)
+        if pinned & BB_SQUARES[start] and not LINE[king_square][start] & BB_SQUARES[end]:
+            return None
+
+    last_rank = kind == PAWN and end >> 3 == (7 if us == 0 else 0)
+    if last_rank != bool(promotion):
+        return None
+    return board.encode_move(start, end, SAN_KINDS[promotion] if promotion else QUEEN)
+
+
+def parse_san(board: Board, san):
+    """ Encoded legal move of the side to move written in SAN, e.g. e4, Nbd7, exd8=Q+, O-O """
+    text = san.rstrip('+#!?')
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        flag = KING_CASTLE if len(text) == 3 else QUEEN_CASTLE
+        for move in board.generate_legal_moves():
+            if move >> 12 == flag:
+                return move
+        raise Exception('Illegal move {}: castling is not possible'.format(san))
+
+    match = _SAN.match(text)
+    if not match:
+        raise Exception('Invalid move {}'.format(san))
+    piece, from_file, from_rank, capture, to_file, to_rank, promotion = match.groups()
+    kind = SAN_KINDS[piece] if piece else PAWN
+    end = COLUMN_INDEX[to_file.upper()] + 8 * (int(to_rank) - 1)
+
+    # Fast path: narrow the pieces that reach end down by the disambiguation given
+    candidates = _reaching(board, kind, end, board._turn)
+    if from_file:
+        candidates &= BB_FILES[COLUMN_INDEX[from_file.upper()]]
+    if from_rank:
+        candidates &= BB_RANKS[int(from_rank) - 1]
+    occupied = board._mailbox[end] != EMPTY
+    if candidates and bool(capture) == occupied and (kind != PAWN or bool(from_file) == occupied):
+        move = _fast_move(board, kind, end, candidates, promotion)
+        if move is not None:
+            return move
+
+    mailbox = board._mailbox
+    found = []
+    for move in board.generate_legal_moves():
+        start = move & 63
+        if (move >> 6) & 63 != end or mailbox[start] % 6 != kind:
+            continue
+        if from_file and start & 7 != COLUMN_INDEX[from_file.upper()]:
+            continue
+        if from_rank and start >> 3 != int(from_rank) - 1:
+            continue
+        flag = move >> 12
+        # The move has to be what the SAN says: a capture (en passant included) only with an x, and a
+        # pawn capture names the file it comes from, a pawn push stays on its file
+        if bool(capture) != bool(flag & CAPTURE):
+            continue
+        if kind == PAWN and (not from_file if capture else start & 7 != end & 7):
+            continue
+        if flag & PROMOTION:
+            if not promotion or KNIGHT + (flag & 3) != SAN_KINDS[promotion]:
+                continue
+        elif promotion:
+            continue
+        found.append(move)
+
+    if len(found) != 1:
+        raise Exception('{} move {}'.format('Ambiguous' if found else 'Illegal', san))
+    return found[0]
+
+
+def san(board: Board, move):
+    """ SAN of a legal encoded move of the side to move, with + or # when it gives check or mate """
+    start = move & 63
+    end = (move >> 6) & 63
+    flag = move >> 12
+    if flag == KING_CASTLE:
+        text = 'O-O'
+    elif flag == QUEEN_CASTLE:
+        text = 'O-O-O'
+    else:
+        kind = board._mailbox[start] % 6
+        target = COLUMNS[end & 7].lower() + str((end >> 3) + 1)
+        if kind == PAWN:
+            text = COLUMNS[start & 7].lower() + 'x' + target if flag & CAPTURE else target
+            if flag & PROMOTION:
+                text += '=' + SAN_LETTERS[KNIGHT + (flag & 3)]
+        else:
+            capture = 'x' if flag & CAPTURE else ''
+            text = SAN_LETTERS[kind] + _disambiguation(board, kind, start, end) + capture + target
+
+    board.push(move)
+    if board._checkers(board._turn):
+        text += '+' if board.generate_legal_moves() else '#'
+    board.pop()
+    return text
+
+
+def _disambiguation(board, kind, start, end):
+    """ File, rank or square of start needed to tell the move apart from the same kind of piece's moves to end """
+    others = _reaching(board, kind, end, board._turn) & ~BB_SQUARES[start]
+    if not others:
+        return ''
+    # Only pieces that can legally make the move count, the legal list settles pins and checks
+    mailbox = board._mailbox
+    rivals = [move & 63 for move in board.generate_legal_moves()
+              if (move >> 6) & 63 == end and move & 63 != start and mailbox[move & 63] == mailbox[start]]
+    if not rivals:
+        return ''
+    if all(rival & 7 != start & 7 for rival in rivals):
+        return COLUMNS[start & 7].lower()
+    if all(rival >> 3 != start >> 3 for rival in rivals):
+        return str((start >> 3) + 1)
+    return COLUMNS[start & 7].lower() + str((start >> 3) + 1)
+
+
+def uci(move):
+    """ UCI notation of an encoded move, e.g. e2e4 or e7e8q """
+    text = '{}{}{}{}'.format(COLUMNS[move & 7], (move >> 3 & 7) + 1, COLUMNS[(move >> 6) & 7], (move >> 9 & 7) + 1)
+    if move >> 12 & PROMOTION:
+        text += SAN_LETTERS[KNIGHT + (move >> 12 & 3)]
+    return text.lower()
+
+
+def parse_uci(board: Board, text):
+    """ Encoded legal move of the side to move written in UCI notation """
+    match = _UCI.match(text)
+    if not match:
+        raise Exception('Invalid move {}'.format(text))
+    return _legal(board, _square(match.group(1)), _square(match.group(2)), match.group(3), text)
+
+
+def parse_move(board: Board, text):
+    """ Encoded legal move written in SAN (Nf3), UCI (g1f3) or square to square (G1->F3, E7->E8=N) """
+    text = text.strip()
+    match = _UCI.match(text)
+    if match:
+        return _legal(board, _square(match.group(1)), _square(match.group(2)), match.group(3), text)
+    match = _ARROW.match(text)
+    if match:
+        return _legal(board, _square(match.group(1)), _square(match.group(2)), match.group(3), text)
+    return parse_san(board, text)
+
+
+def _legal(board, start, end, promotion, text):
+    if board._mailbox[start] == EMPTY or board._mailbox[start] // 6 != board._turn:
+        raise Exception('Illegal move {}: no piece of the side to move on the start square'.format(text))
+    move = board.encode_move(start, end, SAN_KINDS[promotion.upper()] if promotion else QUEEN)
+    if move not in board.generate_legal_moves():
+        raise Exception('Illegal move {}'.format(text))
+    return move
+
+
+def run_benchmark(games=20, plies=80, seed=1):
+    """ Moves per second written as SAN and read back, over random games from the initial position """
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(games):
+        board = Board.from_fen(START_FEN)
+        line = []
+        for _ in range(plies):
+            moves = board.generate_legal_moves()
+            if not moves:
+                break
+            move = rng.choice(moves)
+            board.push(move)
+            line.append(move)
+        lines.append(line)
+    count = sum(len(line) for line in lines)
+
+    # Both timings include playing the moves on the board
+    start = time.perf_counter()
+    texts = []
+    for line in lines:
+        board = Board.from_fen(START_FEN)
+        for move in line:
+            texts.append(san(board, move))
+            board.push(move)
+    write_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    position = 0
+    for line in lines:
+        board = Board.from_fen(START_FEN)
+        for _ in line:
+            board.push(parse_san(board, texts[position]))
+            position += 1
+    read_seconds = time.perf_counter() - start
+
+    return {
+        'moves': count,
+        'san_per_second': int(count / write_seconds),
+        'parse_san_per_second': int(count / read_seconds),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='SAN writing and parsing benchmark')
+    parser.add_argument('--games', type=int, default=20, help='random games to replay')
+    parser.add_argument('--plies', type=int, default=80, help='maximum length of each game')
+    args = parser.parse_args(argv)
+    result = run_benchmark(args.games, args.plies)
+    print('{moves} moves: san {san_per_second}/s, parse_san {parse_san_per_second}/s'.format(**result))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
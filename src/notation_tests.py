@@ -0,0 +1,90 @@
+import random
+import unittest
+import chess
+import notation
+import perft
+
+
+class TestNotation(unittest.TestCase):
+
+    def test_round_trip(self):
+        # Every legal move of the reference positions and of random positions reached from them
+        rng = random.Random(7)
+        for _, fen, _, _ in perft.REFERENCE_POSITIONS:
+            board = chess.Board.from_fen(fen)
+            for _ in range(30):
+                moves = board.generate_legal_moves()
+                if not moves:
+                    break
+                for move in moves:
+                    text = notation.san(board, move)
+                    self.assertEqual(notation.parse_san(board, text), move, '{} in {}'.format(text, board.to_fen()))
+                    self.assertEqual(notation.parse_uci(board, notation.uci(move)), move)
+                board.push(rng.choice(moves))
+
+    def test_san(self):
+        board = chess.Board.from_fen('r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4')
+        self.assertEqual(notation.san(board, notation.parse_uci(board, 'h5f7')), 'Qxf7#')
+        self.assertEqual(notation.san(board, notation.parse_uci(board, 'c4f7')), 'Bxf7+')
+        self.assertEqual(notation.san(board, notation.parse_uci(board, 'g1e2')), 'Ne2')
+
+        board = chess.Board.from_fen('8/k7/8/8/4Q2Q/8/2K5/7Q w - - 0 1')
+        self.assertEqual(notation.san(board, notation.parse_uci(board, 'h4e1')), 'Qh4e1')
+        self.assertEqual(notation.san(board, notation.parse_uci(board, 'e4e1')), 'Qee1')
+        self.assertEqual(notation.san(board, notation.parse_uci(board, 'h1e1')), 'Q1e1')
+
+        board = chess.Board.from_fen('r3k2r/1P6/8/8/8/8/8/4K3 w kq - 0 1')
+        self.assertEqual(notation.san(board, notation.parse_uci(board, 'b7a8n')), 'bxa8=N')
+        self.assertEqual(notation.san(board, notation.parse_san(board, 'b8=Q')), 'b8=Q+')
+        board.push(notation.parse_san(board, 'Kf1'))
+        self.assertEqual(notation.san(board, notation.parse_san(board, 'O-O')), 'O-O+')
+
+    def test_parse(self):
+        board = chess.Board.from_fen('r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3')
+        self.assertEqual(chess.move_name(notation.parse_san(board, 'Bb5')), 'F1->B5')
+        self.assertEqual(chess.move_name(notation.parse_move(board, 'f3e5')), 'F3->E5')
+        self.assertEqual(chess.move_name(notation.parse_move(board, 'F3->G5')), 'F3->G5')
+        for text in ['Nxe4', 'e5', 'Ke2x', 'Bc4c5', 'O-O', 'e2e5', 'E7->E5', 'a3=Q']:
+            with self.assertRaises(Exception, msg=text):
+                notation.parse_move(board, text)
+
+        # Two knights reach d2: the SAN has to say which one
+        board = chess.Board.from_fen('4k3/8/8/8/8/8/8/1N2KN2 w - - 0 1')
+        with self.assertRaises(Exception):
+            notation.parse_san(board, 'Nd2')
+        self.assertEqual(chess.move_name(notation.parse_san(board, 'Nfd2')), 'F1->D2')
+
+        # The pinned knight cannot move, so Nd2 is the other one
+        board = chess.Board.from_fen('4k3/8/8/8/8/8/8/1N1K1N1r w - - 0 1')
+        self.assertEqual(chess.move_name(notation.parse_san(board, 'Nd2')), 'B1->D2')
+        self.assertEqual(notation.san(board, notation.parse_san(board, 'Nd2')), 'Nd2')
+
+        # The capture marker has to match the move
+        board = chess.Board.from_fen('4k3/8/8/4p3/3P4/8/8/4K3 w - - 0 1')
+        with self.assertRaises(Exception):
+            notation.parse_san(board, 'e5')
+        self.assertEqual(chess.move_name(notation.parse_san(board, 'dxe5')), 'D4->E5')
+        board = chess.Board.from_fen('4k3/8/8/4p3/8/8/8/4K2N w - - 0 1')
+        with self.assertRaises(Exception):
+            notation.parse_san(board, 'Nxg3')
+        self.assertEqual(chess.move_name(notation.parse_san(board, 'Ng3')), 'H1->G3')
+        board = chess.Board.from_fen('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1')
+        with self.assertRaises(Exception):
+            notation.parse_san(board, 'd6')
+        self.assertEqual(chess.move_name(notation.parse_san(board, 'exd6')), 'E5->D6')
+
+    def test_game_play(self):
+        game = chess.Game()
+        for text in ['e4', 'e7e5', 'G1->F3', 'Nc6', 'Bc4', 'Nf6', 'Ng5', 'd5', 'exd5', 'Nxd5', 'Nxf7', 'Kxf7']:
+            game.play(text)
+        self.assertEqual(game.board.to_fen(), 'r1bq1b1r/ppp2kpp/2n5/3np3/2B5/8/PPPP1PPP/RNBQK2R w KQ - 0 7')
+
+    def test_benchmark(self):
+        result = notation.run_benchmark(games=2, plies=20)
+        self.assertEqual(result['moves'], 40)
+        self.assertGreater(result['parse_san_per_second'], 0)
+
+
+if __name__ == '__main__':
+    # To run: python -m unittest notation_tests
+    unittest.main()
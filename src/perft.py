@@ -0,0 +1,322 @@
+""" Perft: count the leaf nodes of the legal move tree, to check and benchmark move generation
+
+To run the benchmark: python perft.py [--depth N] [--position NAME] [--workers N] [--hash MB] [--fen]
+                                      [--history perft_history.json]
+
+Runs are only compared with and appended to a history file given with --history, and only when every
+node count matched the reference.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from chess import Board, START_FEN, move_name
+
+# Reference positions: (name, FEN, node counts for depth 1, 2, ...), default benchmark depth
+# https://www.chessprogramming.org/Perft_Results
+REFERENCE_POSITIONS = [
+    ('startpos', START_FEN,
+     [20, 400, 8902, 197281, 4865609, 119060324], 5),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603, 193690690], 4),
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624, 11030083], 5),
+    ('position4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333, 15833292], 4),
+    ('position4_mirrored', 'r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1',
+     [6, 264, 9467, 422333, 15833292], 4),
+    ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487, 89941194], 4),
+    ('position6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594, 164075551], 4),
+]
+
+
+class PerftCache:
+    """ Bounded (Zobrist key, depth) -> leaf node count table
+
+    One flat array of two word slots (key, count << 8 | depth); a store replaces whatever the slot held.
+    """
+
+    def __init__(self, size_mb=16):
+        slots = 1
+        while slots * 2 * 16 <= size_mb * 1024 * 1024:
+            slots *= 2
+        self.size_mb = size_mb
+        self._mask = slots - 1
+        self._table = array('Q', bytes(slots * 16))
+        self.probes = 0
+        self.hits = 0
+        self.nodes_avoided = 0  # Leaf nodes counted from the cache instead of the move tree
+
+    def _index(self, key, depth):
+        return ((key ^ depth * 0x9E3779B97F4A7C15) & self._mask) * 2
+
+    def get(self, key, depth):
+        """ Cached count of the position with key at depth, or None """
+        self.probes += 1
+        index = self._index(key, depth)
+        data = self._table[index + 1]
+        if data & 0xFF == depth and self._table[index] == key:
+            self.hits += 1
+            self.nodes_avoided += data >> 8
+            return data >> 8
+        return None
+
+    def put(self, key, depth, nodes):
+        index = self._index(key, depth)
+        self._table[index] = key
+        self._table[index + 1] = nodes << 8 | depth
+
+
+def perft(board: Board, depth, workers=1, hash_mb=0, cache=None):
+    """ Number of leaf nodes of the legal move tree of depth plies
+
+    With workers > 1 the subtrees of the root moves are counted in that many processes. With hash_mb
+    (or a PerftCache) the counts of positions reached again by other move orders are looked up.
+    """
+    if workers > 1 and depth > 1:
+        return sum(perft_divide(board, depth, workers, hash_mb, cache).values())
+    if cache is None and hash_mb:
+        cache = PerftCache(hash_mb)
+    if cache is not None:
+        return _count_cached(board, depth, cache)
+    return _count(board, depth)
+
+
+def _buffers(depth):
+    """ One reusable move list per ply, so the tree walk does not allocate a list per node """
+    return [[] for _ in range(depth + 1)]
+
+
+def _count(board, depth, buffers=None):
+    if depth == 0:
+        return 1
+    if buffers is None:
+        buffers = _buffers(depth)
+    moves = buffers[depth]
+    del moves[:]
+    board.generate_legal_moves(None, moves)
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        board.push(move)
+        nodes += _count(board, depth - 1, buffers)
+        board.pop()
+    return nodes
+
+
+def _count_cached(board, depth, cache, buffers=None):
+    if buffers is None:
+        buffers = _buffers(depth)
+    if depth <= 1:
+        return _count(board, depth, buffers)
+    key = board.zobrist_key
+    nodes = cache.get(key, depth)
+    if nodes is not None:
+        return nodes
+
+    moves = buffers[depth]
+    del moves[:]
+    board.generate_legal_moves(None, moves)
+    nodes = 0
+    for move in moves:
+        board.push(move)
+        nodes += _count_cached(board, depth - 1, cache, buffers)
+        board.pop()
+    cache.put(key, depth, nodes)
+    return nodes
+
+
+def _count_fen(fen, depth, hash_mb):
+    """ Count of a subtree sent to a worker process: (nodes, cache hits, nodes avoided) """
+    board = Board.from_fen(fen)
+    if not hash_mb:
+        return _count(board, depth), 0, 0
+    cache = PerftCache(hash_mb)
+    return _count_cached(board, depth, cache), cache.hits, cache.nodes_avoided
+
+
+def perft_divide(board: Board, depth, workers=1, hash_mb=0, cache=None):
+    """ Leaf node count below each root move, as {encoded move: nodes} """
+    moves = board.generate_legal_moves()
+    if workers > 1 and depth > 1:
+        # Every worker has a cache of its own, their statistics are added up into cache
+        hash_mb = cache.size_mb if cache is not None else hash_mb
+        fens = []
+        for move in moves:
+            board.push(move)
+            fens.append(board.to_fen())
+            board.pop()
+        with ProcessPoolExecutor(workers) as pool:
+            counts = list(pool.map(_count_fen, fens, [depth - 1] * len(fens), [hash_mb] * len(fens)))
+        if cache is not None:
+            cache.hits += sum(hits for _, hits, _ in counts)
+            cache.nodes_avoided += sum(avoided for _, _, avoided in counts)
+        return dict(zip(moves, (nodes for nodes, _, _ in counts)))
+
+    if cache is None and hash_mb:
+        cache = PerftCache(hash_mb)
+    divide = {}
+    for move in moves:
+        board.push(move)
+        divide[move] = _count(board, depth - 1) if cache is None else _count_cached(board, depth - 1, cache)
+        board.pop()
+    return divide
+
+
+def run_benchmark(positions=None, depth=None, workers=1, hash_mb=0):
+    """ Run perft on the reference positions and return one result per position
+
+    Each result holds node count, expected count, wall time, nodes per second and, with a cache,
+    the leaf nodes the cache saved from counting.
+    """
+    results = []
+    for name, fen, counts, default_depth in positions or REFERENCE_POSITIONS:
+        run_depth = min(depth or default_depth, len(counts))
+        board = Board.from_fen(fen)
+        cache = PerftCache(hash_mb) if hash_mb else None
+
+        start = time.perf_counter()
+        nodes = perft(board, run_depth, workers, cache=cache)
+        seconds = time.perf_counter() - start
+
+        results.append({
+            'position': name,
+            'depth': run_depth,
+            'nodes': nodes,
+            'expected': counts[run_depth - 1],
+            'seconds': round(seconds, 4),
+            'nps': int(nodes / seconds) if seconds else 0,
+            'workers': workers,
+            'hash_mb': hash_mb,
+            'nodes_avoided': cache.nodes_avoided if cache else 0,
+        })
+    return results
+
+
+def run_fen_benchmark(positions=None, repeat=2000):
+    """ Positions per second Board.from_fen loads and Board.to_fen writes, over the reference positions """
+    fens = [fen for _, fen, _, _ in positions or REFERENCE_POSITIONS] * repeat
+    start = time.perf_counter()
+    boards = [Board.from_fen(fen) for fen in fens]
+    load_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for board in boards:
+        board.to_fen()
+    write_seconds = time.perf_counter() - start
+    return {
+        'positions': len(fens),
+        'from_fen_per_second': int(len(fens) / load_seconds),
+        'to_fen_per_second': int(len(fens) / write_seconds),
+    }
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as history_file:
+        return json.load(history_file)
+
+
+def save_history(path, history):
+    with open(path, 'w') as history_file:
+        json.dump(history, history_file, indent=2)
+
+
+def _run_key(result):
+    """ Results are only compared with runs of the same setup """
+    return result['position'], result['depth'], result.get('workers', 1), result.get('hash_mb', 0)
+
+
+def find_regressions(results, history, tolerance):
+    """ Results whose nodes per second dropped by more than tolerance against the previous run """
+    regressions = []
+    previous = {}
+    for run in history:
+        for result in run['results']:
+            previous[_run_key(result)] = result
+
+    for result in results:
+        before = previous.get(_run_key(result))
+        if before and before['nps'] and result['nps'] < before['nps'] * (1 - tolerance):
+            regressions.append((result, before))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Perft move generation benchmark')
+    parser.add_argument('--depth', type=int, help='depth for every position (default: per position)')
+    parser.add_argument('--position', action='append', help='only run the named reference position(s)')
+    parser.add_argument('--divide', action='store_true', help='print node counts below each root move')
+    parser.add_argument('--workers', type=int, default=1, help='processes the root moves are split across')
+    parser.add_argument('--fen', action='store_true', help='only benchmark FEN loading and writing')
+    parser.add_argument('--hash', type=int, default=0, help='perft cache size in MB (default: no cache)')
+    parser.add_argument('--history', help='JSON file the results are compared with and appended to (default: none)')
+    parser.add_argument('--label', default='', help='label stored with the run, e.g. a version')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed nodes per second drop (0.1 = 10%%)')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit with an error on a slowdown')
+    args = parser.parse_args(argv)
+
+    positions = [position for position in REFERENCE_POSITIONS if not args.position or position[0] in args.position]
+    if not positions:
+        parser.error('unknown position, choose from {}'.format(', '.join(p[0] for p in REFERENCE_POSITIONS)))
+
+    if args.fen:
+        result = run_fen_benchmark(positions)
+        print('{positions} positions: from_fen {from_fen_per_second}/s, to_fen {to_fen_per_second}/s'.format(**result))
+        return 0
+
+    if args.divide:
+        for name, fen, counts, default_depth in positions:
+            divide = perft_divide(Board.from_fen(fen), min(args.depth or default_depth, len(counts)), args.workers,
+                                  args.hash)
+            print(name)
+            for move, nodes in sorted(divide.items(), key=lambda item: move_name(item[0])):
+                print('  {}: {}'.format(move_name(move), nodes))
+
+    results = run_benchmark(positions, args.depth, args.workers, args.hash)
+    failed = False
+    print('{:<20}{:>6}{:>14}{:>10}{:>12}{:>14}'.format('position', 'depth', 'nodes', 'seconds', 'nps', 'avoided'))
+    for result in results:
+        status = '' if result['nodes'] == result['expected'] else '  FAIL (expected {})'.format(result['expected'])
+        failed = failed or bool(status)
+        print('{position:<20}{depth:>6}{nodes:>14}{seconds:>10.3f}{nps:>12}{nodes_avoided:>14}'.format(**result) + status)
+
+    if failed:
+        return 1
+    if not args.history:
+        return 0
+
+    # A run with wrong node counts measured broken move generation, it is neither compared nor kept
+    history = load_history(args.history)
+    regressions = find_regressions(results, history, args.tolerance)
+    for result, before in regressions:
+        print('Regression: {} depth {} {} nps, was {} nps ({})'.format(
+            result['position'], result['depth'], result['nps'], before['nps'], before.get('label') or 'previous run'))
+    for result in results:
+        result['label'] = args.label
+
+    history.append({
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'label': args.label,
+        'python': platform.python_version(),
+        'results': results,
+    })
+    save_history(args.history, history)
+
+    if regressions and args.fail_on_regression:
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import os
+import tempfile
+import unittest
+import chess
+import perft
+
+
+class TestPerft(unittest.TestCase):
+
+    def test_reference_positions(self):
+        # Shallow depths keep the suite quick, python perft.py runs the full benchmark
+        for name, fen, counts, default_depth in perft.REFERENCE_POSITIONS:
+            board = chess.Board.from_fen(fen)
+            for depth in range(1, 3):
+                self.assertEqual(perft.perft(board, depth), counts[depth - 1], '{} depth {}'.format(name, depth))
+            self.assertEqual(board.to_fen(), fen)
+
+    def test_start_position_depth_3(self):
+        self.assertEqual(perft.perft(chess.Board.from_fen(perft.START_FEN), 3), 8902)
+
+    def test_push_pop_restores_position(self):
+        for name, fen, counts, default_depth in perft.REFERENCE_POSITIONS:
+            board = chess.Board.from_fen(fen)
+            for move in board.generate_legal_moves():
+                board.push(move)
+                for reply in board.generate_legal_moves():
+                    board.push(reply)
+                    board.pop()
+                self.assertEqual(board.pop(), move)
+                self.assertEqual(board.to_fen(), fen, '{} {}'.format(name, chess.move_name(move)))
+            self.assertEqual(board._bitboards, chess.Board.from_fen(fen)._bitboards)
+
+    def test_zobrist_key(self):
+        for name, fen, counts, default_depth in perft.REFERENCE_POSITIONS:
+            board = chess.Board.from_fen(fen)
+            start_key = board.zobrist_key
+            self.assertEqual(start_key, board.compute_zobrist_key())
+            for move in board.generate_legal_moves():
+                board.push(move)
+                self.assertEqual(board.zobrist_key, board.compute_zobrist_key(), chess.move_name(move))
+                for reply in board.generate_legal_moves():
+                    board.push(reply)
+                    self.assertEqual(board.zobrist_key, board.compute_zobrist_key(), chess.move_name(reply))
+                    board.pop()
+                board.pop()
+                self.assertEqual(board.zobrist_key, start_key)
+
+    def test_zobrist_transposition(self):
+        board = chess.Board.from_fen(perft.START_FEN)
+        other = chess.Board.from_fen(perft.START_FEN)
+        for start, end in [(6, 21), (62, 45), (1, 18)]:  # Nf3 Nf6 Nc3
+            board.push(board.encode_move(start, end))
+        for start, end in [(1, 18), (62, 45), (6, 21)]:  # Nc3 Nf6 Nf3
+            other.push(other.encode_move(start, end))
+        self.assertEqual(board.zobrist_key, other.zobrist_key)
+
+        # Same placement, different side to move or castling rights
+        self.assertNotEqual(chess.Board.from_fen(perft.START_FEN).zobrist_key,
+                            chess.Board.from_fen(perft.START_FEN.replace(' w ', ' b ')).zobrist_key)
+        self.assertNotEqual(chess.Board.from_fen(perft.START_FEN).zobrist_key,
+                            chess.Board.from_fen(perft.START_FEN.replace('KQkq', 'Kkq')).zobrist_key)
+
+    def test_perft_divide(self):
+        board = chess.Board.from_fen(perft.REFERENCE_POSITIONS[1][1])
+        divide = perft.perft_divide(board, 2)
+        self.assertEqual(len(divide), 48)
+        self.assertEqual(sum(divide.values()), 2039)
+        self.assertEqual(divide[board.encode_move(4, 6)], 43)  # E1->G1, castling
+
+    def test_benchmark_history(self):
+        positions = [perft.REFERENCE_POSITIONS[2]]
+        with tempfile.TemporaryDirectory() as directory:
+            history = os.path.join(directory, 'history.json')
+            self.assertEqual(perft.main(['--position', 'position3', '--depth', '3', '--history', history]), 0)
+            self.assertEqual(len(perft.load_history(history)), 1)
+
+            results = perft.run_benchmark(positions, 3)
+            self.assertEqual(results[0]['nodes'], 2812)
+
+            # A run ten times slower than the stored one is reported
+            slow = [dict(results[0], nps=1)]
+            self.assertEqual(len(perft.find_regressions(slow, perft.load_history(history), 0.1)), 1)
+
+    def test_wrong_count_fails(self):
+        name, fen, counts, depth = perft.REFERENCE_POSITIONS[2]
+        with tempfile.TemporaryDirectory() as directory:
+            original = perft.REFERENCE_POSITIONS[2]
+            perft.REFERENCE_POSITIONS[2] = (name, fen, [15] + counts[1:], depth)
+            try:
+                code = perft.main(['--position', name, '--depth', '1', '--history', os.path.join(directory, 'h.json')])
+            finally:
+                perft.REFERENCE_POSITIONS[2] = original
+            self.assertEqual(code, 1)
+            self.assertFalse(os.path.exists(os.path.join(directory, 'h.json')))
+
+    def test_no_default_history(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cwd = os.getcwd()
+            os.chdir(directory)
+            try:
+                self.assertEqual(perft.main(['--position', 'position3', '--depth', '1']), 0)
+            finally:
+                os.chdir(cwd)
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_parallel_perft(self):
+        _, fen, counts, _ = perft.REFERENCE_POSITIONS[1]
+        board = chess.Board.from_fen(fen)
+        self.assertEqual(perft.perft(board, 3, workers=2), counts[2])
+        self.assertEqual(perft.perft_divide(board, 2, workers=2), perft.perft_divide(board, 2))
+        self.assertEqual(board.to_fen(), fen)
+
+    def test_perft_cache(self):
+        for _, fen, counts, _ in perft.REFERENCE_POSITIONS[:3]:
+            board = chess.Board.from_fen(fen)
+            cache = perft.PerftCache(1)
+            self.assertEqual(perft.perft(board, 3, cache=cache), perft.perft(board, 3))
+            self.assertEqual(perft.perft(board, 3, cache=cache), counts[2])
+            self.assertGreater(cache.nodes_avoided, 0)
+            self.assertEqual(board.to_fen(), fen)
+
+        # A tiny cache evicts all the time but stays exact
+        board = chess.Board.from_fen(perft.START_FEN)
+        self.assertEqual(perft.perft(board, 4, cache=perft.PerftCache(0)), 197281)
+        self.assertEqual(perft.perft_divide(board, 3, hash_mb=1), perft.perft_divide(board, 3))
+
+    def test_fen_benchmark(self):
+        result = perft.run_fen_benchmark(repeat=2)
+        self.assertEqual(result['positions'], 2 * len(perft.REFERENCE_POSITIONS))
+        self.assertGreater(result['from_fen_per_second'], 0)
+
+
+if __name__ == '__main__':
+    # To run: python -m unittest perft_tests
+    unittest.main()
@@ -0,0 +1,244 @@
+""" PGN reader: streams the games of a PGN file one at a time
+
+Files are read line by line, so memory use does not depend on the size of the file. Compressed files
+(.gz, .bz2, .xz) are decompressed on the fly. Headers are parsed as a game is read, its movetext is
+only turned into moves when asked for.
+
+To count the games of a file and write its offset index: python pgn.py games.pgn.gz [--index games.idx]
+"""
+import argparse
+import bz2
+import gzip
+import lzma
+import re
+import sys
+from array import array
+
+from chess import Board, Game, START_FEN
+from notation import parse_san
+
+# Openers of compressed files by file name extension
+OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+_HEADER = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# Comments, variations, annotation glyphs and move numbers are skipped, what is left are SAN moves
+_MOVETEXT_NOISE = re.compile(r'\{[^}]*\}|;[^\n]*|\$\d+|\d+\.(?:\.\.)?')
+
+
+def open_pgn(path):
+    """ Binary file object of a PGN file, decompressing it when its name ends with .gz, .bz2 or .xz """
+    for extension, opener in OPENERS.items():
+        if str(path).endswith(extension):
+            return opener(path, 'rb')
+    return open(path, 'rb')
+
+
+def _open(source):
+    """ (binary file object, whether it was opened here) of a file name or of an already open file
+
+    Files opened in text mode are read through their binary buffer, so offsets are bytes of the file
+    whatever its line endings and encoding.
+    """
+    if isinstance(source, (str, bytes)) or hasattr(source, '__fspath__'):
+        return open_pgn(source), True
+    return getattr(source, 'buffer', source), False
+
+
+class PgnGame:
+    """ One game of a PGN file: its headers, its movetext and where it starts in the (decompressed) file """
+
+    def __init__(self, headers, movetext, offset=None):
+        self.headers = headers
+        self.movetext = movetext
+        self.offset = offset
+        self._san = None
+
+    @property
+    def result(self):
+        return self.headers.get('Result', '*')
+
+    def start_board(self):
+        """ Board of the position the game starts from: the FEN header or the initial position """
+        return Board.from_fen(self.headers.get('FEN') or START_FEN)
+
+    def san(self):
+        """ Moves of the main line as written in the movetext """
+        if self._san is None:
+            text = _MOVETEXT_NOISE.sub(' ', self.movetext)
+            # Drop variations, which may be nested
+            depth = 0
+            kept = []
+            for part in re.split(r'([()])', text):
+                if part == '(':
+                    depth += 1
+                elif part == ')':
+                    depth = max(depth - 1, 0)
+                elif not depth:
+                    kept.append(part)
+            self._san = [token for token in ' '.join(kept).split() if token not in RESULTS]
+        return self._san
+
+    def moves(self):
+        """ Encoded moves of the main line as an array('H'), checked against the rules as they are replayed """
+        board = self.start_board()
+        moves = array('H')
+        for san in self.san():
+            move = parse_san(board, san)
+            board.push(move)
+            moves.append(move)
+        return moves
+
+    def board(self):
+        """ Board of the final position """
+        board = self.start_board()
+        for san in self.san():
+            board.push(parse_san(board, san))
+        return board
+
+    def game(self):
+        """ Game replayed move by move with Game.make_move, as if the players had entered the moves """
+        game = Game(self.headers.get('White', 'White'), self.headers.get('Black', 'Black'), self.headers.get('FEN'))
+        for move in self.moves():
+            game.play_move(move)
+        return game
+
+    def __repr__(self):
+        return 'PgnGame({} - {}, {})'.format(self.headers.get('White', '?'), self.headers.get('Black', '?'), self.result)
+
+
+def _decode(line):
+    """ Text of a line of bytes: PGN files are UTF-8 or, the older ones, Latin-1 """
+    try:
+        return line.decode('utf-8')
+    except UnicodeDecodeError:
+        return line.decode('latin-1')
+
+
+def _lines(handle):
+    """ (byte offset, text line) of every line of a binary file object
+
+    In-memory text (io.StringIO) is counted in UTF-8 bytes, as if it was written to a file.
+    """
+    offset = 0
+    for line in handle:
+        if isinstance(line, bytes):
+            size = len(line)
+            line = _decode(line)
+        else:
+            size = len(line.encode('utf-8'))
+        yield offset, line
+        offset += size
+
+
+def _read(handle, start_offset, movetext_from=0):
+    """ Games of a file object positioned at start_offset, as (offset, headers, movetext)
+
+    The movetext of the games before number movetext_from (or of every game if it is None) is skipped.
+    """
+    headers = None
+    movetext = []
+    offset = None
+    in_movetext = False
+    number = -1
+    with_movetext = False
+    for line_offset, line in _lines(handle):
+        stripped = line.strip()
+        if stripped.startswith('[') and (headers is None or in_movetext):
+            if headers is not None:
+                yield offset, headers, ''.join(movetext)
+            headers = {}
+            movetext = []
+            offset = start_offset + line_offset
+            in_movetext = False
+            number += 1
+            with_movetext = movetext_from is not None and number >= movetext_from
+
+        if headers is None or stripped.startswith('%'):
+            continue
+        if not in_movetext and stripped.startswith('['):
+            match = _HEADER.match(stripped)
+            if match:
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+        elif stripped:
+            in_movetext = True
+            if with_movetext:
+                movetext.append(line)
+
+    if headers is not None:
+        yield offset, headers, ''.join(movetext)
+
+
+def read_games(source, start=0, index=None):
+    """ Yield the games of a PGN file name or file object, from game number start (0-based)
+
+    Without an index the games before start are scanned for their headers only. With an index
+    (see build_index) the reader seeks straight to the game, the file object has to be seekable.
+    """
+    handle, owned = _open(source)
+    try:
+        start_offset = 0
+        if index is not None and start:
+            if start >= len(index):
+                return
+            start_offset = index[start]
+            handle.seek(start_offset)
+            start = 0
+
+        for number, (offset, headers, movetext) in enumerate(_read(handle, start_offset, start)):
+            if number >= start:
+                yield PgnGame(headers, movetext, offset)
+    finally:
+        if owned:
+            handle.close()
+
+
+def read_headers(source):
+    """ Yield only the headers of the games of a PGN file, without keeping their movetext """
+    handle, owned = _open(source)
+    try:
+        for _, headers, _ in _read(handle, 0, None):
+            yield headers
+    finally:
+        if owned:
+            handle.close()
+
+
+def build_index(source):
+    """ Byte offset of the start of each game in the (decompressed) file, as an array of unsigned 64-bit ints """
+    handle, owned = _open(source)
+    try:
+        return array('Q', (offset for offset, _, _ in _read(handle, 0, None)))
+    finally:
+        if owned:
+            handle.close()
+
+
+def save_index(index, path):
+    with open(path, 'wb') as index_file:
+        index.tofile(index_file)
+
+
+def load_index(path):
+    index = array('Q')
+    with open(path, 'rb') as index_file:
+        index.frombytes(index_file.read())
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Count the games of a PGN file')
+    parser.add_argument('path', help='PGN file, optionally compressed (.gz, .bz2, .xz)')
+    parser.add_argument('--index', help='write the offset of every game to this file')
+    args = parser.parse_args(argv)
+
+    index = build_index(args.path)
+    print('{} games'.format(len(index)))
+    if args.index:
+        save_index(index, args.index)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import tempfile
+import unittest
+import chess
+import pgn
+
+PGN = '''[Event "Paris"]
+[White "Morphy"]
+[Black "Duke Karl / Count Isouard"]
+[Result "1-0"]
+
+1.e4 e5 2.Nf3 d6 3.d4 Bg4 4.dxe5 Bxf3 5.Qxf3 dxe5 6.Bc4 Nf6 7.Qb3 Qe7 8.Nc3 c6 9.Bg5 b5
+10.Nxb5 cxb5 11.Bxb5+ Nbd7 12.O-O-O Rd8 13.Rxd7 Rxd7 14.Rd1 Qe6 15.Bxd7+ Nxd7 16.Qb8+ Nxb8
+17.Rd8# 1-0
+
+[Event "Study"]
+[SetUp "1"]
+[FEN "4k3/1P6/8/3pP3/8/8/8/4K3 w - d6 0 1"]
+[Result "*"]
+
+1. exd6 Kd7 2. b8=N+ Kxd6 *
+
+[Event "Comments \\"and\\" variations"]
+[Result "1/2-1/2"]
+
+1. d4 {Queen's pawn; not e4} d5 (1... Nf6 2. c4 (2. Nf3) e6) 2. c4 $1 dxc4 ; accepted
+1/2-1/2
+'''
+
+
+class TestPgn(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_read_games(self):
+        games = list(pgn.read_games(io.BytesIO(PGN.encode())))
+        self.assertEqual(len(games), 3)
+        self.assertEqual(games[0].headers['White'], 'Morphy')
+        self.assertEqual(games[2].headers['Event'], 'Comments "and" variations')
+        self.assertEqual(games[2].san(), ['d4', 'd5', 'c4', 'dxc4'])
+        self.assertEqual(games[1].board().to_fen(), '1N6/8/3k4/8/8/8/8/4K3 w - - 0 3')
+        self.assertEqual(len(games[0].moves()), 33)
+
+    def test_game(self):
+        morphy, study, _ = pgn.read_games(io.StringIO(PGN))
+        game = morphy.game()
+        self.assertEqual(game.status, chess.GameStatus.CHECKMATE)
+        self.assertIs(game.winner, game.player_1)
+        self.assertEqual(game.player_2.name, 'Duke Karl / Count Isouard')
+
+        game = study.game()
+        self.assertIsInstance(game.board.get_piece('B', 8), chess.Knight)
+        self.assertEqual(game.board.to_fen(), study.board().to_fen())
+
+    def test_compressed_files_and_index(self):
+        for extension, opener in (('.pgn', open), ('.pgn.gz', gzip.open), ('.pgn.bz2', bz2.open),
+                                  ('.pgn.xz', lzma.open)):
+            path = os.path.join(self.directory.name, 'games' + extension)
+            with opener(path, 'wb') as pgn_file:
+                pgn_file.write(PGN.encode() * 2)
+
+            index = pgn.build_index(path)
+            self.assertEqual(len(index), 6)
+            self.assertEqual(index[0], 0)
+            pgn.save_index(index, path + '.idx')
+            self.assertEqual(pgn.load_index(path + '.idx'), index)
+
+            expected = [game.headers['Event'] for game in pgn.read_games(path)][4:]
+            self.assertEqual([game.headers['Event'] for game in pgn.read_games(path, start=4)], expected)
+            games = list(pgn.read_games(path, start=4, index=index))
+            self.assertEqual([game.headers['Event'] for game in games], expected)
+            self.assertEqual(games[0].offset, index[4])
+            self.assertEqual(games[0].board().to_fen(), '1N6/8/3k4/8/8/8/8/4K3 w - - 0 3')
+            self.assertEqual(len(list(pgn.read_headers(path))), 6)
+
+    def test_line_endings_and_encodings(self):
+        # CRLF line endings and a Latin-1 name before the games the index points to
+        text = PGN.replace('Duke Karl', 'Herzog Karl von Braunschweig-Lüneburg')
+        for data in (text.replace('\n', '\r\n').encode(), text.encode('latin-1'),
+                     text.replace('\n', '\r\n').encode('latin-1')):
+            path = os.path.join(self.directory.name, 'games.pgn')
+            with open(path, 'wb') as pgn_file:
+                pgn_file.write(data * 2)
+
+            index = pgn.build_index(path)
+            self.assertEqual(len(index), 6)
+            for number, offset in enumerate(index):
+                self.assertTrue(data[offset % len(data):].startswith(b'[Event'), number)
+            games = list(pgn.read_games(path, start=3, index=index))
+            self.assertIn('Lüneburg', games[0].headers['Black'])
+            self.assertEqual(games[1].board().to_fen(), '1N6/8/3k4/8/8/8/8/4K3 w - - 0 3')
+
+            # A file opened in text mode is indexed by the bytes of the file, not of its decoded text
+            with open(path, encoding='latin-1') as pgn_file:
+                self.assertEqual(pgn.build_index(pgn_file), index)
+            with open(path, encoding='latin-1') as pgn_file:
+                games = list(pgn.read_games(pgn_file, start=4, index=index))
+            self.assertEqual(games[0].headers['Event'], 'Study')
+
+    def test_game_past_claimable_draws(self):
+        # Threefold repetition and the fifty-move rule are draws a player may claim, the games go on
+        repetition = '[Event "Repetition"]\n\n1. Nf3 Nf6 2. Ng1 Ng8 3. Nf3 Nf6 4. Ng1 Ng8 5. e4 e5 *\n'
+        fifty_moves = '''[Event "Fifty moves"]
+[FEN "7k/8/8/8/8/8/8/R3K3 w - - 0 1"]
+
+1. Rb1 Kg7 2. Ra1 Kf6 3. Rb1 Ke5 4. Ra1 Kd4 5. Rb1 Kc3 6. Ra1 Kb2 7. Rc1 Ka2 8. Rb1 Ka3 9. Rc1 Kb2
+10. Ra1 Kc2 11. Rb1 Kd3 12. Ra1 Kc3 13. Rb1 Kc2 14. Ra1 Kb3 15. Rc1 Ka3 16. Rb1 Ka2 17. Rc1 Kb3
+18. Ra1 Kb4 19. Rc1 Ka4 20. Rb1 Ka5 21. Rc1 Kb4 22. Ra1 Kc4 23. Rb1 Kd4 24. Ra1 Kd3 25. Rb1 Ke3
+26. Ra1 Kf3 27. Rb1 Kg2 28. Ra1 Kg1 29. Rb1 Kh1 30. Ra1 Kg2 31. Rb1 Kg1 32. Ra1 Kh1 33. Rb1 Kh2
+34. Ra1 Kg3 35. Rb1 Kf3 36. Ra1 Ke3 37. Rb1 Ke4 38. Ra1 Kf4 39. Rb1 Kg3 40. Ra1 Kh2 41. Rb1 Kh3
+42. Ra1 Kg4 43. Rb1 Kf4 44. Ra1 Ke4 45. Rb1 Kd5 46. Ra1 Kc5 47. Rb1 Kc4 48. Ra1 Kb5 49. Rc1 Ka5
+50. Rb1 Ka4 51. Rc1 Kb5 52. Ra1 Kb6 *
+'''
+        first, second = pgn.read_games(io.StringIO(repetition + '\n' + fifty_moves))
+
+        game = first.game()
+        self.assertFalse(game.over)
+        self.assertEqual(len(game.move_codes), 10)
+        self.assertEqual(game.board.get_piece('E', 5).color, chess.Color.BLACK)
+
+        game = second.game()
+        self.assertFalse(game.over)
+        self.assertEqual(game.board.halfmove_clock, 104)
+        self.assertTrue(game.can_claim_draw)
+
+    def test_illegal_move(self):
+        game = pgn.PgnGame({}, '1. e4 e5 2. Ke3')
+        with self.assertRaises(Exception):
+            game.moves()
+
+
+if __name__ == '__main__':
+    # To run: python -m unittest pgn_tests
+    unittest.main()
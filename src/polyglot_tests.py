@@ -0,0 +1,24 @@
+import unittest
+import chess
+from notation import parse_san
+from polyglot import polyglot_key
+
+
+class TestPolyglotKey(unittest.TestCase):
+    def test_published_keys(self):
+        # Keys from the Polyglot format description
+        board = chess.Board.from_fen(chess.START_FEN)
+        self.assertEqual(polyglot_key(board), 0x463b96181691fc9c)
+        for san, key in [('e4', 0x823c9b50fd114196), ('d5', 0x0756b94461c50fb0), ('e5', 0x662fafb965db29d4),
+                         ('f5', 0x22a48b5a8e47ff78), ('Ke2', 0x652a607ca3f242c1), ('Kf7', 0x00fdd303c946bdd9)]:
+            board.push(parse_san(board, san))
+            self.assertEqual(polyglot_key(board), key, san)
+
+        for fen, key in [('rnbqkbnr/p1pppppp/8/8/PpP4P/8/1P1PPPP1/RNBQKBNR b KQkq c3 0 3', 0x3c8123ea7b067637),
+                         ('rnbqkbnr/p1pppppp/8/8/P6P/R1p5/1P1PPPP1/1NBQKBNR b Kkq - 0 4', 0x5c3f9b829b279560)]:
+            self.assertEqual(polyglot_key(chess.Board.from_fen(fen)), key, fen)
+
+
+if __name__ == '__main__':
+    # To run: python -m unittest polyglot_tests
+    unittest.main()
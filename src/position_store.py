@@ -0,0 +1,237 @@
+""" Compact fixed-width positions and a memory-mapped file of them
+
+A position is a 40 byte record: 32 bytes of piece placement (one 4-bit mailbox code per square, A1
+in the low nibble of byte 0, 12 for an empty square), then side to move and castling rights in one
+byte, the en passant square (255 for none), the halfmove clock and the fullmove number (unsigned
+16-bit little endian) and 2 bytes of padding that keep records 8-byte aligned.
+
+A PositionStore file is a 16 byte header followed by the records, so the n-th position is read
+straight from its offset. With numpy installed, PositionStore.array() views the records as a
+structured array without copying them.
+
+To convert FENs (one per line) to a store: python position_store.py positions.txt positions.bin
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+from operator import or_
+
+from bitboard import BB_SQUARES, EMPTY, WHITE, BLACK
+from chess import Board
+
+try:
+    import numpy
+except ImportError:  # Optional: only PositionStore.array() needs it
+    numpy = None
+
+RECORD_SIZE = 40
+HEADER_SIZE = 16
+MAGIC = b'CHESSPOS'
+
+_STATE = struct.Struct('<BBHH2x')
+_HEADER = struct.Struct('<8sI4x')
+NO_EP_SQUARE = 255
+_WRITE_BATCH = 4096  # Records encoded before they are written by extend
+
+# Nibble tables: code -> code in the high nibble, packed byte -> low or high code
+_HIGH_NIBBLE = [code << 4 for code in range(16)]
+_LOW_CODES = bytes(byte & 15 for byte in range(256))
+_HIGH_CODES = bytes(byte >> 4 for byte in range(256))
+
+if numpy is not None:
+    RECORD_DTYPE = numpy.dtype([('placement', 'u1', (32,)), ('state', 'u1'), ('ep_square', 'u1'),
+                                ('halfmove_clock', '<u2'), ('fullmove_number', '<u2'), ('padding', 'V2')])
+
+
+def encode_position(board: Board):
+    """ 40 byte record of the position on board """
+    mailbox = board._mailbox
+    placement = bytes(map(or_, mailbox[0::2], map(_HIGH_NIBBLE.__getitem__, mailbox[1::2])))
+    ep_square = board.ep_square
+    return placement + _STATE.pack(board._turn | board.castling_rights << 1,
+                                   NO_EP_SQUARE if ep_square is None else ep_square,
+                                   min(board.halfmove_clock, 0xFFFF), min(board.fullmove_number, 0xFFFF))
+
+
+def decode_position(record):
+    """ Board of a 40 byte record, e.g. a bytes object or a slice of a memoryview """
+    if len(record) != RECORD_SIZE:
+        raise Exception('Invalid position record: expected {} bytes, got {}'.format(RECORD_SIZE, len(record)))
+    placement = bytes(record[:32])
+    mailbox = bytearray(64)
+    mailbox[0::2] = placement.translate(_LOW_CODES)
+    mailbox[1::2] = placement.translate(_HIGH_CODES)
+    state, ep_square, halfmove_clock, fullmove_number = _STATE.unpack_from(record, 32)
+
+    bitboards = [0] * 12
+    for index, code in enumerate(mailbox):
+        if code != EMPTY:
+            if code > EMPTY:
+                raise Exception('Invalid position record: bad piece code {}'.format(code))
+            bitboards[code] |= BB_SQUARES[index]
+
+    board = Board()
+    board._mailbox = mailbox
+    board._bitboards = bitboards
+    board._occupancy = [bitboards[0] | bitboards[1] | bitboards[2] | bitboards[3] | bitboards[4] | bitboards[5],
+                        bitboards[6] | bitboards[7] | bitboards[8] | bitboards[9] | bitboards[10] | bitboards[11]]
+    board._turn = BLACK if state & 1 else WHITE
+    board._castling_rights = (state >> 1) & 15
+    board._ep_square = None if ep_square == NO_EP_SQUARE else ep_square
+    board.halfmove_clock = halfmove_clock
+    board.fullmove_number = fullmove_number
+    board._key = board.compute_zobrist_key()
+    board._score, board._phase = board.compute_score()
+    return board
+
+
+class PositionStore:
+    """ File of position records, memory-mapped for reading and appended to for writing
+
+    mode 'r' opens an existing store read-only, 'w' creates (or empties) one and 'a' appends to an
+    existing store, creating it if needed. Positions are read as Boards by index, records() and
+    array() give views of the raw records that stay valid until the store grows or is closed.
+    """
+
+    def __init__(self, path, mode='r'):
+        if mode not in ('r', 'w', 'a'):
+            raise Exception('Invalid mode {}: expected r, w or a'.format(mode))
+        self.path = path
+        self.mode = mode
+        if mode == 'w' or (mode == 'a' and not os.path.exists(path)):
+            with open(path, 'wb') as store_file:
+                store_file.write(_HEADER.pack(MAGIC, RECORD_SIZE))
+
+        self._file = open(path, 'rb' if mode == 'r' else 'r+b')
+        magic, record_size = _HEADER.unpack(self._file.read(HEADER_SIZE).ljust(HEADER_SIZE, b'\0'))
+        if magic != MAGIC or record_size != RECORD_SIZE:
+            self._file.close()
+            raise Exception('{} is not a position store'.format(path))
+        self._file.seek(0, os.SEEK_END)
+        size = self._file.tell() - HEADER_SIZE
+        if size % RECORD_SIZE:
+            self._file.close()
+            raise Exception('{} is truncated: {} bytes after the last whole record'.format(path, size % RECORD_SIZE))
+        self._count = size // RECORD_SIZE
+        self._map = None
+        self._mapped = -1  # Number of records the current map covers
+
+    def __len__(self):
+        return self._count
+
+    def _view(self):
+        """ Memoryview of the records, remapped when records were appended since the last view """
+        if self._mapped != self._count:
+            self._unmap()
+            self._file.flush()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped = self._count
+        return memoryview(self._map)[HEADER_SIZE:HEADER_SIZE + self._count * RECORD_SIZE]
+
+    def _unmap(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A view of the records is still in use, the map closes once it is released
+                pass
+            self._map = None
+
+    def append(self, board: Board):
+        """ Add the position of board at the end of the store """
+        self.write_records(encode_position(board))
+
+    def extend(self, boards):
+        """ Add the position of every board, returning how many were added """
+        count = 0
+        records = []
+        for board in boards:
+            records.append(encode_position(board))
+            if len(records) == _WRITE_BATCH:
+                self.write_records(b''.join(records))
+                count += len(records)
+                records = []
+        self.write_records(b''.join(records))
+        return count + len(records)
+
+    def write_records(self, data):
+        """ Append already encoded records, e.g. a slice of another store's records() """
+        if self.mode == 'r':
+            raise Exception('{} is opened read-only'.format(self.path))
+        if len(data) % RECORD_SIZE:
+            raise Exception('Invalid records: {} bytes is not a whole number of records'.format(len(data)))
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(data)
+        self._count += len(data) // RECORD_SIZE
+
+    def record(self, index):
+        """ Record of position number index (negative counts from the end), as a zero-copy memoryview """
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('position {} out of range'.format(index))
+        return self._view()[index * RECORD_SIZE:(index + 1) * RECORD_SIZE]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(self._count))]
+        return decode_position(self.record(index))
+
+    def __iter__(self):
+        view = self._view()
+        for offset in range(0, len(view), RECORD_SIZE):
+            yield decode_position(view[offset:offset + RECORD_SIZE])
+
+    def records(self):
+        """ Memoryview of every record back to back, without copying them """
+        return self._view()
+
+    def array(self):
+        """ Records as a numpy structured array of RECORD_DTYPE sharing memory with the file """
+        if numpy is None:
+            raise Exception('PositionStore.array() requires numpy')
+        return numpy.frombuffer(self._view(), dtype=RECORD_DTYPE)
+
+    def close(self):
+        self._unmap()
+        self._mapped = -1
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return 'PositionStore({}, {} positions)'.format(self.path, self._count)
+
+
+def unpack_placement(placements):
+    """ numpy (n, 64) array of mailbox codes from an array of 32 byte placements, e.g. array()['placement'] """
+    if numpy is None:
+        raise Exception('unpack_placement requires numpy')
+    codes = numpy.empty(placements.shape[:-1] + (64,), dtype=numpy.uint8)
+    codes[..., 0::2] = placements & 15
+    codes[..., 1::2] = placements >> 4
+    return codes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write the positions of a FEN file to a position store')
+    parser.add_argument('fens', help='text file with one FEN per line')
+    parser.add_argument('store', help='position store to write')
+    parser.add_argument('--append', action='store_true', help='add to the store instead of replacing it')
+    args = parser.parse_args(argv)
+
+    with open(args.fens) as fen_file, PositionStore(args.store, 'a' if args.append else 'w') as store:
+        count = store.extend(Board.from_fen(line) for line in fen_file if line.strip())
+        print('{} positions written, {} in {}'.format(count, len(store), args.store))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import os
+import random
+import tempfile
+import unittest
+import chess
+import perft
+import position_store
+from position_store import PositionStore
+
+
+def sample_boards(count=40, seed=3):
+    """ Reference positions and positions reached from them by random moves """
+    rng = random.Random(seed)
+    boards = []
+    for _, fen, _, _ in perft.REFERENCE_POSITIONS:
+        board = chess.Board.from_fen(fen)
+        for _ in range(count // len(perft.REFERENCE_POSITIONS)):
+            boards.append(board.copy())
+            moves = board.generate_legal_moves()
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+    return boards
+
+
+class TestPositionStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'positions.bin')
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_encoding(self):
+        for board in sample_boards() + [chess.Board.from_fen('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1')]:
+            record = position_store.encode_position(board)
+            self.assertEqual(len(record), position_store.RECORD_SIZE)
+            decoded = position_store.decode_position(record)
+            self.assertEqual(decoded.to_fen(), board.to_fen())
+            self.assertEqual(decoded.zobrist_key, board.zobrist_key)
+            self.assertEqual(decoded.generate_legal_moves(), board.generate_legal_moves())
+
+        with self.assertRaises(Exception):
+            position_store.decode_position(b'\xff' * position_store.RECORD_SIZE)
+        with self.assertRaises(Exception):
+            position_store.decode_position(b'\0' * 8)
+
+    def test_store(self):
+        boards = sample_boards()
+        fens = [board.to_fen() for board in boards]
+        with PositionStore(self.path, 'w') as store:
+            store.append(boards[0])
+            self.assertEqual(store[0].to_fen(), fens[0])
+            self.assertEqual(store.extend(boards[1:]), len(boards) - 1)
+            self.assertEqual(len(store), len(boards))
+            self.assertEqual(store[-1].to_fen(), fens[-1])
+
+        with PositionStore(self.path) as store:
+            self.assertEqual(len(store), len(boards))
+            self.assertEqual([board.to_fen() for board in store], fens)
+            self.assertEqual(store[5].to_fen(), fens[5])
+            self.assertEqual([board.to_fen() for board in store[2:4]], fens[2:4])
+            self.assertEqual(len(store.records()), len(boards) * position_store.RECORD_SIZE)
+            self.assertEqual(bytes(store.record(3)), position_store.encode_position(boards[3]))
+            with self.assertRaises(IndexError):
+                store[len(boards)]
+            with self.assertRaises(Exception):
+                store.append(boards[0])
+
+        with PositionStore(self.path, 'a') as store:
+            store.append(chess.Board.from_fen(chess.START_FEN))
+            self.assertEqual(store[-1].to_fen(), chess.START_FEN)
+        self.assertEqual(os.path.getsize(self.path),
+                         position_store.HEADER_SIZE + (len(boards) + 1) * position_store.RECORD_SIZE)
+
+    def test_invalid_file(self):
+        with open(self.path, 'wb') as store_file:
+            store_file.write(b'not a store')
+        with self.assertRaises(Exception):
+            PositionStore(self.path)
+
+    @unittest.skipIf(position_store.numpy is None, 'numpy is not installed')
+    def test_array(self):
+        boards = sample_boards()
+        with PositionStore(self.path, 'w') as store:
+            store.extend(boards)
+            array = store.array()
+            self.assertEqual(len(array), len(boards))
+            self.assertEqual(list(array['fullmove_number']), [board.fullmove_number for board in boards])
+            codes = position_store.unpack_placement(array['placement'])
+            self.assertEqual(list(codes[0]), list(boards[0]._mailbox))
+            del array, codes
+
+
+if __name__ == '__main__':
+    # To run: python -m unittest position_store_tests
+    unittest.main()
@@ -0,0 +1,575 @@
+""" Endgame tablebases: exact results of positions with few pieces, generated offline by retrograde analysis
+
+A table covers one material balance, named like KQvK or KRvKN with the stronger side as white; the
+same table answers for the colors swapped. Each position of the table has one byte: 0 for a draw,
+n for a win of the side to move with mate in n plies, 128 + n for a loss of the side to move mated in
+n plies, 255 for an illegal position or an index that is not used.
+
+Positions are indexed by the side to move and the square of every piece: white king, black king,
+then the other white and black pieces. The white king is brought to a canonical part of the board by
+the board's symmetries (a1-d1-d4 triangle without pawns, the a-d files with pawns), so a pawnless
+table of n pieces has 2 * 10 * 64 ** (n - 1) entries.
+
+Generation starts from the mates, stalemates and the moves that leave the table (captures and
+promotions, scored from the smaller tables) and works backwards with unmoves: a position one move
+before a loss is a win, a position all of whose moves lead to wins of the opponent is a loss. Tables
+are written as files of a 16 byte header and the values, and probed through mmap. Castling rights
+and en passant are not part of a table, positions with either are not probed. Tables are only made
+with pawns on one side at most, so no en passant capture can ever be possible in them: with white and
+black pawns the double pushes would make positions that differ by their en passant square.
+
+To generate tables: python tablebase.py KQvK KRvK KPvK [--directory tables]
+"""
+import argparse
+import mmap
+import os
+import sys
+import time
+
+from bitboard import BB_SQUARES, BB_RANKS, KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, WHITE, BLACK
+from bitboard import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, EMPTY, rook_attacks, bishop_attacks, queen_attacks
+from chess import Board, PIECE_SYMBOLS
+
+MAGIC = b'CHESSTB1'
+HEADER_SIZE = 16
+
+DRAW = 0
+LOSS = 128  # LOSS + n: the side to move is mated in n plies
+ILLEGAL = 255
+MAX_PLIES = ILLEGAL - LOSS - 1  # Longest distance to mate a value byte can hold, for wins and losses
+
+# Letters of a table name, strongest piece first, and the value used to decide the stronger side
+KIND_LETTERS = 'PNBRQK'
+NAME_ORDER = [KING, QUEEN, ROOK, BISHOP, KNIGHT, PAWN]
+KIND_VALUES = [1, 3, 3, 5, 9, 0]
+
+# Square maps of the 8 symmetries of the board: identity, flips and transposition
+_FLIPS = [lambda square: square, lambda square: square ^ 7, lambda square: square ^ 56, lambda square: square ^ 63]
+SYMMETRIES = [[flip(square) for square in range(64)] for flip in _FLIPS]
+SYMMETRIES += [[flip((square & 7) << 3 | square >> 3) for square in range(64)] for flip in _FLIPS]
+
+# Squares the white king is brought to, and the symmetries that bring it there from each square
+_TRIANGLE = [square for square in range(64) if (square >> 3) <= (square & 7) <= 3]
+_HALF = [square for square in range(64) if square & 7 <= 3]
+
+
+def _king_maps(squares, symmetries):
+    """ Symmetries that bring a king on each square to squares, None when only the identity does """
+    maps = [[symmetry for symmetry in symmetries if symmetry[king] in squares] for king in range(64)]
+    return [None if found == symmetries[:1] else found for found in maps]
+
+
+_TRIANGLE_MAPS = _king_maps(_TRIANGLE, SYMMETRIES)
+_HALF_MAPS = _king_maps(_HALF, SYMMETRIES[:2])
+
+
+def parse_name(name):
+    """ White and black piece kinds of a table name like KRvKN """
+    sides = name.upper().split('V')
+    if len(sides) != 2 or not all(side.startswith('K') and side.count('K') == 1 for side in sides):
+        raise Exception('Invalid table name {}: expected something like KQvK'.format(name))
+    kinds = []
+    for side in sides:
+        if any(letter not in KIND_LETTERS for letter in side):
+            raise Exception('Invalid table name {}: unknown piece'.format(name))
+        kinds.append(sorted((KIND_LETTERS.index(letter) for letter in side), key=NAME_ORDER.index))
+    return kinds
+
+
+def table_name(white, black):
+    """ Name of the table of white and black piece kinds, and whether its colors are swapped """
+    names = [''.join(KIND_LETTERS[kind] for kind in sorted(kinds, key=NAME_ORDER.index)) for kinds in (white, black)]
+    strength = [(sum(KIND_VALUES[kind] for kind in kinds), len(kinds), name) for kinds, name in zip((white, black), names)]
+    if strength[1] > strength[0]:
+        return '{}v{}'.format(names[1], names[0]), True
+    return '{}v{}'.format(names[0], names[1]), False
+
+
+def can_mate(white, black):
+    """ Whether either side has material that can ever mate: more than a king and one minor piece in total """
+    extra = [kind for kind in white + black if kind != KING]
+    return not (len(extra) == 0 or (len(extra) == 1 and extra[0] in (KNIGHT, BISHOP)))
+
+
+def both_pawns(white, black):
+    """ Whether both sides have pawns, material no table is made for as en passant is not modelled """
+    return PAWN in white and PAWN in black
+
+
+def dependencies(name):
+    """ Names of the smaller tables the moves out of table name lead to: captures and promotions """
+    sides = parse_name(name)
+    found = set()
+
+    def add(own, other, mover):
+        white, black = (own, other) if mover == WHITE else (other, own)
+        if can_mate(white, black):
+            found.add(table_name(white, black)[0])
+
+    for mover in (WHITE, BLACK):
+        own, other = sides[mover], sides[mover ^ 1]
+        for position, kind in enumerate(own):
+            if kind == KING:
+                continue
+            rest = own[:position] + own[position + 1:]
+            add(rest, other, mover)  # The piece is captured
+            if kind == PAWN:
+                # The pawn promotes, possibly capturing
+                others = [other] + [other[:index] + other[index + 1:] for index in range(len(other))
+                                    if other[index] != KING]
+                for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                    for remaining in others:
+                        add(rest + [promotion], remaining, mover)
+    return sorted(found)
+
+
+def win_value(plies):
+    """ Value byte of a win of the side to move with mate in plies """
+    if not 0 < plies <= MAX_PLIES:
+        raise Exception('Mate in {} plies does not fit a value byte (at most {})'.format(plies, MAX_PLIES))
+    return plies
+
+
+def loss_value(plies):
+    """ Value byte of a loss of the side to move, mated in plies """
+    if not 0 <= plies <= MAX_PLIES:
+        raise Exception('Mate in {} plies does not fit a value byte (at most {})'.format(plies, MAX_PLIES))
+    return LOSS + plies
+
+
+def _attacks(kind, color, square, occupied):
+    if kind == KNIGHT:
+        return KNIGHT_ATTACKS[square]
+    if kind == BISHOP:
+        return bishop_attacks(square, occupied)
+    if kind == ROOK:
+        return rook_attacks(square, occupied)
+    if kind == QUEEN:
+        return queen_attacks(square, occupied)
+    if kind == KING:
+        return KING_ATTACKS[square]
+    return PAWN_ATTACKS[color][square]
+
+
+class Table:
+    """ Layout of one table: its pieces, its size and the index of each position """
+
+    def __init__(self, name):
+        white, black = parse_name(name)
+        self.name = name
+        # Piece order of the index: white king, black king, other white pieces, other black pieces
+        self.pieces = [(WHITE, KING), (BLACK, KING)] + [(WHITE, kind) for kind in white[1:]] + \
+                      [(BLACK, kind) for kind in black[1:]]
+        self.pawns = any(kind == PAWN for _, kind in self.pieces)
+        self.king_squares = _HALF if self.pawns else _TRIANGLE
+        self.king_maps = _HALF_MAPS if self.pawns else _TRIANGLE_MAPS
+        self.king_slots = [None] * 64
+        for slot, square in enumerate(self.king_squares):
+            self.king_slots[square] = slot
+        self._king_count = len(self.king_squares)
+        self.size = 2 * self._king_count * 64 ** (len(self.pieces) - 1)
+
+    def index(self, turn, squares):
+        """ Index of the position with turn to move and the pieces on squares, in the order of pieces """
+        maps = self.king_maps[squares[0]]
+        if maps is None:
+            pass
+        elif len(maps) == 1:
+            squares = [maps[0][square] for square in squares]
+        else:
+            # Several symmetries reach the canonical squares: the smallest result is the canonical one
+            squares = min([symmetry[square] for square in squares] for symmetry in maps)
+        index = turn * self._king_count + self.king_slots[squares[0]]
+        for square in squares[1:]:
+            index = (index << 6) | square
+        return index
+
+    def position(self, index):
+        """ Side to move and squares of the position of an index """
+        squares = []
+        for _ in range(len(self.pieces) - 1):
+            index, square = divmod(index, 64)
+            squares.append(square)
+        turn, slot = divmod(index, len(self.king_squares))
+        squares.append(self.king_squares[slot])
+        squares.reverse()
+        return turn, squares
+
+
+class Tablebase:
+    """ Tables of a directory, made with generate(name) (or python tablebase.py) before they are probed
+
+    probe(board) gives the result of a position with few enough pieces as (wdl, plies): wdl is 1 when
+    the side to move wins, -1 when it loses and 0 for a draw, plies counts the half moves to mate.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._tables = {}  # name -> (Table, values) of the tables opened so far, values None if missing
+        self.max_pieces = 0
+        if os.path.isdir(directory):
+            for file_name in os.listdir(directory):
+                if file_name.endswith('.tb'):
+                    self.max_pieces = max(self.max_pieces, len(file_name) - 4)
+
+    def path(self, name):
+        return os.path.join(self.directory, name + '.tb')
+
+    def _open(self, name):
+        """ Table layout and values of a table, None for the values if it does not exist """
+        if name not in self._tables:
+            table = Table(name)
+            values = None
+            path = self.path(name)
+            if os.path.exists(path):
+                with open(path, 'rb') as table_file:
+                    values = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+                if values[:8] != MAGIC or len(values) != HEADER_SIZE + table.size:
+                    values.close()
+                    raise Exception('{} is not a tablebase file of {}'.format(path, name))
+            self._tables[name] = (table, values)
+        return self._tables[name]
+
+    def value(self, pieces, squares, turn):
+        """ Value byte of a position given as (color, kind) pieces, their squares and the side to move
+
+        None when the table of the material is not available.
+        """
+        white = [kind for color, kind in pieces if color == WHITE]
+        black = [kind for color, kind in pieces if color == BLACK]
+        if not can_mate(white, black):
+            return DRAW
+        if both_pawns(white, black):
+            return None
+        name, swapped = table_name(white, black)
+        table, values = self._open(name)
+        if values is None:
+            return None
+        if swapped:
+            # Swap the colors: mirror the ranks and give the move to the other side
+            pieces = [(color ^ 1, kind) for color, kind in pieces]
+            squares = [square ^ 56 for square in squares]
+            turn ^= 1
+
+        # Line the squares up with the order of the table's pieces
+        remaining = list(zip(pieces, squares))
+        ordered = []
+        for piece in table.pieces:
+            for position, (other, square) in enumerate(remaining):
+                if other == piece:
+                    ordered.append(square)
+                    del remaining[position]
+                    break
+        return values[HEADER_SIZE + table.index(turn, ordered)]
+
+    def probe(self, board: Board):
+        """ (wdl, plies to mate) of the position from the side to move's point of view, None if unknown """
+        ep_square = board.ep_square
+        if board.castling_rights or (ep_square is not None and PAWN_ATTACKS[board._turn ^ 1][ep_square]
+                                     & board._bitboards[board._turn * 6 + PAWN]):
+            return None
+        mailbox = board._mailbox
+        pieces = []
+        squares = []
+        for square, code in enumerate(mailbox):
+            if code != EMPTY:
+                pieces.append(divmod(code, 6))
+                squares.append(square)
+        if len(pieces) > max(self.max_pieces, 2):
+            return None
+        value = self.value(pieces, squares, board._turn)
+        if value is None or value == ILLEGAL:
+            return None
+        return decode_value(value)
+
+    def result(self, board: Board):
+        """ PGN result the position leads to with best play: 1-0, 0-1, 1/2-1/2, or None if it is not in the tables """
+        found = self.probe(board)
+        if found is None:
+            return None
+        wdl = found[0] if board._turn == WHITE else -found[0]
+        return '1-0' if wdl > 0 else '0-1' if wdl < 0 else '1/2-1/2'
+
+    def best_move(self, board: Board):
+        """ Move that keeps the best result: the fastest mate, the longest resistance, or a drawing move """
+        if self.probe(board) is None:
+            return None
+        best = None
+        best_rank = None
+        for move in board.generate_legal_moves():
+            board.push(move)
+            found = self.probe(board)
+            board.pop()
+            if found is None:
+                continue
+            wdl, plies = found
+            # Ranked from the mover's side: the opponent losing soonest first, losing latest last
+            rank = (-wdl, -plies if wdl < 0 else plies)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+        return best
+
+    def generate(self, name):
+        """ Build the table name and write it, returning the seconds taken
+
+        The smaller tables it leads to are generated first when they are missing. This can take minutes
+        for 4 pieces: it is an offline step, probes never generate a table. Tables with pawns on both
+        sides are refused, see both_pawns.
+        """
+        if both_pawns(*parse_name(name)):
+            raise Exception('Cannot generate {}: en passant is not modelled, only one side may have pawns'.format(name))
+        start = time.perf_counter()
+        for dependency in dependencies(name):
+            if not os.path.exists(self.path(dependency)):
+                self.generate(dependency)
+        table = Table(name)
+        values = _Generator(self, table).run()
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(name) + '.tmp', 'wb') as table_file:
+            table_file.write(MAGIC + b'\0' * (HEADER_SIZE - len(MAGIC)))
+            table_file.write(values)
+        os.replace(self.path(name) + '.tmp', self.path(name))
+        stale = self._tables.pop(name, None)  # Opened while it was missing
+        if stale is not None and stale[1] is not None:
+            stale[1].close()
+        self.max_pieces = max(self.max_pieces, len(table.pieces))
+        return time.perf_counter() - start
+
+    def close(self):
+        for _, values in self._tables.values():
+            if values is not None:
+                values.close()
+        self._tables = {}
+
+
+def decode_value(value):
+    """ (wdl, plies to mate) of a value byte """
+    if value == DRAW:
+        return 0, 0
+    if value >= LOSS:
+        return -1, value - LOSS
+    return 1, value
+
+
+class _Generator:
+    """ Retrograde analysis of one table """
+
+    def __init__(self, tablebase, table):
+        self.tablebase = tablebase
+        self.table = table
+        self.pieces = table.pieces
+        self.kings = [0, 1]  # Position of each side's king in the piece list
+
+    def _in_check(self, squares, color, occupied, captured=None):
+        """ Whether the king of color is attacked by the other side's pieces, except the captured one """
+        king = BB_SQUARES[squares[self.kings[color]]]
+        for position, (piece_color, kind) in enumerate(self.pieces):
+            if piece_color != color and position != captured and \
+                    _attacks(kind, piece_color, squares[position], occupied) & king:
+                return True
+        return False
+
+    def _legal(self, turn, squares):
+        occupied = 0
+        for square in squares:
+            bit = BB_SQUARES[square]
+            if occupied & bit:
+                return False
+            occupied |= bit
+        for (_, kind), square in zip(self.pieces, squares):
+            if kind == PAWN and BB_SQUARES[square] & (BB_RANKS[0] | BB_RANKS[7]):
+                return False
+        return not self._in_check(squares, turn ^ 1, occupied)
+
+    def _moves(self, turn, squares):
+        """ (piece position, target square, captured piece position or None, promotion kind or None) of legal moves """
+        pieces = self.pieces
+        occupied = 0
+        own = 0
+        for (color, _), square in zip(pieces, squares):
+            occupied |= BB_SQUARES[square]
+            if color == turn:
+                own |= BB_SQUARES[square]
+        at = {square: position for position, square in enumerate(squares)}
+
+        moves = []
+        for position, (color, kind) in enumerate(pieces):
+            if color != turn:
+                continue
+            start = squares[position]
+            if kind == PAWN:
+                forward = 8 if color == WHITE else -8
+                targets = PAWN_ATTACKS[color][start] & occupied & ~own
+                one = start + forward
+                if not occupied & BB_SQUARES[one]:
+                    targets |= BB_SQUARES[one]
+                    if start >> 3 == (1 if color == WHITE else 6) and not occupied & BB_SQUARES[one + forward]:
+                        targets |= BB_SQUARES[one + forward]
+            else:
+                targets = _attacks(kind, color, start, occupied) & ~own
+
+            while targets:
+                low = targets & -targets
+                targets ^= low
+                end = low.bit_length() - 1
+                captured = at.get(end)
+                after = list(squares)
+                after[position] = end
+                if self._in_check(after, turn, (occupied ^ BB_SQUARES[start]) | low, captured):
+                    continue
+                if kind == PAWN and low & (BB_RANKS[0] | BB_RANKS[7]):
+                    for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        moves.append((position, end, captured, promotion))
+                else:
+                    moves.append((position, end, captured, None))
+        return moves
+
+    def _outside(self, turn, squares, position, end, captured, promotion):
+        """ Value byte, for the opponent to move, of a move that leaves the table """
+        pieces = list(self.pieces)
+        after = list(squares)
+        after[position] = end
+        if promotion is not None:
+            pieces[position] = (pieces[position][0], promotion)
+        if captured is not None:
+            del pieces[captured]
+            del after[captured]
+        value = self.tablebase.value(pieces, after, turn ^ 1)
+        if value is None or value == ILLEGAL:
+            raise Exception('Generating {} needs the table of {} pieces {}'.format(
+                self.table.name, len(pieces), ''.join(PIECE_SYMBOLS[color * 6 + kind] for color, kind in pieces)))
+        return value
+
+    def _unmoves(self, turn, squares):
+        """ Indexes of the positions one non-capturing, non-promoting move before, with turn ^ 1 to move """
+        mover = turn ^ 1
+        occupied = 0
+        for square in squares:
+            occupied |= BB_SQUARES[square]
+        index = self.table.index
+        found = set()
+        for position, (color, kind) in enumerate(self.pieces):
+            if color != mover:
+                continue
+            end = squares[position]
+            if kind == PAWN:
+                back = -8 if color == WHITE else 8
+                origins = 0
+                one = end + back
+                if 8 <= one < 56 and not occupied & BB_SQUARES[one]:
+                    origins = BB_SQUARES[one]
+                    two = one + back
+                    if end >> 3 == (3 if color == WHITE else 4) and not occupied & BB_SQUARES[two]:
+                        origins |= BB_SQUARES[two]
+            else:
+                origins = _attacks(kind, color, end, occupied) & ~occupied
+            before = list(squares)
+            while origins:
+                low = origins & -origins
+                origins ^= low
+                before[position] = low.bit_length() - 1
+                found.add(index(mover, before))
+        return found
+
+    def run(self):
+        table = self.table
+        size = table.size
+        values = bytearray([ILLEGAL]) * size
+        final = bytearray(size)  # 1 once the value of a position is known for good
+        counters = bytearray(size)  # Moves to other positions of the table not yet known to lose
+        longest = bytearray(size)  # Plies to mate of the slowest loss found among the moves so far
+        can_draw = bytearray(size)  # A move leaves the table to a draw
+        buckets = [[] for _ in range(256)]
+
+        # Moves of every position: mates, stalemates and what leaving the table gives
+        for index in range(size):
+            turn, squares = table.position(index)
+            if table.index(turn, squares) != index or not self._legal(turn, squares):
+                continue
+            moves = self._moves(turn, squares)
+            values[index] = DRAW
+            if not moves:
+                if self._in_check(squares, turn, sum(BB_SQUARES[square] for square in squares)):
+                    values[index] = loss_value(0)
+                    buckets[0].append(index)
+                else:
+                    final[index] = 1  # Stalemate
+                continue
+
+            children = set()
+            win = 0
+            for position, end, captured, promotion in moves:
+                if captured is None and promotion is None:
+                    after = list(squares)
+                    after[position] = end
+                    children.add(table.index(turn ^ 1, after))
+                    continue
+                value = self._outside(turn, squares, position, end, captured, promotion)
+                if value == DRAW:
+                    can_draw[index] = 1
+                elif value >= LOSS:
+                    plies = value - LOSS + 1
+                    if not win or plies < win:
+                        win = plies
+                else:
+                    longest[index] = max(longest[index], value + 1)
+            counters[index] = len(children)
+            if win:
+                values[index] = win_value(win)
+                buckets[win].append(index)
+            elif not children and not can_draw[index]:
+                values[index] = loss_value(longest[index])
+                buckets[longest[index]].append(index)
+
+        # Work backwards from the known results, fastest mates first
+        for plies in range(255):
+            for index in buckets[plies]:
+                value = values[index]
+                if final[index] or (value - LOSS if value >= LOSS else value) != plies:
+                    continue  # Settled already, or a faster result replaced this one
+                final[index] = 1
+                turn, squares = table.position(index)
+                for parent in self._unmoves(turn, squares):
+                    if final[parent] or values[parent] == ILLEGAL:
+                        continue
+                    current = values[parent]
+                    if value >= LOSS:
+                        # Moving here mates the opponent in plies: a win for the parent
+                        if current == DRAW or current >= LOSS or current > plies + 1:
+                            values[parent] = win_value(plies + 1)
+                            buckets[plies + 1].append(parent)
+                    elif current == DRAW or current >= LOSS:
+                        counters[parent] -= 1
+                        longest[parent] = max(longest[parent], plies + 1)
+                        if not counters[parent] and not can_draw[parent] and current == DRAW:
+                            values[parent] = loss_value(longest[parent])
+                            buckets[longest[parent]].append(parent)
+        return values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate endgame tablebases by retrograde analysis')
+    parser.add_argument('names', nargs='+', help='tables to generate, e.g. KQvK KRvK KPvK KBNvK')
+    parser.add_argument('--directory', default='tables', help='directory of the table files')
+    args = parser.parse_args(argv)
+
+    tablebase = Tablebase(args.directory)
+    for name in args.names:
+        name, _ = table_name(*parse_name(name))
+        seconds = tablebase.generate(name)
+        table, values = tablebase._open(name)
+        counts = [0, 0, 0]
+        longest = 0
+        for value in values[HEADER_SIZE:]:
+            if value != ILLEGAL:
+                wdl, plies = decode_value(value)
+                counts[wdl + 1] += 1
+                longest = max(longest, plies)
+        print('{}: {} positions, {} wins, {} draws, {} losses, longest mate {} plies, {:.1f}s'.format(
+            name, sum(counts), counts[2], counts[1], counts[0], longest, seconds))
+    tablebase.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import chess
+import tablebase
+from engine import Engine, MATE
+
+
+class TestTablebase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.directory = tempfile.mkdtemp()
+        cls.tablebase = tablebase.Tablebase(cls.directory)
+        cls.tablebase.generate('KQvK')
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tablebase.close()
+        shutil.rmtree(cls.directory)
+
+    def test_names(self):
+        self.assertEqual(tablebase.table_name([chess.KING], [chess.KING, chess.QUEEN]), ('KQvK', True))
+        self.assertEqual(tablebase.table_name([chess.KING, chess.KNIGHT], [chess.KING, chess.ROOK]), ('KRvKN', True))
+        self.assertEqual(tablebase.parse_name('KBNvK'), [[chess.KING, chess.BISHOP, chess.KNIGHT], [chess.KING]])
+        self.assertFalse(tablebase.can_mate([chess.KING, chess.BISHOP], [chess.KING]))
+        with self.assertRaises(Exception):
+            tablebase.parse_name('KQK')
+
+    def test_values_and_dependencies(self):
+        self.assertEqual(tablebase.decode_value(tablebase.win_value(5)), (1, 5))
+        self.assertEqual(tablebase.decode_value(tablebase.loss_value(0)), (-1, 0))
+        for plies in (tablebase.MAX_PLIES + 1, 200):
+            with self.assertRaises(Exception):
+                tablebase.win_value(plies)
+            with self.assertRaises(Exception):
+                tablebase.loss_value(plies)
+        self.assertEqual(tablebase.dependencies('KPvK'), ['KQvK', 'KRvK'])
+        self.assertEqual(tablebase.dependencies('KRvKN'), ['KRvK'])
+
+    def test_pawns_on_both_sides(self):
+        # En passant is not part of a table, so there are none with white and black pawns
+        self.assertTrue(tablebase.both_pawns([chess.KING, chess.PAWN], [chess.KING, chess.PAWN]))
+        self.assertFalse(tablebase.both_pawns([chess.KING, chess.QUEEN, chess.PAWN], [chess.KING]))
+        with self.assertRaises(Exception):
+            self.tablebase.generate('KPvKP')
+        self.assertFalse(os.path.exists(self.tablebase.path('KPvKP')))
+        self.assertFalse(os.path.exists(self.tablebase.path('KQvKP')))
+        pieces = [(chess.WHITE, chess.KING), (chess.BLACK, chess.KING), (chess.WHITE, chess.PAWN), (chess.BLACK, chess.PAWN)]
+        self.assertIsNone(self.tablebase.value(pieces, [4, 60, 28, 27], chess.BLACK))
+
+    def test_missing_table(self):
+        # Probes, also from the search, never generate a table
+        board = chess.Board.from_fen('4k3/8/8/8/8/8/8/R3K3 w - - 0 1')
+        self.assertIsNone(self.tablebase.probe(board))
+        self.assertIsNone(self.tablebase.best_move(board))
+        Engine(board, hash_mb=1, tablebase=self.tablebase).search(depth=2)
+        self.assertFalse(os.path.exists(self.tablebase.path('KRvK')))
+
+    def test_probe(self):
+        probe = self.tablebase.probe
+        # Mate in one, and mated
+        self.assertEqual(probe(chess.Board.from_fen('k7/8/1K6/8/8/8/7Q/8 w - - 0 1')), (1, 1))
+        self.assertEqual(probe(chess.Board.from_fen('k7/1Q6/1K6/8/8/8/8/8 b - - 0 1')), (-1, 0))
+        # The queen hangs, and stalemate
+        self.assertEqual(probe(chess.Board.from_fen('k7/1Q6/8/8/8/8/8/7K b - - 0 1')), (0, 0))
+        self.assertEqual(probe(chess.Board.from_fen('k7/2Q5/1K6/8/8/8/8/8 b - - 0 1')), (0, 0))
+        # Colors swapped, and the longest mate
+        self.assertEqual(probe(chess.Board.from_fen('K7/8/1k6/8/8/8/7q/8 b - - 0 1')), (1, 1))
+        self.assertEqual(max(tablebase.decode_value(value)[1]
+                             for value in self.tablebase._open('KQvK')[1][tablebase.HEADER_SIZE:]
+                             if value != tablebase.ILLEGAL), 20)
+        # Insufficient material is a draw, unknown material is not answered
+        self.assertEqual(probe(chess.Board.from_fen('k7/8/1K6/8/8/8/8/7N w - - 0 1')), (0, 0))
+        self.assertIsNone(tablebase.Tablebase(self.directory).probe(chess.Board.from_fen(chess.START_FEN)))
+        self.assertEqual(self.tablebase.result(chess.Board.from_fen('K7/8/1k6/8/8/8/7q/8 b - - 0 1')), '0-1')
+
+    def test_consistency(self):
+        # Every value follows from the values after each legal move, as found by the board's own move generator
+        rng = random.Random(5)
+        checked = 0
+        while checked < 300:
+            squares = rng.sample(range(64), 3)
+            board = chess.Board()
+            for square, code in zip(squares, (chess.KING, 6 + chess.KING, rng.choice((chess.QUEEN, 6 + chess.QUEEN)))):
+                board.set_piece_at(square, chess.FLYWEIGHTS[code])
+            board.turn = rng.choice(chess.COLORS)
+            found = self.tablebase.probe(board)
+            if board._checkers(board._turn ^ 1):
+                # The side that just moved is in check
+                self.assertIsNone(found)
+                continue
+            children = []
+            for move in board.generate_legal_moves():
+                board.push(move)
+                children.append(self.tablebase.probe(board))
+                board.pop()
+            if not children:
+                expected = (-1, 0) if board._checkers(board._turn) else (0, 0)
+            elif any(wdl < 0 for wdl, _ in children):
+                expected = (1, min(plies for wdl, plies in children if wdl < 0) + 1)
+            elif all(wdl > 0 for wdl, _ in children):
+                expected = (-1, max(plies for _, plies in children) + 1)
+            else:
+                expected = (0, 0)
+            self.assertEqual(found, expected, board.to_fen())
+            checked += 1
+
+    def test_best_move_and_engine(self):
+        board = chess.Board.from_fen('8/8/8/3k4/8/8/7Q/4K3 w - - 0 1')
+        wdl, plies = self.tablebase.probe(board)
+        self.assertEqual(wdl, 1)
+        while plies:
+            board.push(self.tablebase.best_move(board))
+            plies -= 1
+        self.assertFalse(board.generate_legal_moves())
+        self.assertTrue(board._checkers(board._turn))
+
+        search = Engine(chess.Board.from_fen('8/8/8/3k4/8/8/7Q/4K3 w - - 0 1'), hash_mb=1, tablebase=self.tablebase)
+        result = search.search(depth=2)
+        self.assertGreater(result.score, MATE - 64)
+        self.assertEqual(search.best_move(depth=1), self.tablebase.best_move(search.board))
+
+
+if __name__ == '__main__':
+    # To run: python -m unittest tablebase_tests
+    unittest.main()
@@ -0,0 +1,143 @@
+""" Transposition table: fixed size hash of search results keyed by the board Zobrist key
+
+The table is one flat array of unsigned 64-bit words. A bucket holds two slots of two words each
+(key XOR data, packed data): the first slot keeps the deepest result, the second is always replaced.
+Storing the key XORed with the data makes the table safe to share between processes without locks:
+a slot torn by two concurrent writers no longer matches its key and reads as a miss.
+"""
+from array import array
+
+# Bound of a stored score
+EXACT = 1
+LOWER = 2  # Score is at least the stored value (fail high)
+UPPER = 3  # Score is at most the stored value (fail low)
+
+SLOT_WORDS = 2
+BUCKET_SLOTS = 2
+BUCKET_WORDS = SLOT_WORDS * BUCKET_SLOTS
+BUCKET_BYTES = BUCKET_WORDS * 8
+
+SCORE_OFFSET = 1 << 31
+
+
+def pack(move, score, depth, bound, generation):
+    """ Data word: move (16 bits), depth (8), bound (2), generation (6), score (32) """
+    return move | depth << 16 | bound << 24 | generation << 26 | (score + SCORE_OFFSET) << 32
+
+
+def unpack(data):
+    """ (move, score, depth, bound) of a data word """
+    return data & 0xFFFF, (data >> 32) - SCORE_OFFSET, (data >> 16) & 0xFF, (data >> 24) & 3
+
+
+class TranspositionTable:
+    """ Fixed memory transposition table with depth-preferred and always-replace slots """
+
+    def __init__(self, size_mb=16, buffer=None):
+        if buffer is None:
+            self._table = array('Q', bytes(self.bytes_for(size_mb)))
+        else:
+            # Table over memory owned by someone else, e.g. a multiprocessing.shared_memory block
+            size = self.bytes_for(len(buffer) / (1024 * 1024))
+            self._table = memoryview(buffer).cast('B')[:size].cast('Q')
+        self._mask = len(self._table) // BUCKET_WORDS - 1
+        self.generation = 0
+
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.collisions = 0  # Stores that evicted a different position
+
+    @staticmethod
+    def bytes_for(size_mb):
+        """ Bytes used by a table of at most size_mb: a power of two number of buckets """
+        buckets = 1
+        while buckets * 2 * BUCKET_BYTES <= size_mb * 1024 * 1024:
+            buckets *= 2
+        return buckets * BUCKET_BYTES
+
+    @property
+    def size_bytes(self):
+        return len(self._table) * 8
+
+    def __len__(self):
+        """ Number of slots """
+        return len(self._table) // SLOT_WORDS
+
+    def new_search(self):
+        """ Age the entries: results of earlier searches are replaced first """
+        self.generation = (self.generation + 1) & 63
+
+    def clear(self):
+        self._table[:] = array('Q', bytes(len(self._table) * 8))
+        self.generation = 0
+        self.probes = self.hits = self.stores = self.collisions = 0
+
+    def probe(self, key):
+        """ Return (move, score, depth, bound) stored for key, or None """
+        self.probes += 1
+        table = self._table
+        index = (key & self._mask) * BUCKET_WORDS
+        data = table[index + 1]
+        if data and table[index] ^ data == key:
+            self.hits += 1
+            return unpack(data)
+        data = table[index + 3]
+        if data and table[index + 2] ^ data == key:
+            self.hits += 1
+            return unpack(data)
+        return None
+
+    def store(self, key, move, score, depth, bound):
+        """ Store a search result, keeping the best move known for the position if move is 0 """
+        self.stores += 1
+        table = self._table
+        index = (key & self._mask) * BUCKET_WORDS
+
+        # Same position already stored: update it in place
+        for slot in (index, index + 2):
+            data = table[slot + 1]
+            if data and table[slot] ^ data == key:
+                old_move, _, old_depth, _ = unpack(data)
+                if slot == index and depth < old_depth and (data >> 26) & 63 == self.generation:
+                    # Keep the deeper result, the shallow one goes to the always-replace slot
+                    break
+                data = pack(move or old_move, score, depth, bound, self.generation)
+                table[slot] = key ^ data
+                table[slot + 1] = data
+                return
+
+        # Depth-preferred slot: taken when empty, shallower or left over from an earlier search
+        data = table[index + 1]
+        if not data or depth >= (data >> 16) & 0xFF or (data >> 26) & 63 != self.generation:
+            slot = index
+        else:
+            slot = index + 2
+
+        if table[slot + 1] and table[slot] ^ table[slot + 1] != key:
+            self.collisions += 1
+        data = pack(move, score, depth, bound, self.generation)
+        table[slot] = key ^ data
+        table[slot + 1] = data
+
+    def release(self):
+        """ Drop the view of a shared buffer, so that the buffer can be closed """
+        if isinstance(self._table, memoryview):
+            self._table.release()
+
+    def hashfull(self):
+        """ Permille of the first 1000 slots in use """
+        slots = min(1000, len(self))
+        used = sum(1 for slot in range(slots) if self._table[slot * SLOT_WORDS + 1])
+        return used * 1000 // slots
+
+    def stats(self):
+        return {
+            'size_bytes': self.size_bytes,
+            'probes': self.probes,
+            'hits': self.hits,
+            'hit_rate': self.hits / self.probes if self.probes else 0.0,
+            'stores': self.stores,
+            'collisions': self.collisions,
+            'hashfull': self.hashfull(),
+        }
@@ -0,0 +1,79 @@
+import unittest
+import transposition
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+
+class TestTranspositionTable(unittest.TestCase):
+    def setUp(self) -> None:
+        self.table = TranspositionTable(1)
+
+    def test_size(self):
+        self.assertLessEqual(self.table.size_bytes, 1024 * 1024)
+        self.assertGreater(self.table.size_bytes, 512 * 1024)
+        self.assertLessEqual(TranspositionTable(0).size_bytes, transposition.BUCKET_BYTES)
+
+    def test_store_and_probe(self):
+        key = 0x123456789ABCDEF0
+        self.assertIsNone(self.table.probe(key))
+        self.table.store(key, 1234, -250, 7, LOWER)
+        self.assertEqual(self.table.probe(key), (1234, -250, 7, LOWER))
+        self.assertIsNone(self.table.probe(key ^ 1 << 40))
+        self.assertEqual(self.table.probes, 3)
+        self.assertEqual(self.table.hits, 1)
+
+        # Storing without a move keeps the known best move
+        self.table.store(key, 0, 30, 8, EXACT)
+        self.assertEqual(self.table.probe(key), (1234, 30, 8, EXACT))
+
+    def test_replacement(self):
+        mask = self.table._mask
+        deep, shallow, other = 5, 5 + (mask + 1), 5 + 2 * (mask + 1)  # Same bucket
+
+        self.table.store(deep, 1, 10, 9, EXACT)
+        self.table.store(shallow, 2, 20, 2, UPPER)
+        self.assertEqual(self.table.probe(deep), (1, 10, 9, EXACT))
+        self.assertEqual(self.table.probe(shallow), (2, 20, 2, UPPER))
+
+        # The always-replace slot is evicted, the deeper entry stays
+        self.table.store(other, 3, 30, 1, EXACT)
+        self.assertIsNone(self.table.probe(shallow))
+        self.assertEqual(self.table.probe(deep), (1, 10, 9, EXACT))
+        self.assertEqual(self.table.probe(other), (3, 30, 1, EXACT))
+        self.assertEqual(self.table.collisions, 1)
+
+        # Deeper results take the depth-preferred slot, and so do results of a new search
+        self.table.store(shallow, 4, 40, 12, EXACT)
+        self.assertIsNone(self.table.probe(deep))
+        self.table.new_search()
+        self.table.store(deep, 5, 50, 1, EXACT)
+        self.assertEqual(self.table.probe(deep), (5, 50, 1, EXACT))
+
+    def test_stats(self):
+        for key in range(1, 200):
+            self.table.store(key * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF, key, key, 1, EXACT)
+        stats = self.table.stats()
+        self.assertEqual(stats['stores'], 199)
+        self.assertGreater(stats['hashfull'], 0)
+        self.table.clear()
+        self.assertEqual(self.table.stats()['hashfull'], 0)
+
+    def test_shared_buffer(self):
+        buffer = bytearray(64 * 1024)
+        table = TranspositionTable(buffer=buffer)
+        other = TranspositionTable(buffer=buffer)
+        self.assertEqual(table.size_bytes, len(buffer))
+        table.store(77, 12, 34, 5, EXACT)
+        self.assertEqual(other.probe(77), (12, 34, 5, EXACT))
+
+        # A slot half written by another process reads as a miss
+        index = (77 & table._mask) * transposition.BUCKET_WORDS
+        table._table[index + 1] = transposition.pack(99, 34, 5, EXACT, 0)
+        self.assertIsNone(other.probe(77))
+        table.clear()
+        table.release()
+        self.assertEqual(bytes(buffer), bytes(len(buffer)))
+
+
+if __name__ == '__main__':
+    # To run: python -m unittest transposition_tests
+    unittest.main()
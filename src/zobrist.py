@@ -0,0 +1,21 @@
+""" Zobrist keys: a position hashes to the XOR of one random 64-bit key per feature it has
+
+The keys come from a fixed seed so hashes are the same in every process and across runs.
+"""
+import random
+
+_random = random.Random(0x5EED)
+
+# One key per piece index (color * 6 + kind) and square
+PIECE_KEYS = [[_random.getrandbits(64) for _ in range(64)] for _ in range(12)]
+
+# XORed in when black is to move
+TURN_KEY = _random.getrandbits(64)
+
+# One key per combination of the 4 castling rights bits
+CASTLING_KEYS = [_random.getrandbits(64) for _ in range(16)]
+
+# One key per file of the en passant square, only XORed in when a pawn of the side to move can capture there
+EP_KEYS = [_random.getrandbits(64) for _ in range(8)]
+
+del _random